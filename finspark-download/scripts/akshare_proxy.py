@@ -10,36 +10,129 @@ AKShare 港股数据代理服务
 
 运行方式:
     pip install fastapi uvicorn akshare pandas
+    pip install orjson  # 可选, 更快的 JSON 编码
+    pip install pyarrow # 可选, 录制数据使用 Parquet 存储, 支持 format=arrow/parquet 输出
+    pip install brotli  # 可选, 支持 br 压缩
     python scripts/akshare_proxy.py
     
     # 或使用 uvicorn 启动
     uvicorn akshare_proxy:app --host 0.0.0.0 --port 8000
 
 API 端点:
-    GET /health                      - 健康检查
+    GET /health                      - 健康检查 (存活探针, 进程启动后立即可用)
+    GET /ready                       - 就绪探针 (AKShare 导入、执行池和缓存预加载完成后返回 200)
+    GET /metrics                     - Prometheus 监控指标
     GET /hk/financial/{code}/{type}  - 获取港股财务报表
-    GET /hk/kline/{code}             - 获取港股K线数据
+    GET /hk/financial_wide/{code}/{type} - 获取港股财务报表 (宽表, Tushare 格式)
+    GET /hk/kline/{code}             - 获取港股K线数据 (period=daily/weekly/monthly/quarterly)
+    GET /hk/indicators?codes=a,b     - 港股技术指标 (MA/EMA/MACD/RSI/布林带/ATR/波动率/回撤/量能)
     GET /hk/basic/{code}             - 获取港股基本信息
     GET /hk/company/{code}           - 获取港股公司信息
     GET /hk/daily_basic/{code}       - 获取港股每日指标
     GET /hk/fina_indicator/{code}    - 获取港股财务指标
+    GET /hk/financial_ratios/{code}  - 由三大报表计算的财务比率 (同比/TTM/周转率等, 全部报告期)
     GET /hk/main_biz/{code}          - 获取港股主营业务构成
+    GET /hk/screen?q=...             - 全市场行情快照选股 (如 "pct_chg > 5 and amount > 1e8 order by amount desc limit 50")
+    POST /hk/batch                   - 批量获取多只港股的多个数据集
+
+    数据端点均支持 fields= (逗号分隔的字段投影) 和 format= 输出格式:
+    records (默认, 对象数组) / columns (按列 JSON) / arrow (Arrow IPC 流) / parquet
+    数据端点返回 ETag, 带 If-None-Match 且数据未变化时返回 304; 较大的响应按 Accept-Encoding
+    返回 gzip / br 压缩副本, 编码与压缩结果随缓存条目复用
+
+环境变量:
+    AKSHARE_EXECUTOR                 - 上游调用执行器: thread (默认) / process
+    AKSHARE_MAX_WORKERS              - 执行池大小 (默认 16)
+    AKSHARE_DEFAULT_CONCURRENCY      - 单个 ak.* 函数默认并发上限 (默认 4)
+    AKSHARE_CONCURRENCY_LIMITS       - 按函数覆盖并发上限, 如 "stock_hk_hist=8,stock_hk_spot_em=1"
+    AKSHARE_RATE_LIMIT               - 上游限流速率 (次/秒, 默认 10, 0 为不限流)
+    AKSHARE_RATE_BURST               - 限流令牌桶容量 (默认 20)
+    AKSHARE_RATE_LIMITS              - 按函数单独限流, 如 "stock_hk_spot_em=1"
+    AKSHARE_CALL_TIMEOUT             - 单次 ak.* 调用超时 (秒, 默认 30)
+    AKSHARE_CALL_TIMEOUTS            - 按函数覆盖超时, 如 "stock_hk_spot_em=120"
+    AKSHARE_RETRIES                  - 超时/网络错误的重试次数 (默认 2)
+    AKSHARE_RETRY_BACKOFF            - 重试退避基数 (秒, 默认 0.5, 指数增长并随机抖动)
+    AKSHARE_BREAKER_THRESHOLD        - 连续失败多少次后熔断 (默认 5)
+    AKSHARE_BREAKER_COOLDOWN         - 熔断持续时间 (秒, 默认 30)
+    AKSHARE_CACHE_MAX_MB             - 进程内响应缓存的内存预算 (默认 256MB)
+    AKSHARE_REPR_CACHE_MAX_MB        - 编码后响应 (含压缩副本) 的内存预算 (默认 64MB)
+    AKSHARE_COMPRESS_MIN_BYTES       - 响应体超过该字节数才压缩 (默认 1024)
+    AKSHARE_DISK_CACHE               - 是否启用磁盘响应缓存 (多 worker 共享, 默认 1)
+    AKSHARE_DISK_CACHE_LEASE         - 其他 worker 回源时的最长等待时间 (秒, 默认 30)
+    AKSHARE_DEGRADED_TTL             - 上游失败时退回本地数据的结果 (stale: true) 的缓存时长 (秒, 默认 30)
+    AKSHARE_PRELOAD_ENTRIES          - 启动时从磁盘缓存预加载到内存的最近条目数 (默认 500)
+    AKSHARE_UNIVERSE_REFRESH         - 港股代码池后台刷新间隔 (秒, 默认 6 小时)
+    AKSHARE_FACTOR_TTL               - 复权因子刷新间隔 (秒, 默认 6 小时)
+    AKSHARE_SPOT_TTL                 - 全市场行情快照刷新间隔 (秒, 默认 60)
+    AKSHARE_SCREEN_MAX_ROWS          - 选股结果最多返回的行数 (默认 500)
+    AKSHARE_PREWARM                  - 是否启用热门股票预热 (默认 1)
+    AKSHARE_PREWARM_CODES            - 固定预热的股票代码, 如 "00700,09988"
+    AKSHARE_PREWARM_TOP              - 另外预热按请求频率排名前 N 的股票 (默认 50)
+    AKSHARE_PREWARM_HALF_LIFE        - 请求频率的衰减半衰期 (秒, 默认 3600)
+    AKSHARE_PREWARM_INTERVAL         - 预热周期 (秒, 默认 60)
+    AKSHARE_PREWARM_CONCURRENCY      - 预热并发上限 (默认 4)
+    AKSHARE_OFFPEAK                  - 非高峰时段 (香港时间), 重任务只在此时段执行 (默认 "17:00-08:30")
+    AKSHARE_DATA_DIR                 - 本地数据目录 (K线存储等, 默认 scripts/akshare_data)
+    AKSHARE_FIXTURE_MODE             - 上游录制/回放: off (默认) / record / replay
+    AKSHARE_FIXTURE_DIR              - 录制数据目录 (默认 $AKSHARE_DATA_DIR/fixtures), 含录制时的K线存储 kline.db
+    AKSHARE_BATCH_CONCURRENCY        - 单个批量请求内的并发上限 (默认 8)
+    AKSHARE_BATCH_MAX_ITEMS          - 单个批量请求的最大 (代码 x 数据集) 项数 (默认 200)
 
 数据来源: AKShare (东方财富)
 """
 
-from fastapi import FastAPI, HTTPException, Query
+import time
+
+# 启动耗时分解: 模块导入在此记录, 后台预热步骤在 startup 钩子中补充
+_import_started = time.perf_counter()
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
-import akshare as ak
+from pydantic import BaseModel, Field
+from starlette.routing import Match
+_web_imported = time.perf_counter()
 import pandas as pd
 import numpy as np
-from typing import Optional, Any
+_pandas_imported = time.perf_counter()
+from typing import Optional, Any, List
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import asyncio
+import contextvars
+import gzip
+import hashlib
+import heapq
+import importlib
+import multiprocessing
+import random
+import socket
+import threading
 import traceback
+import sqlite3
 import sys
+import os
 import math
 import json
 
+try:
+    import orjson  # 可选: 更快的 JSON 编码器
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow  # 可选: 录制数据使用 Parquet 存储, Arrow / Parquet 响应格式
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import brotli  # 可选: br 压缩
+except ImportError:
+    brotli = None
+
 
 def safe_json_dumps(obj: Any) -> str:
     """安全的 JSON 序列化，处理 NaN 和 Inf"""
@@ -60,21 +153,1562 @@ def safe_json_dumps(obj: Any) -> str:
     
     return json.dumps(sanitize(obj), ensure_ascii=False)
 
-# 创建 FastAPI 应用
-app = FastAPI(
-    title="AKShare HK Stock Proxy",
-    description="港股财务数据代理服务 - 为 Finspark 提供港股三大财务报表数据",
-    version="1.0.0"
-)
 
-# CORS 配置 - 允许所有来源
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def json_dumps_bytes(obj: Any) -> bytes:
+    """一次性编码为 UTF-8 JSON 字节 (已安装 orjson 时使用 orjson)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def json_loads_bytes(data: bytes) -> Any:
+    """解码 json_dumps_bytes 的输出"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_response(payload: Any, status_code: int = 200) -> Response:
+    """直接返回编码好的 JSON, 跳过 FastAPI 的 jsonable_encoder"""
+    headers = {}
+    if isinstance(payload, dict):
+        # 来自缓存的结果标注缓存年龄, 过期副本额外带上 Warning
+        if "age" in payload:
+            headers["Age"] = str(payload["age"])
+        if payload.get("stale"):
+            headers["Warning"] = '110 - "Response is Stale"'
+    started = time.perf_counter()
+    content = json_dumps_bytes(payload)
+    record_timing("serialize", time.perf_counter() - started)
+    return Response(
+        content=content,
+        media_type="application/json",
+        status_code=status_code,
+        headers=headers
+    )
+
+# ============ 响应格式 ============
+# records: {"success", "data": [{...}, ...]}           (默认, 与旧版一致)
+# columns: {"success", "columns": [...], "data": {列名: [...]}}
+# arrow / parquet: 二进制表, 元信息放在响应头 (X-Count / Age / Warning)
+RESPONSE_FORMATS = ("records", "columns", "arrow", "parquet")
+ARROW_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class OutputOptions:
+    """数据端点通用的 fields / format 查询参数"""
+
+    def __init__(
+        self,
+        request: Request,
+        fields: Optional[str] = Query(None, description="逗号分隔的输出字段, 默认全部"),
+        format: str = Query("records", description="输出格式: records / columns / arrow / parquet")
+    ):
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        self.format = format
+        self.if_none_match = request.headers.get("if-none-match", "")
+        self.accept_encoding = request.headers.get("accept-encoding", "")
+
+
+def project_records(records: list, fields: list) -> list:
+    """字段投影: 只保留指定字段 (记录中不存在的字段忽略)"""
+    if not records:
+        return records
+    keys = [f for f in fields if f in records[0]]
+    return [{k: row[k] for k in keys} for row in records]
+
+
+def records_to_columns(records: list) -> tuple:
+    """对象数组 -> (列名列表, {列名: 值列表})"""
+    columns = list(dict.fromkeys(key for row in records for key in row))
+    return columns, {col: [row.get(col) for row in records] for col in columns}
+
+
+def _arrow_table(records: list):
+    """对象数组 -> pyarrow.Table (混合类型的列退回字符串)"""
+    columns, data = records_to_columns(records)
+    arrays = []
+    for col in columns:
+        try:
+            arrays.append(pyarrow.array(data[col]))
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            arrays.append(pyarrow.array([None if v is None else str(v) for v in data[col]]))
+    return pyarrow.Table.from_arrays(arrays, names=columns)
+
+
+def encode_arrow(records: list, fmt: str) -> bytes:
+    """编码为 Arrow IPC 流或 Parquet 文件"""
+    table = _arrow_table(records)
+    sink = pyarrow.BufferOutputStream()
+    if fmt == "arrow":
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pyarrow.parquet.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
+
+
+# ============ 响应表示缓存 ============
+# 同一份缓存数据 (同一数据 ETag) 在同一投影 / 格式下的编码结果只计算一次,
+# 压缩副本按需生成后随之保留; 客户端带 If-None-Match 且未变化时直接返回 304
+AKSHARE_REPR_CACHE_MAX_MB = int(os.environ.get("AKSHARE_REPR_CACHE_MAX_MB", "64"))
+AKSHARE_COMPRESS_MIN_BYTES = int(os.environ.get("AKSHARE_COMPRESS_MIN_BYTES", "1024"))
+
+# 当前请求的数据来源: (缓存 Key, 数据 ETag), 由 cached_call 在命中或回源写入时设置
+response_source = contextvars.ContextVar("response_source", default=None)
+
+
+def content_etag(body: bytes) -> str:
+    """内容哈希 (用作 ETag)"""
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def pick_encoding(accept_encoding: str) -> str:
+    """按 Accept-Encoding 选择压缩方式 (br 优先, 其次 gzip, 都不接受时不压缩)"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, param = part.partition(";")
+        q = 1.0
+        param = param.strip()
+        if param.startswith("q="):
+            try:
+                q = float(param[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 弱比较"""
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+class Representation:
+    """一种输出格式的编码结果 (未压缩字节 + ETag) 及其压缩副本"""
+
+    def __init__(self, body: bytes, media_type: str, headers: dict):
+        self.body = body
+        self.media_type = media_type
+        self.headers = headers
+        # 压缩副本与原文内容相同, 使用弱 ETag
+        self.etag = f'W/"{content_etag(body)}"'
+        self.variants = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+
+class RepresentationCache:
+    """编码结果的 LRU 缓存, 按字节数 (含压缩副本) 计入内存预算"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: tuple) -> Optional[Representation]:
+        rep = self._entries.get(key)
+        if rep is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return rep
+
+    def put(self, key: tuple, rep: Representation):
+        if rep.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.current_bytes -= self._entries.pop(key).size
+        self._entries[key] = rep
+        self.current_bytes += rep.size
+        self._evict()
+
+    def grow(self, key: tuple, delta: int):
+        """条目新增了压缩副本"""
+        if key in self._entries:
+            self.current_bytes += delta
+            self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, rep = self._entries.popitem(last=False)
+            self.current_bytes -= rep.size
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+representation_cache = RepresentationCache(max_bytes=AKSHARE_REPR_CACHE_MAX_MB * 1024 * 1024)
+
+
+def build_representation(payload: dict, output: OutputOptions) -> Representation:
+    """按 fields / format 编码成功结果; age 放在响应头, 不写入响应体 (保证同一数据的字节稳定)"""
+    payload = {k: v for k, v in payload.items() if k != "age"}
+    data = payload["data"]
+    # 单条记录 (如 /hk/basic) 按一行处理, records 格式下保持对象
+    single = isinstance(data, dict)
+    records = [data] if single else data
+    if output.fields:
+        records = project_records(records, output.fields)
+
+    if output.format == "records":
+        body = json_dumps_bytes({**payload, "data": records[0] if single else records})
+        return Representation(body, "application/json", {})
+
+    if output.format == "columns":
+        columns, values = records_to_columns(records)
+        body = json_dumps_bytes({**payload, "columns": columns, "data": values})
+        return Representation(body, "application/json", {})
+
+    body = encode_arrow(records, output.format)
+    return Representation(body, ARROW_MEDIA_TYPES[output.format], {"X-Count": str(len(records))})
+
+
+def data_response(payload: dict, output: OutputOptions) -> Response:
+    """按 fields / format 输出数据端点结果 (带 ETag / 304 / 压缩); 失败结果始终返回 JSON"""
+    if output.format not in RESPONSE_FORMATS:
+        return json_response({
+            "success": False,
+            "error": f"Invalid format: {output.format}. Must be one of: {', '.join(RESPONSE_FORMATS)}",
+            "data": []
+        }, status_code=400)
+    if output.format in ARROW_MEDIA_TYPES and pyarrow is None:
+        return json_response({
+            "success": False,
+            "error": f"format={output.format} requires pyarrow (pip install pyarrow)",
+            "data": []
+        }, status_code=400)
+
+    if not payload.get("success"):
+        # 参数错误由端点直接返回 400, 到这里的失败都来自上游或数据处理
+        return json_response(payload, status_code=502)
+    if payload.get("data") is None:
+        return json_response(payload)
+
+    # 来自缓存的数据: 同一 (Key, 数据 ETag, 过期标记, 投影, 格式) 复用编码结果
+    source = response_source.get()
+    rep_key = None
+    if source is not None:
+        rep_key = (*source, bool(payload.get("stale")), tuple(output.fields or ()), output.format)
+    rep = representation_cache.get(rep_key) if rep_key is not None else None
+    if rep is None:
+        started = time.perf_counter()
+        rep = build_representation(payload, output)
+        record_timing("serialize", time.perf_counter() - started)
+        if rep_key is not None:
+            representation_cache.put(rep_key, rep)
+
+    headers = {**rep.headers, "ETag": rep.etag}
+    if "age" in payload:
+        headers["Age"] = str(payload["age"])
+    if payload.get("stale"):
+        headers["Warning"] = '110 - "Response is Stale"'
+    # Parquet 内部已按列压缩, 不再整体压缩
+    compressible = len(rep.body) >= AKSHARE_COMPRESS_MIN_BYTES and output.format != "parquet"
+    if compressible:
+        # 304 也要带上与 200 相同的 Vary, 缓存才能按编码区分副本
+        headers["Vary"] = "Accept-Encoding"
+    if output.if_none_match and etag_matches(output.if_none_match, rep.etag):
+        representation_cache.not_modified += 1
+        metrics.inc("akshare_http_not_modified_total")
+        return Response(status_code=304, headers=headers)
+
+    content = rep.body
+    if compressible:
+        encoding = pick_encoding(output.accept_encoding)
+        if encoding != "identity":
+            content = rep.variants.get(encoding)
+            if content is None:
+                started = time.perf_counter()
+                content = compress_body(rep.body, encoding)
+                record_timing("serialize", time.perf_counter() - started)
+                rep.variants[encoding] = content
+                if rep_key is not None:
+                    representation_cache.grow(rep_key, len(content))
+            headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=rep.media_type, headers=headers)
+
+
+# 创建 FastAPI 应用
+app = FastAPI(
+    title="AKShare HK Stock Proxy",
+    description="港股财务数据代理服务 - 为 Finspark 提供港股三大财务报表数据",
+    version="1.0.0"
+)
+
+# CORS 配置 - 允许所有来源
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+# ============ 监控指标 ============
+# 进程内 Prometheus 指标, GET /metrics 以文本格式导出 (不依赖 prometheus_client)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2)
+
+
+class Metrics:
+    """
+    最小化的 Prometheus 指标注册表
+
+    - counter / gauge: 按 (指标名, 标签) 存一个数值
+    - histogram: 累积桶计数 + sum + count
+    """
+
+    def __init__(self):
+        self._meta = {}        # name -> (type, help, buckets)
+        self._values = {}      # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: [bucket_counts, sum, count]}
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: tuple = ()):
+        self._meta[name] = (kind, help_text, buckets)
+        if kind == "histogram":
+            self._histograms[name] = {}
+        else:
+            self._values[name] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        series = self._values[name]
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        self._values[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self._histograms[name]
+        key = tuple(sorted(labels.items()))
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = [[0] * len(self._meta[name][2]), 0.0, 0]
+        for i, bound in enumerate(self._meta[name][2]):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @staticmethod
+    def _labels(key: tuple, extra: str = "") -> str:
+        parts = [f'{k}="{str(v)}"' for k, v in key]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text, buckets) in self._meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for key, (counts, total, count) in self._histograms[name].items():
+                    for bound, bucket_count in zip(buckets, counts):
+                        le = 'le="%s"' % bound
+                        lines.append(f"{name}_bucket{self._labels(key, le)} {bucket_count}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{name}_bucket{self._labels(key, le)} {count}")
+                    lines.append(f"{name}_sum{self._labels(key)} {total}")
+                    lines.append(f"{name}_count{self._labels(key)} {count}")
+            else:
+                for key, value in self._values[name].items():
+                    lines.append(f"{name}{self._labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("akshare_http_requests_total", "counter", "HTTP 请求数 (按路由/状态码)")
+metrics.describe("akshare_http_request_duration_seconds", "histogram", "HTTP 请求耗时", LATENCY_BUCKETS)
+metrics.describe("akshare_http_requests_in_flight", "gauge", "处理中的 HTTP 请求数")
+metrics.describe("akshare_http_response_bytes", "histogram", "HTTP 响应体字节数", BYTES_BUCKETS)
+metrics.describe("akshare_upstream_calls_total", "counter", "ak.* 调用次数")
+metrics.describe("akshare_upstream_errors_total", "counter", "ak.* 调用异常次数")
+metrics.describe("akshare_upstream_duration_seconds", "histogram", "ak.* 调用耗时 (不含排队)", LATENCY_BUCKETS)
+metrics.describe("akshare_upstream_timeouts_total", "counter", "ak.* 调用超时次数")
+metrics.describe("akshare_upstream_retries_total", "counter", "ak.* 临时性错误重试次数")
+metrics.describe("akshare_upstream_breaker_open", "gauge", "熔断器状态 (0=closed, 1=half_open, 2=open)")
+metrics.describe("akshare_upstream_queue_wait_seconds", "histogram", "ak.* 调用排队耗时 (限流 + 并发名额)", LATENCY_BUCKETS)
+metrics.describe("akshare_upstream_in_flight", "gauge", "执行中的 ak.* 调用数")
+metrics.describe("akshare_upstream_waiting", "gauge", "排队等待并发名额的 ak.* 调用数")
+metrics.describe("akshare_cache_requests_total", "counter", "响应缓存查询次数 (tier=memory/disk, result=hit/stale/miss)")
+metrics.describe("akshare_cache_hit_ratio", "gauge", "响应缓存命中率 (含旧副本)")
+metrics.describe("akshare_cache_entries", "gauge", "响应缓存条目数")
+metrics.describe("akshare_cache_bytes", "gauge", "响应缓存占用字节数")
+metrics.describe("akshare_disk_cache_entries", "gauge", "磁盘缓存条目数 (含已过期未清理的条目)")
+metrics.describe("akshare_repr_cache_bytes", "gauge", "编码后响应 (含压缩副本) 占用字节数")
+metrics.describe("akshare_http_not_modified_total", "counter", "If-None-Match 命中返回 304 的次数")
+
+# 当前请求的分阶段耗时 (queue / upstream / serialize), 用于 Server-Timing 响应头
+# 子任务复制上下文时共享同一个 dict, 合并后的上游调用只计入发起方请求
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+# 当前请求的上游优先级: interactive (默认) 先于 bulk 获得限流令牌
+# 客户端可用 X-Priority: bulk 声明批量任务; 后台任务 (预热/刷新) 固定为 bulk
+request_priority = contextvars.ContextVar("request_priority", default="interactive")
+BULK_ROUTES = {"/hk/all_stocks", "/hk/stock_list"}
+
+
+def record_timing(phase: str, seconds: float):
+    """累加当前请求某阶段的耗时 (不在请求上下文中时忽略)"""
+    timings = request_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+def _route_match(scope) -> tuple:
+    """
+    返回 (路由模板, 路径参数); 路由模板作为指标标签 (如 /hk/kline/{stock_code}),
+    避免按股票代码发散
+    """
+    for route in app.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return route.path, child_scope.get("path_params", {})
+    return "unmatched", {}
+
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """记录请求数、耗时、在途数、响应大小, 并写入 Server-Timing"""
+    route, path_params = _route_match(request.scope)
+    # 热门股票计数: 每个请求只计一次 (多代码的 /hk/indicators、/hk/batch 在端点内计数)
+    if route.startswith("/hk/") and "stock_code" in path_params:
+        hot_codes.record(normalize_hk_code(path_params["stock_code"]))
+    timings = {}
+    token = request_timings.set(timings)
+    priority = request.headers.get("x-priority", "").lower()
+    if priority not in ("interactive", "bulk"):
+        priority = "bulk" if route in BULK_ROUTES else "interactive"
+    request_priority.set(priority)
+    metrics.inc("akshare_http_requests_in_flight", route=route)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        request_timings.reset(token)
+        metrics.inc("akshare_http_requests_in_flight", -1, route=route)
+        metrics.inc("akshare_http_requests_total", route=route, method=request.method, status=status)
+        metrics.observe("akshare_http_request_duration_seconds", elapsed, route=route)
+
+    size = response.headers.get("content-length")
+    if size is not None:
+        metrics.observe("akshare_http_response_bytes", int(size), route=route)
+
+    # 并发的上游调用会重叠, transform 取剩余时间且不小于 0
+    queue_s = min(timings.get("queue", 0.0), elapsed)
+    upstream_s = min(timings.get("upstream", 0.0), elapsed - queue_s)
+    serialize_s = timings.get("serialize", 0.0)
+    transform_s = max(elapsed - queue_s - upstream_s - serialize_s, 0.0)
+    response.headers["Server-Timing"] = (
+        f"queue;dur={queue_s * 1000:.1f}, upstream;dur={upstream_s * 1000:.1f}, "
+        f"transform;dur={transform_s * 1000:.1f}, serialize;dur={serialize_s * 1000:.1f}, "
+        f"total;dur={elapsed * 1000:.1f}"
+    )
+    return response
+
+
+# ============ 上游调用执行层 ============
+# AKShare 接口全部是同步阻塞调用 (requests + pandas 解析),
+# 统一放到线程池/进程池中执行, 避免一次慢请求卡住整个事件循环
+
+def _parse_limits(raw: str) -> dict:
+    """解析并发上限配置, 格式: "stock_hk_hist=8,stock_hk_spot_em=1" """
+    limits = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        try:
+            limits[name.strip()] = max(1, int(value))
+        except ValueError:
+            print(f"[AkshareProxy] 忽略无效的并发配置: {item}")
+    return limits
+
+
+# 执行器类型: thread (默认) / process (pandas 解析较重时可切换)
+AKSHARE_EXECUTOR = os.environ.get("AKSHARE_EXECUTOR", "thread").lower()
+AKSHARE_MAX_WORKERS = int(os.environ.get("AKSHARE_MAX_WORKERS", "16"))
+# 未单独配置的上游函数的默认并发上限
+AKSHARE_DEFAULT_CONCURRENCY = int(os.environ.get("AKSHARE_DEFAULT_CONCURRENCY", "4"))
+# 全量下载类接口单次就要数秒, 并发打过去只会被东方财富限流
+AKSHARE_CONCURRENCY_LIMITS = {
+    "stock_hk_spot_em": 1,
+    "stock_hk_ggt_components_em": 1,
+    **_parse_limits(os.environ.get("AKSHARE_CONCURRENCY_LIMITS", "")),
+}
+
+
+# 上游限流 (令牌桶, 次/秒): 所有 ak.* 共用一个桶 (都打到东方财富), 可按函数单独配置桶
+# 0 表示不限流
+AKSHARE_RATE_LIMIT = float(os.environ.get("AKSHARE_RATE_LIMIT", "10"))
+AKSHARE_RATE_BURST = int(os.environ.get("AKSHARE_RATE_BURST", "20"))
+AKSHARE_RATE_LIMITS = _parse_limits(os.environ.get("AKSHARE_RATE_LIMITS", ""))
+
+# 单次 ak.* 调用的超时 (秒), 全量下载类接口单独放宽
+AKSHARE_CALL_TIMEOUT = int(os.environ.get("AKSHARE_CALL_TIMEOUT", "30"))
+AKSHARE_CALL_TIMEOUTS = {
+    "stock_hk_spot_em": 90,
+    **_parse_limits(os.environ.get("AKSHARE_CALL_TIMEOUTS", "")),
+}
+# 临时性错误 (超时/网络) 的重试次数和退避基数 (秒)
+AKSHARE_RETRIES = int(os.environ.get("AKSHARE_RETRIES", "2"))
+AKSHARE_RETRY_BACKOFF = float(os.environ.get("AKSHARE_RETRY_BACKOFF", "0.5"))
+# 熔断: 连续失败次数阈值和熔断时长 (秒)
+AKSHARE_BREAKER_THRESHOLD = int(os.environ.get("AKSHARE_BREAKER_THRESHOLD", "5"))
+AKSHARE_BREAKER_COOLDOWN = int(os.environ.get("AKSHARE_BREAKER_COOLDOWN", "30"))
+
+# 本地数据目录 (K线存储、录制数据等)
+AKSHARE_DATA_DIR = os.environ.get(
+    "AKSHARE_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "akshare_data")
+)
+
+# 上游录制/回放: off (默认) / record (调用上游并落盘) / replay (只读录制数据, 不访问上游)
+AKSHARE_FIXTURE_MODE = os.environ.get("AKSHARE_FIXTURE_MODE", "off").lower()
+AKSHARE_FIXTURE_DIR = os.environ.get("AKSHARE_FIXTURE_DIR", os.path.join(AKSHARE_DATA_DIR, "fixtures"))
+
+
+class FixtureStore:
+    """
+    ak.* 调用结果的录制与回放
+
+    - 按 (函数名, 排序后的参数) 的摘要存为 <dir>/<函数名>/<摘要>.parquet,
+      未安装 pyarrow 或列类型无法写入 Parquet 时退回 .pkl
+    - 摘要不含 VOLATILE_KWARGS (如增量同步的 end_date=今天), 录制数据在之后的日期仍能回放
+    - manifest.jsonl 记录每个文件对应的调用参数, 便于查看录制了哪些股票
+    - 回放读到的 DataFrame 常驻内存, 重复调用不再读盘
+    """
+
+    VOLATILE_KWARGS = ("end_date",)
+
+    def __init__(self, root: str):
+        self.root = root
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def digest(cls, func_name: str, kwargs: dict) -> str:
+        items = sorted((k, v) for k, v in kwargs.items() if k not in cls.VOLATILE_KWARGS)
+        raw = json.dumps([func_name, items], ensure_ascii=False, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+    def _base(self, func_name: str, kwargs: dict) -> str:
+        return os.path.join(self.root, func_name, self.digest(func_name, kwargs))
+
+    def load(self, func_name: str, kwargs: dict) -> pd.DataFrame:
+        base = self._base(func_name, kwargs)
+        with self._lock:
+            frame = self._frames.get(base)
+        if frame is not None:
+            return frame
+
+        if pyarrow is not None and os.path.exists(base + ".parquet"):
+            frame = pd.read_parquet(base + ".parquet")
+        elif os.path.exists(base + ".pkl"):
+            frame = pd.read_pickle(base + ".pkl")
+        else:
+            raise LookupError(f"未录制的上游调用: {func_name}({kwargs})")
+
+        with self._lock:
+            self._frames[base] = frame
+        return frame
+
+    def save(self, func_name: str, kwargs: dict, df):
+        if not isinstance(df, pd.DataFrame):
+            return
+        base = self._base(func_name, kwargs)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+
+        # 先写临时文件再替换, 并发录制同一调用时不会读到半个文件
+        path = None
+        if pyarrow is not None:
+            try:
+                df.to_parquet(base + ".parquet.tmp")
+                os.replace(base + ".parquet.tmp", base + ".parquet")
+                path = base + ".parquet"
+            except Exception:
+                # 混合类型的 object 列无法写入 Parquet
+                if os.path.exists(base + ".parquet.tmp"):
+                    os.remove(base + ".parquet.tmp")
+        if path is None:
+            df.to_pickle(base + ".pkl.tmp")
+            os.replace(base + ".pkl.tmp", base + ".pkl")
+            path = base + ".pkl"
+
+        entry = {
+            "func": func_name,
+            "kwargs": kwargs,
+            "file": os.path.relpath(path, self.root),
+            "rows": len(df),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with self._lock:
+            with open(os.path.join(self.root, "manifest.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+
+fixture_store = FixtureStore(AKSHARE_FIXTURE_DIR)
+
+
+# akshare 依赖树很大 (导入耗时数秒), 延迟到首次调用或启动后的后台预热时导入
+_ak = None
+_ak_lock = threading.Lock()
+
+
+def get_ak():
+    """导入并返回 akshare 模块 (线程安全, 只导入一次)"""
+    global _ak
+    if _ak is None:
+        with _ak_lock:
+            if _ak is None:
+                # AKShare 内部的 requests 调用大多没有设置超时, 用 socket 默认超时兜底,
+                # 避免挂死的连接一直占用工作线程; 在导入 akshare 时设置 (进程池子进程同样经过这里),
+                # 只导入本模块的脚本和子进程不受影响
+                socket.setdefaulttimeout(max([AKSHARE_CALL_TIMEOUT, *AKSHARE_CALL_TIMEOUTS.values()]))
+                import akshare
+                _ak = akshare
+    return _ak
+
+
+def akshare_version() -> str:
+    """已导入时返回 akshare 版本, 不触发导入"""
+    module = _ak or sys.modules.get("akshare")
+    if module is None:
+        return "not_loaded"
+    return getattr(module, "__version__", "unknown")
+
+
+def _invoke_ak(func_name: str, kwargs: dict):
+    """在工作线程/子进程中执行 AKShare 调用 (模块级函数, 便于进程池序列化)"""
+    if AKSHARE_FIXTURE_MODE == "replay":
+        return fixture_store.load(func_name, kwargs)
+
+    result = getattr(get_ak(), func_name)(**kwargs)
+    if AKSHARE_FIXTURE_MODE == "record":
+        try:
+            fixture_store.save(func_name, kwargs, result)
+        except Exception as e:
+            print(f"[AkshareProxy] 录制失败: {func_name}: {e}", file=sys.stderr)
+    return result
+
+
+def _init_worker(module_name: str):
+    """
+    进程池子进程初始化 (spawn 启动, 不继承主进程的 sys.modules):
+    主进程用替身 (如 akshare_stub) 替换了 akshare 时, 子进程做同样的替换
+    """
+    if module_name != "akshare":
+        sys.modules["akshare"] = importlib.import_module(module_name)
+
+
+def _warm_worker() -> int:
+    """执行池预热任务: 回放模式以外导入 akshare"""
+    if AKSHARE_FIXTURE_MODE != "replay":
+        get_ak()
+    return os.getpid()
+
+
+PRIORITIES = {"interactive": 0, "bulk": 1}
+
+
+class PriorityRateLimiter:
+    """
+    带优先级的令牌桶
+
+    - 每秒补充 rate 个令牌, 最多积累 burst 个
+    - 令牌不足时排队, 按 (优先级, 到达顺序) 依次发放, interactive 总是先于 bulk
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._waiters = []  # heap: (priority, seq, future)
+        self._seq = 0
+        self._dispatcher = None
+        self.granted = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: str):
+        """取一个令牌, 返回排队耗时 (秒)"""
+        self._refill()
+        if self.tokens >= 1 and not self._waiters:
+            self.tokens -= 1
+            self.granted += 1
+            return 0.0
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._waiters, (PRIORITIES.get(priority, 0), self._seq, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+        return time.monotonic() - started
+
+    async def _dispatch(self):
+        while self._waiters:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # 等待方已取消
+                continue
+            self.tokens -= 1
+            self.granted += 1
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        waiting = {}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                name = "bulk" if priority else "interactive"
+                waiting[name] = waiting.get(name, 0) + 1
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "granted": self.granted,
+            "waiting": waiting,
+        }
+
+
+class UpstreamExecutor:
+    """
+    AKShare 调用执行器
+
+    - 所有 ak.* 调用在线程池/进程池中执行
+    - 每个上游函数独立的并发上限 (asyncio.Semaphore)
+    - 记录排队深度、运行数、调用次数和耗时
+    """
+
+    def __init__(self, kind: str, max_workers: int, default_limit: int, limits: dict,
+                 rate: float = 0, burst: int = 1, rate_limits: Optional[dict] = None):
+        self.kind = "process" if kind == "process" else "thread"
+        self.max_workers = max_workers
+        self.default_limit = default_limit
+        self.limits = limits
+        self.rate = rate
+        self.burst = burst
+        self.rate_limits = rate_limits or {}
+        self._pool = None
+        self._semaphores = {}
+        self._limiters = {}
+        self._stats = {}
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.kind == "process":
+                # spawn: 主进程已有线程、sqlite 连接和事件循环, fork 出的子进程可能死锁
+                module = sys.modules.get("akshare")
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(module.__name__ if module is not None else "akshare",)
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="akshare"
+                )
+        return self._pool
+
+    def _get_stats(self, func_name: str) -> dict:
+        if func_name not in self._stats:
+            self._stats[func_name] = {
+                "waiting": 0,
+                "running": 0,
+                "calls": 0,
+                "errors": 0,
+                "timeouts": 0,
+                "total_seconds": 0.0,
+            }
+        return self._stats[func_name]
+
+    def _get_limiter(self, func_name: str) -> Optional[PriorityRateLimiter]:
+        """单独配置了速率的函数用自己的桶, 其余共用 default 桶; 回放模式不限流"""
+        if AKSHARE_FIXTURE_MODE == "replay":
+            return None
+        name = func_name if func_name in self.rate_limits else "default"
+        rate = self.rate_limits.get(func_name, self.rate)
+        if rate <= 0:
+            return None
+        if name not in self._limiters:
+            self._limiters[name] = PriorityRateLimiter(rate, max(self.burst, 1))
+        return self._limiters[name]
+
+    def _get_semaphore(self, func_name: str) -> asyncio.Semaphore:
+        if func_name not in self._semaphores:
+            limit = self.limits.get(func_name, self.default_limit)
+            self._semaphores[func_name] = asyncio.Semaphore(limit)
+        return self._semaphores[func_name]
+
+    async def call(self, func_name: str, **kwargs):
+        """在执行池中调用 ak.<func_name>(**kwargs), 受该函数的并发上限约束"""
+        stats = self._get_stats(func_name)
+        semaphore = self._get_semaphore(func_name)
+        limiter = self._get_limiter(func_name)
+        priority = request_priority.get()
+
+        stats["waiting"] += 1
+        queued = time.perf_counter()
+        try:
+            if limiter is not None:
+                await limiter.acquire(priority)
+            await semaphore.acquire()
+        finally:
+            stats["waiting"] -= 1
+            waited = time.perf_counter() - queued
+            metrics.observe("akshare_upstream_queue_wait_seconds", waited, func=func_name, priority=priority)
+            record_timing("queue", waited)
+
+        stats["running"] += 1
+        started = time.perf_counter()
+        release = True
+        try:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_pool(), _invoke_ak, func_name, kwargs)
+            timeout = AKSHARE_CALL_TIMEOUTS.get(func_name, AKSHARE_CALL_TIMEOUT)
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                # 工作线程无法强制中断: 等它真正结束后才归还并发名额,
+                # 避免继续往挂死的上游堆积请求
+                release = False
+                future.add_done_callback(lambda f: self._release_late(f, semaphore))
+                stats["timeouts"] += 1
+                metrics.inc("akshare_upstream_timeouts_total", func=func_name)
+                raise UpstreamTimeout(f"{func_name} 超时 ({timeout}s)")
+        except Exception:
+            stats["errors"] += 1
+            metrics.inc("akshare_upstream_errors_total", func=func_name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats["running"] -= 1
+            stats["calls"] += 1
+            stats["total_seconds"] += elapsed
+            metrics.inc("akshare_upstream_calls_total", func=func_name)
+            metrics.observe("akshare_upstream_duration_seconds", elapsed, func=func_name)
+            record_timing("upstream", elapsed)
+            if release:
+                semaphore.release()
+
+    @staticmethod
+    def _release_late(future, semaphore: asyncio.Semaphore):
+        """超时调用真正结束时归还名额, 并取走其异常 (调用方早已放弃等待)"""
+        semaphore.release()
+        if not future.cancelled():
+            future.exception()
+
+    def snapshot(self) -> dict:
+        """执行器状态 (供 /health 展示)"""
+        functions = {}
+        for name, stats in self._stats.items():
+            functions[name] = {
+                "limit": self.limits.get(name, self.default_limit),
+                "waiting": stats["waiting"],
+                "running": stats["running"],
+                "calls": stats["calls"],
+                "errors": stats["errors"],
+                "timeouts": stats["timeouts"],
+                "avg_ms": round(stats["total_seconds"] / stats["calls"] * 1000, 1) if stats["calls"] else 0,
+            }
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "queue_depth": sum(s["waiting"] for s in self._stats.values()),
+            "running": sum(s["running"] for s in self._stats.values()),
+            "rate_limiters": {name: limiter.stats() for name, limiter in self._limiters.items()},
+            "functions": functions,
+        }
+
+    def export_metrics(self):
+        """把排队/运行中的调用数和熔断状态写入 gauge"""
+        for name, stats in self._stats.items():
+            metrics.set("akshare_upstream_in_flight", stats["running"], func=name)
+            metrics.set("akshare_upstream_waiting", stats["waiting"], func=name)
+        states = {"closed": 0, "half_open": 1, "open": 2}
+        for name, breaker in upstream_breakers.items():
+            metrics.set("akshare_upstream_breaker_open", states[breaker.state], func=name)
+
+    async def warm(self):
+        """预先创建执行池的全部工作线程/子进程 (子进程同时完成 akshare 导入)"""
+        pool = self._get_pool()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _warm_worker) for _ in range(self.max_workers)))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class UpstreamTimeout(TimeoutError):
+    """ak.* 调用超时"""
+
+
+class UpstreamUnavailable(Exception):
+    """上游处于熔断状态, 请求未发出"""
+
+
+# 可重试的临时性错误: 超时、连接失败 (requests 的异常均继承自 OSError)
+TRANSIENT_ERRORS = (TimeoutError, asyncio.TimeoutError, OSError)
+
+
+class CircuitBreaker:
+    """
+    单个上游函数的熔断器
+
+    - closed: 正常放行, 连续 threshold 次临时性错误后转为 open
+    - open: 直接拒绝 (UpstreamUnavailable), cooldown 秒后转为 half_open
+    - half_open: 只放行一个探测请求, 成功则恢复 closed, 失败重新 open
+    """
+
+    def __init__(self, name: str, threshold: int, cooldown: float):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._probe_started = None
+
+    def allow(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.rejected += 1
+                raise UpstreamUnavailable(f"{self.name} 熔断中, {self.cooldown}s 内不再请求上游")
+            self.state = "half_open"
+        if self.state == "half_open":
+            # 探测请求被取消时不会回报结果, 超过 cooldown 后允许新的探测
+            if self._probe_started is not None and time.monotonic() - self._probe_started < self.cooldown:
+                self.rejected += 1
+                raise UpstreamUnavailable(f"{self.name} 熔断探测中")
+            self._probe_started = time.monotonic()
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_started = None
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self.trips += 1
+                print(f"[AkshareProxy] 上游熔断: {self.name}, 连续失败 {self.failures} 次", file=sys.stderr)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class SingleFlight:
+    """
+    相同请求合并 (single-flight)
+
+    同一个 key 在途时, 后来的调用方直接等待第一个调用的结果, 不再重复请求上游。
+    上游调用以独立 Task 运行, 某个调用方断开 (取消) 不会影响其他等待者。
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都已取消时, 由这里取走异常, 避免 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+upstream = UpstreamExecutor(
+    kind=AKSHARE_EXECUTOR,
+    max_workers=AKSHARE_MAX_WORKERS,
+    default_limit=AKSHARE_DEFAULT_CONCURRENCY,
+    limits=AKSHARE_CONCURRENCY_LIMITS,
+    rate=AKSHARE_RATE_LIMIT,
+    burst=AKSHARE_RATE_BURST,
+    rate_limits=AKSHARE_RATE_LIMITS,
+)
+upstream_flight = SingleFlight()
+upstream_breakers = {}
+upstream_retries = {}
+
+
+def get_breaker(func_name: str) -> CircuitBreaker:
+    if func_name not in upstream_breakers:
+        upstream_breakers[func_name] = CircuitBreaker(
+            func_name, AKSHARE_BREAKER_THRESHOLD, AKSHARE_BREAKER_COOLDOWN
+        )
+    return upstream_breakers[func_name]
+
+
+async def resilient_call(func_name: str, kwargs: dict):
+    """熔断检查 + 超时 + 临时性错误按抖动指数退避重试"""
+    breaker = get_breaker(func_name)
+    for attempt in range(AKSHARE_RETRIES + 1):
+        breaker.allow()
+        try:
+            result = await upstream.call(func_name, **kwargs)
+        except TRANSIENT_ERRORS as e:
+            breaker.record_failure()
+            if attempt == AKSHARE_RETRIES or breaker.state == "open":
+                raise
+            delay = random.uniform(0, AKSHARE_RETRY_BACKOFF * 2 ** attempt)
+            upstream_retries[func_name] = upstream_retries.get(func_name, 0) + 1
+            metrics.inc("akshare_upstream_retries_total", func=func_name)
+            print(f"[AkshareProxy] {func_name} 临时性错误, {delay:.2f}s 后重试: {e}", file=sys.stderr)
+            await asyncio.sleep(delay)
+        except Exception:
+            # 非临时性错误 (如参数无效) 说明上游可达, 不计入熔断
+            breaker.record_success()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+def breaker_snapshot() -> dict:
+    """各上游函数的熔断状态和重试次数 (供 /health 展示)"""
+    return {
+        name: {**breaker.snapshot(), "retries": upstream_retries.get(name, 0)}
+        for name, breaker in upstream_breakers.items()
+    }
+
+
+async def call_ak(func_name: str, **kwargs):
+    """
+    异步调用 AKShare 接口 (所有路由都应通过此函数访问上游)
+
+    相同 (函数, 参数) 的并发调用会合并为一次上游请求, 调用方拿到的是同一个
+    DataFrame 对象, 只能读取, 不要原地修改。上游调用带超时、重试和熔断。
+    """
+    key = (func_name, tuple(sorted(kwargs.items())))
+    return await upstream_flight.do(key, lambda: resilient_call(func_name, kwargs))
+
+
+@app.on_event("shutdown")
+async def shutdown_upstream():
+    upstream.shutdown()
+
+
+# ============ 响应缓存 ============
+# 与 TypeScript 端 AkshareHKService 的 CACHE_TTL 保持一致 (单位: 秒)
+CACHE_TTL = {
+    "financial": 24 * 3600,        # 财务报表: 24小时
+    "kline": 5 * 60,               # K线/行情: 5分钟
+    "basic": 7 * 24 * 3600,        # 股票基本信息/列表: 7天
+    "company": 3 * 24 * 3600,      # 公司信息: 3天
+    "fina_indicator": 24 * 3600,   # 财务指标: 24小时
+}
+
+# 过期后仍可作为旧副本返回的时长 (单位: 秒)
+# 窗口内的请求立即拿到旧副本并触发后台刷新, 上游故障时继续返回旧副本
+CACHE_STALE = {
+    "financial": 7 * 24 * 3600,
+    "kline": 24 * 3600,
+    "basic": 30 * 24 * 3600,
+    "company": 30 * 24 * 3600,
+    "fina_indicator": 7 * 24 * 3600,
+}
+
+# 上游失败、由本地存储兜底的结果 (loader 返回 stale: true) 只短暂缓存, 到期后重新回源
+AKSHARE_DEGRADED_TTL = float(os.environ.get("AKSHARE_DEGRADED_TTL", "30"))
+
+# 进程内缓存的内存预算
+AKSHARE_CACHE_MAX_MB = int(os.environ.get("AKSHARE_CACHE_MAX_MB", "256"))
+# 磁盘缓存: 多个 uvicorn worker 共享, 重启后仍然有效
+AKSHARE_DISK_CACHE = os.environ.get("AKSHARE_DISK_CACHE", "1") not in ("0", "false", "off")
+# 一个 worker 回源期间, 其他 worker 等待其结果的最长时间 (秒)
+AKSHARE_DISK_CACHE_LEASE = float(os.environ.get("AKSHARE_DISK_CACHE_LEASE", "30"))
+
+
+def normalize_hk_code(stock_code: str) -> str:
+    """标准化港股代码 (去掉 .HK 后缀并补齐到5位)"""
+    code = stock_code.replace('.HK', '').replace('.hk', '').strip()
+    return code.zfill(5)
+
+
+def make_cache_key(endpoint: str, code: str, params: Optional[dict] = None) -> str:
+    """缓存 Key: endpoint:code:排序后的参数"""
+    query = "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+    return f"{endpoint}:{code}:{query}"
+
+
+class ResponseCache:
+    """
+    进程内 TTL 缓存
+
+    - 每个条目独立 TTL, 过期后在 stale 窗口内仍保留旧副本, 读取时惰性淘汰
+    - 按序列化后的字节数计入内存预算, 超出预算时按 LRU 淘汰
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # key -> (stored_at, fresh_until, stale_until, size, value, etag)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        """返回 (value, age 秒, 是否过期, 数据 ETag); 未命中或超出 stale 窗口返回 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, fresh_until, stale_until, size, value, etag = entry
+        now = time.monotonic()
+        if stale_until <= now:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        stale = fresh_until <= now
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return value, int(now - stored_at), stale, etag
+
+    def set(self, key: str, value: Any, ttl: float, size: int, stale_ttl: float = 0, age: float = 0,
+            etag: str = ""):
+        """写入条目; 从磁盘缓存提升的条目带上已有的 age, ttl 可以为负 (已过期)"""
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        now = time.monotonic()
+        self._entries[key] = (now - age, now + ttl, now + ttl + stale_ttl, size, value, etag)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        size = self._entries.pop(key)[3]
+        self.current_bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "revalidations": revalidation_stats["started"],
+            "revalidation_failures": revalidation_stats["failed"],
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0,
+        }
+
+
+response_cache = ResponseCache(max_bytes=AKSHARE_CACHE_MAX_MB * 1024 * 1024)
+
+
+class DiskCache:
+    """
+    磁盘响应缓存 (SQLite, WAL 模式, 每次操作独立连接, 可在线程池中调用)
+
+    - Key 与进程内缓存相同, 值为编码好的 JSON, 时间使用墙钟 (跨进程、跨重启有效)
+    - 租约: 同一 Key 只有一个 worker 回源, 其余 worker 等待写入后直接读取
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pid = os.getpid()
+        self.hits = 0
+        self.writes = 0
+        self.peer_waits = 0
+        # 建库延迟到首次访问, 导入本模块的子进程 (如批量同步的 spawn worker) 不触碰数据库
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _init_schema(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                stored_at REAL NOT NULL,
+                fresh_until REAL NOT NULL,
+                stale_until REAL NOT NULL,
+                body BLOB NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_leases (
+                key TEXT PRIMARY KEY,
+                owner INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            with self._ready_lock:
+                if not self._ready:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    with self._open() as conn:
+                        self._init_schema(conn)
+                    self._ready = True
+        return self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str) -> Optional[tuple]:
+        """返回 (stored_at, fresh_until, stale_until, body), 不存在或超出 stale 窗口返回 None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT stored_at, fresh_until, stale_until, body FROM response_cache "
+                "WHERE key = ? AND stale_until > ?",
+                (key, time.time())
+            ).fetchone()
+        if row is not None:
+            self.hits += 1
+        return row
+
+    def set(self, key: str, body: bytes, ttl: float, stale_ttl: float):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, stored_at, fresh_until, stale_until, body) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, now, now + ttl, now + ttl + stale_ttl, body)
+            )
+            self.writes += 1
+            if self.writes % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM response_cache WHERE stale_until <= ?", (now,))
+                conn.execute("DELETE FROM cache_leases WHERE expires_at <= ?", (now,))
+
+    def recent(self, limit: int) -> list:
+        """最近写入且仍在 stale 窗口内的条目 [(key, stored_at, fresh_until, stale_until, body)], 由新到旧"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT key, stored_at, fresh_until, stale_until, body FROM response_cache "
+                "WHERE stale_until > ? ORDER BY stored_at DESC LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+
+    def lease(self, key: str, seconds: float) -> bool:
+        """获取回源租约; 已被本进程持有也返回 True (进程内由 SingleFlight 合并)"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO cache_leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE cache_leases.expires_at <= ?",
+                (key, self.pid, now + seconds, now)
+            )
+            row = conn.execute("SELECT owner FROM cache_leases WHERE key = ?", (key,)).fetchone()
+        return row is None or row[0] == self.pid
+
+    def leased(self, key: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM cache_leases WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row is not None
+
+    def release(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache_leases WHERE key = ? AND owner = ?", (key, self.pid))
+
+    def count_entries(self, timeout: float = 1.0) -> int:
+        """条目数 (全表 COUNT, 只在 /metrics 中通过线程池调用; 写锁占用超过 timeout 时抛出异常)"""
+        if not self._ready:
+            self._connect().close()
+        with sqlite3.connect(self.path, timeout=timeout) as conn:
+            return conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        """进程内计数, 不访问数据库 (供 /health 使用)"""
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "writes": self.writes,
+            "peer_waits": self.peer_waits,
+        }
+
+
+disk_cache = DiskCache(os.path.join(AKSHARE_DATA_DIR, "response_cache.db")) if AKSHARE_DISK_CACHE else None
+
+
+def _has_data(result: dict) -> bool:
+    """只缓存成功且有数据的结果, 避免把上游的临时失败缓存下来"""
+    return bool(result.get("success")) and bool(result.get("data"))
+
+
+# 预热任务的提前量 (秒): 非 0 时剩余有效期不足该值的条目直接回源
+prewarm_lead = contextvars.ContextVar("prewarm_lead", default=0)
+
+
+class HotCodes:
+    """按请求频率统计热门股票, 计数按半衰期衰减"""
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self._scores = {}
+        self._decayed_at = time.monotonic()
+
+    def record(self, code: str):
+        self._scores[code] = self._scores.get(code, 0.0) + 1
+
+    def decay(self):
+        now = time.monotonic()
+        factor = 0.5 ** ((now - self._decayed_at) / self.half_life)
+        self._decayed_at = now
+        self._scores = {code: score * factor for code, score in self._scores.items() if score * factor >= 0.1}
+
+    def top(self, n: int) -> list:
+        return sorted(self._scores, key=self._scores.get, reverse=True)[:n]
+
+
+hot_codes = HotCodes(half_life=float(os.environ.get("AKSHARE_PREWARM_HALF_LIFE", "3600")))
+
+
+# 正在后台刷新的缓存 Key (同一 Key 只刷新一次) 及其任务引用
+_revalidating = {}
+revalidation_stats = {"started": 0, "failed": 0}
+
+
+async def _load_and_store(key: str, kind: str, loader, cacheable) -> dict:
+    """调用 loader, 结果可缓存时写入进程内和磁盘缓存 (失败结果不会覆盖旧副本)"""
+    result = await loader()
+    # loader 内部嵌套的缓存调用会设置数据来源, 以本条目为准
+    response_source.set(None)
+    if cacheable(result):
+        body = json_dumps_bytes(result)
+        ttl, stale_ttl = CACHE_TTL[kind], CACHE_STALE.get(kind, 0)
+        if result.get("stale"):
+            # 兜底结果: 命中时仍带 stale 标记, 很快过期以便下一个请求重试上游
+            ttl = min(ttl, AKSHARE_DEGRADED_TTL)
+        etag = content_etag(body)
+        response_cache.set(key, result, ttl, len(body), stale_ttl, etag=etag)
+        response_source.set((key, etag))
+        if disk_cache is not None:
+            try:
+                await asyncio.to_thread(disk_cache.set, key, body, ttl, stale_ttl)
+            except sqlite3.Error as e:
+                print(f"[AkshareProxy] 磁盘缓存写入失败: {key}: {e}", file=sys.stderr)
+    return result
+
+
+def _from_disk(key: str, entry: tuple) -> tuple:
+    """磁盘缓存条目 -> (value, age, stale, etag), 同时提升到进程内缓存"""
+    stored_at, fresh_until, stale_until, body = entry
+    now = time.time()
+    value = json_loads_bytes(body)
+    etag = content_etag(body)
+    response_cache.set(key, value, fresh_until - now, len(body), stale_until - fresh_until, now - stored_at, etag)
+    return value, int(now - stored_at), fresh_until <= now, etag
+
+
+async def _disk_lookup(key: str) -> Optional[tuple]:
+    if disk_cache is None:
+        return None
+    try:
+        entry = await asyncio.to_thread(disk_cache.get, key)
+    except sqlite3.Error as e:
+        print(f"[AkshareProxy] 磁盘缓存读取失败: {key}: {e}", file=sys.stderr)
+        return None
+    return _from_disk(key, entry) if entry is not None else None
+
+
+async def _wait_for_peer(key: str) -> Optional[tuple]:
+    """另一个 worker 正在回源: 等它写入磁盘缓存, 租约释放或超时后返回 None"""
+    disk_cache.peer_waits += 1
+    deadline = time.monotonic() + AKSHARE_DISK_CACHE_LEASE
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+        cached = await _disk_lookup(key)
+        if cached is not None:
+            return cached
+        if not await asyncio.to_thread(disk_cache.leased, key):
+            return None
+    return None
+
+
+async def _load_with_lease(key: str, kind: str, loader, cacheable) -> dict:
+    """磁盘缓存未命中时回源, 多个 worker 之间同一 Key 只回源一次"""
+    if disk_cache is None:
+        return await _load_and_store(key, kind, loader, cacheable)
+
+    try:
+        acquired = await asyncio.to_thread(disk_cache.lease, key, AKSHARE_DISK_CACHE_LEASE)
+    except sqlite3.Error:
+        acquired = True
+    if not acquired:
+        cached = await _wait_for_peer(key)
+        if cached is not None:
+            value, age, _, etag = cached
+            response_source.set((key, etag))
+            return {**value, "age": age}
+
+    try:
+        return await _load_and_store(key, kind, loader, cacheable)
+    finally:
+        try:
+            await asyncio.to_thread(disk_cache.release, key)
+        except sqlite3.Error:
+            pass
+
+
+async def _revalidate(key: str, kind: str, loader, cacheable):
+    """后台刷新过期条目 (调用方已拿到旧副本, 按 bulk 优先级回源)"""
+    request_priority.set("bulk")
+    try:
+        result = await _load_and_store(key, kind, loader, cacheable)
+        if not cacheable(result):
+            revalidation_stats["failed"] += 1
+            print(f"[AkshareProxy] 后台刷新未取得数据, 继续使用旧副本: {key}")
+    except Exception as e:
+        revalidation_stats["failed"] += 1
+        print(f"[AkshareProxy] 后台刷新失败, 继续使用旧副本: {key}: {e}")
+    finally:
+        _revalidating.pop(key, None)
+
+
+async def cached_call(kind: str, endpoint: str, code: str, params: Optional[dict],
+                      loader, cacheable=_has_data) -> dict:
+    """
+    带缓存的数据加载 (stale-while-revalidate)
+
+    - 新鲜条目直接返回
+    - 过期但仍在 stale 窗口内: 立即返回旧副本并在后台刷新, 刷新失败时旧副本保留
+    - 缓存命中的结果带 age (秒), 旧副本额外带 stale: true
+    - 进程内未命中时读磁盘缓存 (多 worker 共享, 重启后有效), 仍未命中才回源
+
+    Args:
+        kind: TTL 类别 (CACHE_TTL 的 key)
+        endpoint: 端点名, 参与缓存 Key
+        code: 标准化后的股票代码
+        params: 影响结果的其余参数
+        loader: 无参协程函数, 返回响应 dict
+        cacheable: 判断结果是否可缓存
+    """
+    key = make_cache_key(endpoint, code, params)
+    cached = response_cache.get(key)
+    tier = "memory"
+    if cached is None or cached[2]:
+        # 进程内未命中或已过期: 其他 worker 可能已把更新的结果写入磁盘
+        from_disk = await _disk_lookup(key)
+        if from_disk is not None and (cached is None or not from_disk[2]):
+            cached, tier = from_disk, "disk"
+    lead = prewarm_lead.get()
+    if cached is not None:
+        value, age, stale, etag = cached
+        if lead and CACHE_TTL[kind] - age < lead:
+            # 预热任务: 即将过期的条目提前回源
+            return await _load_and_store(key, kind, loader, cacheable)
+        metrics.inc("akshare_cache_requests_total", endpoint=endpoint, tier=tier,
+                    result="stale" if stale else "hit")
+        response_source.set((key, etag))
+        if not stale:
+            return {**value, "age": age}
+        if key not in _revalidating:
+            revalidation_stats["started"] += 1
+            _revalidating[key] = asyncio.create_task(_revalidate(key, kind, loader, cacheable))
+        return {**value, "age": age, "stale": True}
+
+    metrics.inc("akshare_cache_requests_total", endpoint=endpoint, tier="none", result="miss")
+    return await _load_with_lease(key, kind, loader, cacheable)
+
+
+async def peek_cached(endpoint: str, code: str, params: Optional[dict]) -> Optional[dict]:
+    """只读缓存 (进程内 -> 磁盘, 过期副本也返回), 从不回源; 未缓存返回 None"""
+    key = make_cache_key(endpoint, code, params)
+    cached = response_cache.get(key)
+    if cached is None:
+        cached = await _disk_lookup(key)
+    return cached[0] if cached is not None else None
 
 
 # ============ 健康检查 ============
@@ -85,10 +1719,40 @@ async def health_check():
         "status": "ok",
         "service": "akshare-hk-proxy",
         "version": "1.2.0",  # 更新版本号
-        "akshare_version": ak.__version__ if hasattr(ak, '__version__') else "unknown"
+        "akshare_version": akshare_version(),
+        "ready": startup_state["ready"],
+        "fixture_mode": AKSHARE_FIXTURE_MODE,
+        "upstream": upstream.snapshot(),
+        "breakers": breaker_snapshot(),
+        "singleflight": upstream_flight.stats(),
+        "universe": hk_universe.stats(),
+        "spot": spot_snapshot.stats(),
+        "prewarm": prewarmer.stats(),
+        "cache": response_cache.stats(),
+        "representations": representation_cache.stats(),
+        "disk_cache": disk_cache.stats() if disk_cache is not None else None
     }
 
 
+# ============ 监控指标导出 ============
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 文本格式的监控指标"""
+    upstream.export_metrics()
+    cache_stats = response_cache.stats()
+    metrics.set("akshare_cache_hit_ratio", cache_stats["hit_ratio"])
+    metrics.set("akshare_cache_entries", cache_stats["entries"])
+    metrics.set("akshare_cache_bytes", cache_stats["bytes"])
+    metrics.set("akshare_repr_cache_bytes", representation_cache.current_bytes)
+    if disk_cache is not None:
+        try:
+            entries = await asyncio.wait_for(asyncio.to_thread(disk_cache.count_entries), 2)
+            metrics.set("akshare_disk_cache_entries", entries)
+        except Exception as e:
+            print(f"[AkshareProxy] 读取磁盘缓存条目数失败: {e}", file=sys.stderr)
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # ============ 诊断端点 ============
 @app.get("/diagnose/{stock_code}")
 async def diagnose_stock(stock_code: str):
@@ -97,44 +1761,51 @@ async def diagnose_stock(stock_code: str):
     
     检查所有财务报表是否可以成功获取
     """
-    code = stock_code.replace('.HK', '').replace('.hk', '').strip()
-    code = code.zfill(5)
+    code = normalize_hk_code(stock_code)
     
     results = {
         "stock_code": code,
-        "akshare_version": ak.__version__ if hasattr(ak, '__version__') else "unknown",
+        "akshare_version": akshare_version(),
         "reports": {}
     }
     
-    for report_type, symbol in [("income", "利润表"), ("balance", "资产负债表"), ("cashflow", "现金流量表")]:
-        try:
-            df = ak.stock_financial_hk_report_em(
-                stock=code,
-                symbol=symbol,
-                indicator="年度"
-            )
-            if df is not None and not df.empty:
-                results["reports"][report_type] = {
-                    "success": True,
-                    "count": len(df),
-                    "fields": df['STD_ITEM_NAME'].unique().tolist()[:10] if 'STD_ITEM_NAME' in df.columns else []
-                }
-            else:
-                results["reports"][report_type] = {
-                    "success": True,
-                    "count": 0,
-                    "message": "Empty data"
-                }
-        except Exception as e:
+    for report_type in FINANCIAL_SYMBOL_MAP:
+        result = await cached_hk_financial(code, report_type, "年度")
+        if not result.get("success"):
             results["reports"][report_type] = {
                 "success": False,
-                "error": str(e)
+                "error": result.get("error", "")
+            }
+        elif result.get("data"):
+            names = []
+            for row in result["data"]:
+                name = row.get("STD_ITEM_NAME")
+                if name is not None and name not in names:
+                    names.append(name)
+            results["reports"][report_type] = {
+                "success": True,
+                "count": len(result["data"]),
+                "fields": names[:10]
+            }
+        else:
+            results["reports"][report_type] = {
+                "success": True,
+                "count": 0,
+                "message": "Empty data"
             }
     
     return results
 
 
 # ============ 港股财务报表 ============
+# 报表类型映射
+FINANCIAL_SYMBOL_MAP = {
+    "income": "利润表",
+    "balance": "资产负债表",
+    "cashflow": "现金流量表"
+}
+
+
 def clean_value(val):
     """清理单个值，确保可 JSON 序列化"""
     if val is None:
@@ -153,22 +1824,101 @@ def clean_value(val):
     return str(val)
 
 
+def _column_to_json_safe(series: pd.Series) -> list:
+    """按列转换为 JSON 安全的 Python 值列表, 语义与 clean_value 一致"""
+    kind = series.dtype.kind
+    if kind == 'f':
+        # NaN / Inf -> 0.0
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        return np.where(np.isfinite(values), values, 0.0).tolist()
+    if kind in 'iub' and not series.hasnans:
+        # numpy 标量 -> Python int/bool
+        return series.to_numpy().tolist()
+    values = series.tolist()
+    # 字符串是最常见的情况, 跳过逐个判断
+    return [v if type(v) is str else clean_value(v) for v in values]
+
+
 def df_to_json_safe(df: pd.DataFrame) -> list:
-    """将 DataFrame 转换为 JSON 安全的字典列表"""
-    records = []
-    for idx, row in df.iterrows():
-        record = {}
-        for col in df.columns:
-            record[col] = clean_value(row[col])
-        records.append(record)
-    return records
+    """将 DataFrame 转换为 JSON 安全的字典列表 (按列向量化转换后一次性组装)"""
+    if df.empty:
+        return []
+    columns = [_column_to_json_safe(df.iloc[:, i]) for i in range(df.shape[1])]
+    keys = list(df.columns)
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def df_numeric_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """取数值列, 缺失列/无法解析/NaN/Inf 一律按 0 处理"""
+    if column not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    values = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    return values.where(np.isfinite(values), 0.0)
+
+
+async def _load_hk_financial(code: str, report_type: str, indicator: str) -> dict:
+    """从 AKShare 获取港股财务报表 (长表)"""
+    symbol = FINANCIAL_SYMBOL_MAP[report_type]
+    try:
+        print(f"[AkshareProxy] 获取港股{symbol}: {code}, 指标: {indicator}")
+        sys.stdout.flush()
+        
+        # 调用 AKShare 接口
+        df = await call_ak(
+            "stock_financial_hk_report_em",
+            stock=code,
+            symbol=symbol,
+            indicator=indicator
+        )
+        
+        if df is None or df.empty:
+            print(f"[AkshareProxy] 警告: {code} {symbol}数据为空")
+            sys.stdout.flush()
+            return {
+                "success": True,
+                "data": [],
+                "message": f"No data found for {code}"
+            }
+        
+        # 使用安全的转换函数
+        data = df_to_json_safe(df)
+        
+        print(f"[AkshareProxy] 成功获取 {len(data)} 条{symbol}数据")
+        sys.stdout.flush()
+        
+        return {
+            "success": True,
+            "data": data,
+            "count": len(data)
+        }
+        
+    except Exception as e:
+        error_msg = str(e)
+        traceback.print_exc()
+        print(f"[AkshareProxy] 错误: {error_msg}", file=sys.stderr)
+        sys.stderr.flush()
+        
+        return {
+            "success": False,
+            "error": error_msg,
+            "data": []
+        }
+
+
+async def cached_hk_financial(code: str, report_type: str, indicator: str) -> dict:
+    """港股财务报表 (长表, 带缓存)"""
+    return await cached_call(
+        "financial", "financial", code, {"type": report_type, "indicator": indicator},
+        lambda: _load_hk_financial(code, report_type, indicator)
+    )
 
 
 @app.get("/hk/financial/{stock_code}/{report_type}")
 async def get_hk_financial(
     stock_code: str,
     report_type: str,
-    indicator: str = Query("年度", description="年度 或 报告期")
+    indicator: str = Query("年度", description="年度 或 报告期"),
+    output: OutputOptions = Depends()
 ):
     """
     获取港股财务报表
@@ -177,168 +1927,1012 @@ async def get_hk_financial(
         stock_code: 港股代码 (如 00700)
         report_type: 报表类型 (income/balance/cashflow)
         indicator: 年度/报告期
+        output: 字段投影 / 输出格式
         
     Returns:
         JSON 格式的财务报表数据
     """
-    # 报表类型映射
-    symbol_map = {
-        "income": "利润表",
-        "balance": "资产负债表",
-        "cashflow": "现金流量表"
-    }
-    
-    if report_type not in symbol_map:
-        return Response(
-            content=json.dumps({
-                "success": False,
-                "error": f"Invalid report_type: {report_type}. Must be one of: income, balance, cashflow",
-                "data": []
-            }, ensure_ascii=False),
-            media_type="application/json",
-            status_code=400
-        )
-    
-    # 标准化股票代码 (确保是5位数字)
-    code = stock_code.replace('.HK', '').replace('.hk', '').strip()
-    code = code.zfill(5)  # 补齐到5位
-    
+    if report_type not in FINANCIAL_SYMBOL_MAP:
+        return json_response({
+            "success": False,
+            "error": f"Invalid report_type: {report_type}. Must be one of: income, balance, cashflow",
+            "data": []
+        }, status_code=400)
+    
+    # 标准化股票代码 (确保是5位数字)
+    code = normalize_hk_code(stock_code)
+    
+    result = await cached_hk_financial(code, report_type, indicator)
+    
+    # 数据已经被清理, 直接编码
+    return data_response(result, output)
+
+
+# ============ 港股财务报表 (宽表) ============
+# 在代理端完成 长表 -> 宽表 转换, 直接返回 Tushare IncomeData/BalanceData/CashFlowData 结构,
+# Worker 不再需要下载整张长表逐行透视
+# 港股中文项目名 -> Tushare A股字段名 (与 akshareHK.ts 中的 *_FIELD_MAP 保持一致)
+INCOME_FIELD_MAP = {
+    # 核心收入指标
+    "营业额": "total_revenue",
+    "收入": "revenue",
+    "营运收入": "revenue",
+    "其他营业收入": "revenue",
+    "其他收入": "revenue",
+    "其他收益": "revenue",
+
+    # 成本相关
+    "销售成本": "total_cogs",
+    "销货成本": "oper_cost",
+    "营运支出": "oper_cost",
+
+    # 利润指标
+    "毛利": "operate_profit",  # 港股毛利映射到营业利润
+    "经营溢利": "operate_profit",
+    "营业利润": "operate_profit",
+    "除税前溢利": "operate_profit",
+    "持续经营业务税后利润": "n_income",
+
+    # 净利润
+    "股东应占溢利": "n_income_attr_p",
+    "归属于母公司股东的净利润": "n_income_attr_p",
+    "净利润": "n_income",
+    "除税后溢利": "n_income",
+    "少数股东损益": "minority_gain",
+
+    # 每股指标
+    "每股基本盈利": "basic_eps",
+    "基本每股收益": "basic_eps",
+    "稀释每股收益": "diluted_eps",
+    "每股摊薄盈利": "diluted_eps",
+    "每股股息": "basic_eps",  # 映射到 basic_eps 作为备用
+
+    # 费用
+    "销售费用": "sell_exp",
+    "销售及分销费用": "sell_exp",
+    "管理费用": "admin_exp",
+    "行政开支": "admin_exp",
+    "研发费用": "rd_exp",
+    "财务费用": "fin_exp",
+    "利息支出": "fin_exp",
+    "融资成本": "fin_exp",
+    "利息收入": "fin_exp",  # 负值
+
+    # 其他
+    "税项": "income_tax",
+    "全面收益总额": "compr_inc_attr_p",
+    "本公司拥有人应占全面收益总额": "compr_inc_attr_p",
+}
+
+BALANCE_FIELD_MAP = {
+    # 资产总计
+    "总资产": "total_assets",
+    "资产总计": "total_assets",
+
+    # 负债总计
+    "总负债": "total_liab",
+    "负债合计": "total_liab",
+    "流动负债合计": "total_cur_liab",
+    "非流动负债合计": "total_ncl",
+
+    # 权益
+    "股东权益": "total_hldr_eqy_exc_min_int",
+    "股东权益合计": "total_hldr_eqy_exc_min_int",
+    "总权益": "total_hldr_eqy_exc_min_int",
+    "净资产": "total_hldr_eqy_exc_min_int",
+    "少数股东权益": "minority_int",
+    "股本": "share_capital",
+    "股本溢价": "cap_rese",
+    "储备": "surplus_rese",
+    "其他储备": "oth_eqt_tools",
+    "保留溢利(累计亏损)": "undistr_porfit",
+    "库存股": "treasury_share",
+
+    # 现金及等价物
+    "现金及等价物": "money_cap",
+    "现金及银行结余": "money_cap",
+    "货币资金": "money_cap",
+    "短期存款": "money_cap",
+    "中长期存款": "oth_cash_inflo_oper_act",
+    "受限制存款及现金": "restrict_deposit",
+
+    # 应收应付
+    "应收帐款": "accounts_receiv",
+    "应收账款": "accounts_receiv",
+    "应收关联方款项": "oth_receiv",
+    "预付款按金及其他应收款": "prepayment",
+    "预付款项": "prepayment",
+    "应付帐款": "accounts_pay",
+    "应付账款": "accounts_pay",
+    "其他应付款及应计费用": "oth_pay",
+    "应付关联方款项(流动)": "oth_cur_liab",
+    "应付票据": "notes_pay",
+    "应付票据(非流动)": "notes_pay",
+    "应付税项": "taxes_pay",
+    "应付股利": "div_pay",
+
+    # 存货
+    "存货": "inventories",
+
+    # 固定资产
+    "固定资产": "fix_assets",
+    "物业厂房及设备": "fix_assets",
+    "在建工程": "cip",
+    "无形资产": "intan_assets",
+    "土地使用权": "r_and_d",
+    "投资物业": "invest_prop",
+
+    # 借款
+    "短期贷款": "st_borr",
+    "短期银行贷款": "st_borr",
+    "长期贷款": "lt_borr",
+    "长期银行贷款": "lt_borr",
+    "长期应付款": "lt_pay",
+    "融资租赁负债(流动)": "st_borr",
+    "融资租赁负债(非流动)": "lt_borr",
+
+    # 投资相关
+    "联营公司权益": "lt_eqt_invest",
+    "合营公司权益": "lt_eqt_invest",
+    "可供出售投资": "avail_for_sale_fin_assets",
+    "持有至到期投资": "held_to_mty_invest",
+    "持有至到期投资(流动)": "held_to_mty_invest",
+    "交易性金融资产(流动)": "trad_asset",
+    "其他金融资产(流动)": "oth_cur_assets",
+    "其他金融资产(非流动)": "oth_nca",
+    "指定以公允价值记账之金融资产": "fvtpl_fin_assets",
+    "指定以公允价值记账之金融资产(流动)": "fvtpl_fin_assets",
+    "于联营公司可赎回工具的投资": "lt_eqt_invest",
+
+    # 负债相关
+    "其他金融负债(流动)": "oth_cur_liab",
+    "其他金融负债(非流动)": "oth_ncl",
+    "递延收入(流动)": "deferred_inc",
+    "递延收入(非流动)": "lt_deferred_income",
+    "递延税项负债": "defer_tax_liab",
+    "递延税项资产": "defer_tax_assets",
+    "衍生金融工具-负债(流动)": "derivative_liab",
+    "衍生金融工具-资产(流动)": "derivative_assets",
+
+    # 合计项目
+    "流动资产合计": "total_cur_assets",
+    "非流动资产合计": "total_nca",
+    "非流动资产其他项目": "oth_nca",
+    "净流动资产": "net_cur_assets",
+    "总资产减流动负债": "total_assets_net_cur_liab",
+    "总资产减总负债合计": "total_hldr_eqy_exc_min_int",
+    "总权益及总负债": "total_assets",
+    "总权益及非流动负债": "total_ncl_and_eqy",
+    "持作出售的资产(流动)": "hfs_assets",
+}
+
+CASHFLOW_FIELD_MAP = {
+    # 经营活动
+    "经营活动产生的现金流量净额": "n_cashflow_act",
+    "经营产生现金": "n_cashflow_act",
+    "经营业务现金净额": "n_cashflow_act",
+    "营运资金变动前经营溢利": "oper_profit_before_wc",
+    "除税前溢利(业务利润)": "operate_profit",
+
+    # 投资活动
+    "投资活动产生的现金流量净额": "n_cashflow_inv_act",
+    "投资活动现金": "n_cashflow_inv_act",
+    "投资业务现金净额": "n_cashflow_inv_act",
+    "投资支付现金": "c_inf_dis_d_others",
+    "收回投资所得现金": "c_fr_disp_other_invest",
+    "收购附属公司": "c_paid_for_subsi",
+    "出售附属公司": "c_fr_disposal_group",
+    "已收股息(投资)": "c_fr_div_inv",
+    "已收利息(投资)": "c_fr_int_exp",
+    "应收关联方款项(增加)减少(投资)": "c_fr_oth_operate_a",
+    "持作买卖投资(增加)减少": "c_fr_trad_asset",
+
+    # 筹资活动
+    "筹资活动产生的现金流量净额": "n_cash_flows_fnc_act",
+    "融资活动现金": "n_cash_flows_fnc_act",
+    "融资业务现金净额": "n_cash_flows_fnc_act",
+    "新增借款": "c_fr_borr",
+    "偿还借款": "c_repay_debt",
+    "发行股份": "c_fr_issue_share",
+    "吸收投资所得": "c_fr_min_s_instr",
+    "发行债券": "c_fr_borr",
+    "赎回债券": "c_repay_debt",
+    "回购股份": "c_pay_for_repurch",
+    "已付股息(融资)": "c_fr_div_fnc_act",
+    "已付利息(融资)": "c_int_pay",
+    "已付利息(经营)": "c_int_exp",
+    "发行相关费用": "c_pay_acq_const_fiasm",
+    "偿还融资租赁": "c_repay_debt",
+    "融资前现金净额": "net_cash_before_fin",
+    "购买子公司少数股权而支付的现金": "c_pay_for_minority_int",
+
+    # 固定资产投资
+    "购建固定资产": "c_paid_for_assets",
+    "购建无形资产及其他资产": "c_paid_for_intan_assets",
+    "资本开支": "c_paid_for_assets",
+    "处置固定资产": "c_fr_disp_fix_assets",
+    "处置无形资产及其他资产": "c_fr_disp_intan_assets",
+
+    # 调整项
+    "加:折旧及摊销": "depr_fa_coga_dpba",
+    "加:减值及拨备": "loss_asset_imp",
+    "加:利息支出": "int_exp",
+    "减:利息收入": "int_income",
+    "减:投资收益": "invest_income",
+    "减:出售资产之溢利": "gain_on_disposal",
+    "减:汇兑收益": "foreign_ex_loss",
+    "减:重估盈余": "gain_on_revaluation",
+    "减:应占附属公司溢利": "invest_income",
+    "加:经营调整其他项目": "oth_oper_act",
+
+    # 营运资本变动
+    "存货(增加)减少": "incr_decr_inv",
+    "应收帐款减少": "incr_decr_accounts_receiv",
+    "应付帐款及应计费用增加(减少)": "incr_decr_accounts_pay",
+    "存款(增加)减少": "incr_decr_depo",
+    "存款减少(增加)": "incr_decr_depo",
+    "预付款项、按金及其他应收款项减少(增加)": "incr_decr_prepay",
+    "预收账款、按金及其他应付款增加(减少)": "incr_decr_adv_receipts",
+    "递延收入(增加)减少": "incr_decr_deferred_income",
+    "应付关联方款项增加(减少)": "incr_decr_related_party",
+    "营运资本变动其他项目": "oth_wc_changes",
+
+    # 税项
+    "已付税项": "c_pay_income_tax",
+
+    # 现金变动
+    "期初现金": "beg_cash_equiv",
+    "期末现金": "end_cash_equiv",
+    "现金净额": "n_incr_cash_cash_equ",
+    "期间变动其他项目": "oth_cash_inflo",
+
+    # 业务相关
+    "投资业务其他项目": "oth_inv_act",
+    "融资业务其他项目": "oth_fnc_act",
+    "非运算项目": "non_oper_item",
+
+    # 自由现金流
+    "自由现金流": "free_cashflow",
+}
+
+FINANCIAL_FIELD_MAPS = {
+    "income": INCOME_FIELD_MAP,
+    "balance": BALANCE_FIELD_MAP,
+    "cashflow": CASHFLOW_FIELD_MAP,
+}
+
+# 默认输出字段 (与 akshareHK.ts 中 transformTo*Data 的输出一致)
+FINANCIAL_WIDE_DEFAULT_FIELDS = {
+    "income": [
+        "ts_code", "ann_date", "f_ann_date", "end_date", "report_type",
+        "basic_eps", "diluted_eps", "total_revenue", "revenue", "total_cogs", "oper_cost",
+        "sell_exp", "admin_exp", "rd_exp", "fin_exp", "operate_profit", "n_income", "n_income_attr_p",
+    ],
+    "balance": [
+        "ts_code", "ann_date", "end_date", "report_type",
+        "total_assets", "total_liab", "total_hldr_eqy_exc_min_int", "money_cap", "accounts_receiv",
+        "inventories", "fix_assets", "st_borr", "lt_borr", "accounts_pay",
+    ],
+    "cashflow": [
+        "ts_code", "ann_date", "end_date", "report_type",
+        "n_cashflow_act", "n_cashflow_inv_act", "n_cash_flows_fnc_act", "c_pay_acq_const_fiasm",
+        "c_paid_for_assets", "free_cashflow",
+    ],
+}
+
+# 字段为空或为 0 时的回退字段 (对应 TS 中的 a || b)
+FINANCIAL_WIDE_FALLBACKS = {
+    "income": {"revenue": "total_revenue", "n_income_attr_p": "n_income"},
+    "balance": {},
+    "cashflow": {},
+}
+
+
+def pivot_financial_statement(df: pd.DataFrame, report_type: str, code: str) -> pd.DataFrame:
+    """
+    将 stock_financial_hk_report_em 长表透视为宽表
+
+    每个报告期一行, 列为映射后的 Tushare 字段; 同一报告期多个项目映射到同一字段时,
+    与 TS 版逐行覆盖的语义一致, 取最后出现的非空值。按报告期降序排列。
+    """
+    field_map = FINANCIAL_FIELD_MAPS[report_type]
+    end_date = pd.to_datetime(df['REPORT_DATE'], errors='coerce').dt.strftime('%Y%m%d')
+    periods = sorted(end_date.dropna().unique(), reverse=True)
+
+    long = pd.DataFrame({
+        "end_date": end_date,
+        "field": df['STD_ITEM_NAME'].map(field_map),
+        "amount": pd.to_numeric(df['AMOUNT'], errors='coerce'),
+    }).dropna()
+    wide = long.pivot_table(index="end_date", columns="field", values="amount", aggfunc="last")
+    wide = wide.reindex(index=periods, columns=sorted(set(field_map.values()))).fillna(0.0)
+
+    for field, fallback in FINANCIAL_WIDE_FALLBACKS[report_type].items():
+        wide[field] = wide[field].where(wide[field] != 0, wide[fallback])
+    if report_type == "cashflow":
+        # TS 版固定输出 0, 保持一致
+        wide["c_pay_acq_const_fiasm"] = 0.0
+
+    wide.index.name = "end_date"
+    wide = wide.reset_index()
+    wide.insert(0, "ts_code", f"{code}.HK")
+    wide.insert(1, "ann_date", wide["end_date"])
+    if report_type == "income":
+        wide.insert(2, "f_ann_date", wide["end_date"])
+    wide.insert(wide.columns.get_loc("end_date") + 1, "report_type", "1")
+    if 'FISCAL_YEAR' in df.columns:
+        # 财年截止日 (如 "12-31" / "03-31"), 不在默认字段中, 供财务比率计算 TTM
+        fiscal = pd.Series(df['FISCAL_YEAR'].astype(str).str.strip().to_numpy(), index=end_date.to_numpy())
+        fiscal = fiscal[fiscal.index.notna() & (fiscal != '') & (fiscal != 'nan')]
+        wide["fiscal_year_end"] = wide["end_date"].map(fiscal[~fiscal.index.duplicated(keep='last')])
+    return wide
+
+
+async def _load_hk_financial_wide(code: str, report_type: str, indicator: str) -> dict:
+    """获取港股财务报表并透视为宽表 (包含全部映射字段)"""
+    symbol = FINANCIAL_SYMBOL_MAP[report_type]
+    try:
+        print(f"[AkshareProxy] 获取港股{symbol}(宽表): {code}, 指标: {indicator}")
+        
+        df = await call_ak(
+            "stock_financial_hk_report_em",
+            stock=code,
+            symbol=symbol,
+            indicator=indicator
+        )
+        
+        if df is None or df.empty:
+            return {
+                "success": True,
+                "data": [],
+                "message": f"No data found for {code}"
+            }
+        
+        data = df_to_json_safe(pivot_financial_statement(df, report_type, code))
+        
+        print(f"[AkshareProxy] 成功透视 {len(data)} 个报告期的{symbol}")
+        
+        return {
+            "success": True,
+            "data": data,
+            "count": len(data)
+        }
+        
+    except Exception as e:
+        error_msg = str(e)
+        traceback.print_exc()
+        print(f"[AkshareProxy] 错误: {error_msg}", file=sys.stderr)
+        
+        return {
+            "success": False,
+            "error": error_msg,
+            "data": []
+        }
+
+
+async def cached_hk_financial_wide(code: str, report_type: str, indicator: str,
+                                   fields: Optional[list] = None) -> dict:
+    """港股财务报表 (宽表, 带缓存), fields 为空时输出与 TS 版一致的默认字段"""
+    result = await cached_call(
+        "financial", "financial_wide", code, {"type": report_type, "indicator": indicator},
+        lambda: _load_hk_financial_wide(code, report_type, indicator)
+    )
+    if result.get("success") and result.get("data"):
+        selected = fields or FINANCIAL_WIDE_DEFAULT_FIELDS[report_type]
+        result = {**result, "data": project_records(result["data"], selected)}
+    return result
+
+
+@app.get("/hk/financial_wide/{stock_code}/{report_type}")
+async def get_hk_financial_wide(
+    stock_code: str,
+    report_type: str,
+    indicator: str = Query("年度", description="年度 或 报告期"),
+    output: OutputOptions = Depends()
+):
+    """
+    获取港股财务报表 (宽表, Tushare 格式)
+    
+    Args:
+        stock_code: 港股代码 (如 00700)
+        report_type: 报表类型 (income/balance/cashflow)
+        indicator: 年度/报告期
+        output: 字段投影 / 输出格式, fields 为空时输出与 TS 版转换结果一致的默认字段,
+                可选任意映射字段 (如 total_cur_assets)
+        
+    Returns:
+        每个报告期一行的宽表数据, 按报告期降序
+    """
+    if report_type not in FINANCIAL_SYMBOL_MAP:
+        return json_response({
+            "success": False,
+            "error": f"Invalid report_type: {report_type}. Must be one of: income, balance, cashflow",
+            "data": []
+        }, status_code=400)
+    
+    code = normalize_hk_code(stock_code)
+    
+    result = await cached_hk_financial_wide(code, report_type, indicator, output.fields)
+    
+    return data_response(result, output)
+
+
+# ============ 本地K线存储 ============
+# 只按代码持久化不复权日线 (SQLite), 每次刷新只拉取最后一根已存K线之后的增量;
+# 前/后复权价格在读取时由复权因子计算, qfq / hfq / 不复权共用同一份K线
+AKSHARE_FACTOR_TTL = int(os.environ.get("AKSHARE_FACTOR_TTL", str(6 * 3600)))
+
+# stock_hk_hist 中文列名 -> 标准列名
+KLINE_COLUMN_MAP = {
+    '日期': 'date',
+    '开盘': 'open',
+    '收盘': 'close',
+    '最高': 'high',
+    '最低': 'low',
+    '成交量': 'volume',
+    '成交额': 'amount',
+    '振幅': 'amplitude',
+    '涨跌幅': 'pct_chg',
+    '涨跌额': 'change',
+    '换手率': 'turnover_rate'
+}
+KLINE_COLUMNS = list(KLINE_COLUMN_MAP.values())
+# 复权时需要换算的价格列 (复权价 = 原价 * factor + cash)
+KLINE_PRICE_COLUMNS = ['open', 'close', 'high', 'low']
+
+
+def apply_adjustment(bars: pd.DataFrame, factors: pd.DataFrame) -> pd.DataFrame:
+    """
+    不复权K线 -> 复权K线
+
+    因子自其日期起生效直到下一个因子 (按日期 asof 对齐), 早于第一个因子的K线不调整;
+    涨跌额按因子缩放, 成交量 / 成交额 / 涨跌幅等保持原值
+    """
+    if bars.empty or factors.empty:
+        return bars
+    bar_keys = bars['date'].astype('int64').to_numpy()
+    factor_keys = factors['date'].astype('int64').to_numpy()
+    idx = np.searchsorted(factor_keys, bar_keys, side='right') - 1
+    known = idx >= 0
+    factor = np.where(known, factors['factor'].to_numpy()[idx.clip(0)], 1.0)
+    cash = np.where(known, factors['cash'].to_numpy()[idx.clip(0)], 0.0)
+
+    out = bars.copy()
+    for col in KLINE_PRICE_COLUMNS:
+        out[col] = (out[col].astype('float64') * factor + cash).round(3)
+    out['change'] = (out['change'].astype('float64') * factor).round(3)
+    return out
+
+
+class KlineStore:
+    """
+    港股日线本地存储 (SQLite, WAL 模式, 每次操作独立连接, 可在线程池中调用)
+
+    - hk_daily_bars 只保存不复权K线 (adjust = '')
+    - hk_adj_factors 保存 qfq / hfq 复权因子, 读取时换算
+    """
+
+    def __init__(self, path: str, seed: Optional[str] = None):
+        self.path = path
+        # 回放模式: 首次访问时用录制时的K线存储 (seed) 覆盖本地存储
+        self.seed = seed
+        # 建表和旧数据清理延迟到首次访问 (同 DiskCache)
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _restore_seed(self):
+        # 用 SQLite 备份接口复制, 录制进程未 checkpoint 的 WAL 内容也会带上
+        source = sqlite3.connect(f"file:{self.seed}?mode=ro", uri=True)
+        target = sqlite3.connect(self.path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+
+    def _init_schema(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS hk_daily_bars (
+                code TEXT NOT NULL,
+                adjust TEXT NOT NULL,
+                date TEXT NOT NULL,
+                open REAL, close REAL, high REAL, low REAL,
+                volume INTEGER, amount REAL, amplitude REAL,
+                pct_chg REAL, change REAL, turnover_rate REAL,
+                PRIMARY KEY (code, adjust, date)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS hk_daily_meta (
+                code TEXT NOT NULL,
+                adjust TEXT NOT NULL,
+                last_date TEXT,
+                synced_at REAL,
+                PRIMARY KEY (code, adjust)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS hk_adj_factors (
+                code TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                date TEXT NOT NULL,
+                factor REAL NOT NULL,
+                cash REAL NOT NULL,
+                PRIMARY KEY (code, kind, date)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS hk_adj_factor_meta (
+                code TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                synced_at REAL,
+                PRIMARY KEY (code, kind)
+            )
+        """)
+        # 旧版本按复权类型分别保存的K线, 现在由不复权K线换算
+        conn.execute("DELETE FROM hk_daily_bars WHERE adjust != ''")
+        conn.execute("DELETE FROM hk_daily_meta WHERE adjust != ''")
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            with self._ready_lock:
+                if not self._ready:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    if self.seed and os.path.exists(self.seed):
+                        self._restore_seed()
+                    with self._open() as conn:
+                        self._init_schema(conn)
+                    self._ready = True
+        return self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def meta(self, code: str) -> Optional[tuple]:
+        """返回不复权K线的 (last_date, synced_at), 从未同步过则返回 None"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT last_date, synced_at FROM hk_daily_meta WHERE code = ? AND adjust = ''",
+                (code,)
+            ).fetchone()
+
+    def save(self, code: str, df: pd.DataFrame, replace: bool = False):
+        """写入不复权K线 (标准列名, date 为 YYYYMMDD), replace=True 时先清空该股票的历史"""
+        rows = list(df[KLINE_COLUMNS].itertuples(index=False, name=None))
+        placeholders = ", ".join("?" * (len(KLINE_COLUMNS) + 2))
+        with self._connect() as conn:
+            if replace:
+                conn.execute("DELETE FROM hk_daily_bars WHERE code = ? AND adjust = ''", (code,))
+            conn.executemany(
+                f"INSERT OR REPLACE INTO hk_daily_bars (code, adjust, {', '.join(KLINE_COLUMNS)}) "
+                f"VALUES ({placeholders})",
+                [(code, "", *row) for row in rows]
+            )
+            last_date = conn.execute(
+                "SELECT MAX(date) FROM hk_daily_bars WHERE code = ? AND adjust = ''",
+                (code,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO hk_daily_meta (code, adjust, last_date, synced_at) VALUES (?, '', ?, ?)",
+                (code, last_date, time.time())
+            )
+
+    def factors_synced_at(self, code: str, kind: str) -> Optional[float]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT synced_at FROM hk_adj_factor_meta WHERE code = ? AND kind = ?",
+                (code, kind)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_factors(self, code: str, kind: str, df: pd.DataFrame):
+        """整体替换一只股票的某类复权因子 (前复权因子在每次除权后全部变化)"""
+        rows = list(df[['date', 'factor', 'cash']].itertuples(index=False, name=None))
+        with self._connect() as conn:
+            conn.execute("DELETE FROM hk_adj_factors WHERE code = ? AND kind = ?", (code, kind))
+            conn.executemany(
+                "INSERT OR REPLACE INTO hk_adj_factors (code, kind, date, factor, cash) VALUES (?, ?, ?, ?, ?)",
+                [(code, kind, *row) for row in rows]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO hk_adj_factor_meta (code, kind, synced_at) VALUES (?, ?, ?)",
+                (code, kind, time.time())
+            )
+
+    def read(self, code: str, adjust: str, days: int) -> pd.DataFrame:
+        """
+        读取最近 days 根K线 (按日期升序), adjust 为 qfq / hfq 时按复权因子换算
+
+        没有存储该类复权因子时抛出 LookupError, 不把不复权K线当作复权K线返回
+        """
+        with self._connect() as conn:
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(KLINE_COLUMNS)} FROM hk_daily_bars "
+                "WHERE code = ? AND adjust = '' ORDER BY date DESC LIMIT ?",
+                conn,
+                params=(code, days)
+            )
+            if not adjust or df.empty:
+                return df.iloc[::-1].reset_index(drop=True)
+            factors = pd.read_sql_query(
+                "SELECT date, factor, cash FROM hk_adj_factors WHERE code = ? AND kind = ? ORDER BY date",
+                conn,
+                params=(code, adjust)
+            )
+        if factors.empty:
+            raise LookupError(f"{code} 没有 {adjust} 复权因子, 无法返回复权K线")
+        return apply_adjustment(df.iloc[::-1].reset_index(drop=True), factors)
+
+
+def _normalize_kline_df(df: pd.DataFrame) -> pd.DataFrame:
+    """stock_hk_hist 原始结果 -> 标准列名, 日期转为 YYYYMMDD"""
+    df = df.rename(columns=KLINE_COLUMN_MAP)
+    df = df.reindex(columns=KLINE_COLUMNS)
+    df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y%m%d')
+    return df
+
+
+# 增量同步的请求参数取决于已存K线, 录制时K线存储和录制数据放在同一目录,
+# 回放时从该目录恢复, 否则回放的增量请求与录制的不一致
+if AKSHARE_FIXTURE_MODE == "record":
+    kline_store = KlineStore(os.path.join(AKSHARE_FIXTURE_DIR, "kline.db"))
+elif AKSHARE_FIXTURE_MODE == "replay":
+    kline_store = KlineStore(os.path.join(AKSHARE_DATA_DIR, "kline.db"), seed=os.path.join(AKSHARE_FIXTURE_DIR, "kline.db"))
+else:
+    kline_store = KlineStore(os.path.join(AKSHARE_DATA_DIR, "kline.db"))
+kline_sync_flight = SingleFlight()
+
+
+def _normalize_factor_df(df: pd.DataFrame, kind: str) -> pd.DataFrame:
+    """stock_hk_daily(adjust="qfq-factor"/"hfq-factor") -> date (YYYYMMDD) / factor / cash"""
+    columns = ['date', 'factor', 'cash']
+    if df is None or df.empty:
+        return pd.DataFrame(columns=columns)
+    factor_col = f"{kind}_factor" if f"{kind}_factor" in df.columns else \
+        next(c for c in df.columns if "factor" in str(c))
+    out = pd.DataFrame({
+        "date": pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y%m%d'),
+        "factor": pd.to_numeric(df[factor_col], errors='coerce'),
+        "cash": pd.to_numeric(df['cash'], errors='coerce') if 'cash' in df.columns else 0.0,
+    })
+    out = out.dropna(subset=['date', 'factor']).fillna({'cash': 0.0})
+    return out.drop_duplicates('date', keep='last').sort_values('date')[columns]
+
+
+async def sync_kline(code: str, adjust: str):
+    """
+    增量同步一只股票的日线 (及所需的复权因子) 到本地存储
+
+    - 不复权K线距上次同步不足 K线 TTL 时跳过; 首次同步拉取全部历史,
+      之后只拉取 [最后一根已存K线, 今天] 区间 (不复权价格不会因除权而改变)
+    - adjust 为 qfq / hfq 时同步对应的复权因子 (数据量很小, 按 AKSHARE_FACTOR_TTL 刷新);
+      上游返回空因子视为同步失败
+    """
+    async def _sync_bars():
+        meta = await asyncio.to_thread(kline_store.meta, code)
+        if meta and meta[1] and time.time() - meta[1] < CACHE_TTL["kline"] - prewarm_lead.get():
+            return
+        if meta and meta[0] and AKSHARE_FIXTURE_MODE == "replay":
+            # 回放数据不会更新, 从录制时的存储恢复的K线即为最新
+            return
+
+        if meta is None or not meta[0]:
+            df = await call_ak("stock_hk_hist", symbol=code, period="daily", adjust="")
+            if df is None or df.empty:
+                return
+            await asyncio.to_thread(kline_store.save, code, _normalize_kline_df(df), True)
+            return
+
+        df = await call_ak(
+            "stock_hk_hist",
+            symbol=code,
+            period="daily",
+            start_date=meta[0],
+            end_date=datetime.now().strftime('%Y%m%d'),
+            adjust=""
+        )
+        if df is None or df.empty:
+            await asyncio.to_thread(kline_store.save, code, pd.DataFrame(columns=KLINE_COLUMNS))
+            return
+        await asyncio.to_thread(kline_store.save, code, _normalize_kline_df(df))
+
+    async def _sync_factors():
+        synced_at = await asyncio.to_thread(kline_store.factors_synced_at, code, adjust)
+        if synced_at and time.time() - synced_at < AKSHARE_FACTOR_TTL - prewarm_lead.get():
+            return
+        df = await call_ak("stock_hk_daily", symbol=code, adjust=f"{adjust}-factor")
+        factors = _normalize_factor_df(df, adjust)
+        if factors.empty:
+            # 不覆盖已存的因子; 从未同步成功时读取复权K线会报错, 而不是返回不复权价格
+            raise ValueError(f"stock_hk_daily 返回空的 {adjust} 复权因子")
+        await asyncio.to_thread(kline_store.save_factors, code, adjust, factors)
+
+    await kline_sync_flight.do((code, ""), _sync_bars)
+    if adjust:
+        await kline_sync_flight.do((code, adjust), _sync_factors)
+
+
+# ============ 港股K线数据 ============
+# 单次请求最多返回的K线根数 (约 20 年日线)
+KLINE_MAX_BARS = 5000
+# 周期 -> (pandas Period 频率, 每根K线约含的交易日数); 周/月/季K线由本地日线聚合
+KLINE_PERIODS = {
+    "daily": (None, 1),
+    "weekly": ("W-FRI", 5),
+    "monthly": ("M", 23),
+    "quarterly": ("Q", 64),
+}
+
+
+def resample_kline(df: pd.DataFrame, period: str) -> pd.DataFrame:
+    """
+    日线 (按日期升序) 聚合为周/月/季K线
+
+    date 为该周期最后一个交易日; 涨跌额 / 涨跌幅 / 振幅以上一根聚合K线的收盘价为基准
+    """
+    freq = KLINE_PERIODS[period][0]
+    dates = pd.to_datetime(df['date'], format='%Y%m%d')
+    grouped = df.groupby(dates.dt.to_period(freq).to_numpy(), sort=True)
+    bars = grouped.agg(
+        date=('date', 'last'),
+        open=('open', 'first'),
+        close=('close', 'last'),
+        high=('high', 'max'),
+        low=('low', 'min'),
+        volume=('volume', 'sum'),
+        amount=('amount', 'sum'),
+        turnover_rate=('turnover_rate', 'sum'),
+    ).reset_index(drop=True)
+
+    # 第一根聚合K线以其首日的前收盘价为基准
+    first_prev = df['close'].iloc[0] - df['change'].iloc[0]
+    prev_close = bars['close'].shift(1).fillna(first_prev)
+    bars['change'] = (bars['close'] - prev_close).round(3)
+    bars['pct_chg'] = (bars['change'] / prev_close.where(prev_close != 0) * 100).round(2)
+    bars['amplitude'] = ((bars['high'] - bars['low']) / prev_close.where(prev_close != 0) * 100).round(2)
+    return bars[KLINE_COLUMNS]
+
+
+async def _load_hk_kline(code: str, days: int, adjust: str, period: str = "daily") -> dict:
+    """
+    从本地K线存储读取港股K线数据 (读取前增量同步)
+
+    period 不是 daily 时 days 为聚合后的K线根数
+    """
     try:
-        print(f"[AkshareProxy] 获取港股{symbol_map[report_type]}: {code}, 指标: {indicator}")
-        sys.stdout.flush()
+        print(f"[AkshareProxy] 获取港股K线: {code}, 天数: {days}, 复权: {adjust}, 周期: {period}")
         
-        # 调用 AKShare 接口
-        df = ak.stock_financial_hk_report_em(
-            stock=code,
-            symbol=symbol_map[report_type],
-            indicator=indicator
-        )
+        adjust = adjust if adjust else ""
+        sync_error = None
+        try:
+            await sync_kline(code, adjust)
+        except Exception as e:
+            # 上游故障时退回本地已存的K线
+            sync_error = e
+            print(f"[AkshareProxy] K线同步失败, 使用本地存储: {code}: {e}", file=sys.stderr)
+        if period == "daily":
+            df = await asyncio.to_thread(kline_store.read, code, adjust, days)
+        else:
+            # 多读一个周期, 保证截取后的第一根聚合K线完整
+            df = await asyncio.to_thread(kline_store.read, code, adjust, (days + 1) * KLINE_PERIODS[period][1])
+            if not df.empty:
+                df = await asyncio.to_thread(resample_kline, df, period)
+        df = df.iloc[-days:]
         
-        if df is None or df.empty:
-            print(f"[AkshareProxy] 警告: {code} {symbol_map[report_type]}数据为空")
-            sys.stdout.flush()
-            result = {
+        if df.empty:
+            if sync_error is not None:
+                raise sync_error
+            return {
                 "success": True,
                 "data": [],
-                "message": f"No data found for {code}"
+                "message": f"No kline data found for {code}"
             }
-            return Response(
-                content=json.dumps(result, ensure_ascii=False),
-                media_type="application/json"
-            )
         
-        # 使用安全的转换函数
         data = df_to_json_safe(df)
         
-        print(f"[AkshareProxy] 成功获取 {len(data)} 条{symbol_map[report_type]}数据")
-        sys.stdout.flush()
+        print(f"[AkshareProxy] 成功获取 {len(data)} 条K线数据")
         
         result = {
             "success": True,
             "data": data,
             "count": len(data)
         }
-        
-        # 使用标准 json.dumps，因为数据已经被清理
-        return Response(
-            content=json.dumps(result, ensure_ascii=False),
-            media_type="application/json"
-        )
+        if sync_error is not None:
+            result["stale"] = True
+        return result
         
     except Exception as e:
         error_msg = str(e)
         traceback.print_exc()
         print(f"[AkshareProxy] 错误: {error_msg}", file=sys.stderr)
-        sys.stderr.flush()
         
-        result = {
+        return {
             "success": False,
             "error": error_msg,
             "data": []
         }
-        return Response(
-            content=json.dumps(result, ensure_ascii=False),
-            media_type="application/json"
-        )
 
 
-# ============ 港股K线数据 ============
+async def cached_hk_kline(code: str, days: int, adjust: str, period: str = "daily") -> dict:
+    """港股K线 (带缓存, 每个周期单独缓存)"""
+    params = {"days": days, "adjust": adjust}
+    if period != "daily":
+        params["period"] = period
+    return await cached_call(
+        "kline", "kline", code, params,
+        lambda: _load_hk_kline(code, days, adjust, period)
+    )
+
+
 @app.get("/hk/kline/{stock_code}")
 async def get_hk_kline(
     stock_code: str,
-    days: int = Query(180, description="获取最近N天的数据"),
-    adjust: str = Query("qfq", description="复权类型: qfq(前复权), hfq(后复权), 空(不复权)")
+    days: int = Query(180, ge=1, le=KLINE_MAX_BARS, description="获取最近N根K线 (日线即N天)"),
+    adjust: str = Query("qfq", description="复权类型: qfq(前复权), hfq(后复权), 空(不复权)"),
+    period: str = Query("daily", description="K线周期: daily / weekly / monthly / quarterly"),
+    output: OutputOptions = Depends()
 ):
     """
     获取港股K线数据
     
     Args:
         stock_code: 港股代码 (如 00700)
-        days: 获取最近N天的数据
+        days: 获取最近N根K线
         adjust: 复权类型
+        period: K线周期, 周/月/季K线由本地日线聚合
+        output: 字段投影 / 输出格式
         
     Returns:
         JSON 格式的K线数据
     """
-    code = stock_code.replace('.HK', '').replace('.hk', '').strip()
-    code = code.zfill(5)
+    if period not in KLINE_PERIODS:
+        return json_response({
+            "success": False,
+            "error": f"Invalid period: {period}. Must be one of: {', '.join(KLINE_PERIODS)}",
+            "data": []
+        }, status_code=400)
     
+    code = normalize_hk_code(stock_code)
+    
+    return data_response(await cached_hk_kline(code, days, adjust, period), output)
+
+
+# ============ 港股技术指标 ============
+# 直接在本地K线存储上用 pandas 滚动窗口计算, 只返回最新值或截取后的序列,
+# 不必把整段K线传给 TS 端再计算。历史不足一个窗口的值为 null
+INDICATOR_MA_WINDOWS = [5, 10, 20, 60, 120, 250]
+# 额外读取的K线数, 覆盖最长窗口并让 EMA / Wilder 平滑收敛
+INDICATOR_WARMUP = 250
+# 回撤的回看窗口 (交易日), 不超过 INDICATOR_WARMUP, 与返回的 days 无关
+DRAWDOWN_LOOKBACK = 250
+TRADING_DAYS_PER_YEAR = 252
+
+
+def compute_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    由日线 (KlineStore.read 的结果, 按日期升序) 计算技术指标
+
+    Returns:
+        与输入等长的 DataFrame, 每个交易日一行
+    """
+    close = df['close'].astype('float64')
+    high = df['high'].astype('float64')
+    low = df['low'].astype('float64')
+    volume = df['volume'].astype('float64')
+
+    out = {"date": df['date'], "close": close}
+    for window in INDICATOR_MA_WINDOWS:
+        out[f"ma{window}"] = close.rolling(window).mean()
+    for span in (12, 26):
+        out[f"ema{span}"] = close.ewm(span=span, adjust=False).mean()
+
+    # MACD (12, 26, 9)
+    dif = out["ema12"] - out["ema26"]
+    dea = dif.ewm(span=9, adjust=False).mean()
+    out["macd_dif"] = dif
+    out["macd_dea"] = dea
+    out["macd_hist"] = (dif - dea) * 2
+
+    # RSI (Wilder 平滑)
+    delta = close.diff()
+    gain = delta.clip(lower=0)
+    loss = -delta.clip(upper=0)
+    for window in (6, 14):
+        avg_gain = gain.ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+        avg_loss = loss.ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+        # 区间内没有下跌时 avg_loss 为 0, 比值为 inf, RSI 为 100
+        out[f"rsi{window}"] = 100 - 100 / (1 + avg_gain / avg_loss)
+
+    # 布林带 (20, 2)
+    mid = close.rolling(20).mean()
+    std = close.rolling(20).std(ddof=0)
+    out["boll_mid"] = mid
+    out["boll_upper"] = mid + 2 * std
+    out["boll_lower"] = mid - 2 * std
+
+    # ATR (14, Wilder 平滑)
+    prev_close = close.shift(1)
+    true_range = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+    out["atr14"] = true_range.ewm(alpha=1 / 14, adjust=False, min_periods=14).mean()
+
+    # 年化波动率 (对数收益率)
+    log_ret = np.log(close / prev_close)
+    out["volatility20"] = log_ret.rolling(20).std() * np.sqrt(TRADING_DAYS_PER_YEAR)
+    out["volatility60"] = log_ret.rolling(60).std() * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+    # 成交量 z-score (20 日)
+    vol_mean = volume.rolling(20).mean()
+    vol_std = volume.rolling(20).std(ddof=0)
+    out["volume_z20"] = (volume - vol_mean) / vol_std.replace(0, np.nan)
+
+    return pd.DataFrame(out)
+
+
+def _indicator_records(df: pd.DataFrame) -> list:
+    """指标 DataFrame -> 记录列表 (NaN / Inf 输出为 null, 与 0 区分)"""
+    columns = []
+    for col in df.columns:
+        if df[col].dtype.kind == 'f':
+            values = df[col].to_numpy(dtype='float64')
+            columns.append([round(v, 6) if math.isfinite(v) else None for v in values.tolist()])
+        else:
+            columns.append(df[col].tolist())
+    keys = list(df.columns)
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def indicator_series(bars: pd.DataFrame, days: int) -> list:
+    """
+    计算指标并截取最近 days 行
+
+    回撤在截取前的完整序列上计算: drawdown 为相对近 DRAWDOWN_LOOKBACK 个交易日
+    最高收盘价的回撤, max_drawdown 为同一窗口内出现过的最大回撤
+    """
+    result = compute_indicators(bars)
+    peak = result['close'].rolling(DRAWDOWN_LOOKBACK, min_periods=1).max()
+    result["drawdown"] = result['close'] / peak - 1
+    result["max_drawdown"] = result["drawdown"].rolling(DRAWDOWN_LOOKBACK, min_periods=1).min()
+    return _indicator_records(result.iloc[-days:].reset_index(drop=True))
+
+
+async def _load_hk_indicators(code: str, days: int, adjust: str) -> dict:
+    """同步并读取K线后计算技术指标"""
     try:
-        print(f"[AkshareProxy] 获取港股K线: {code}, 天数: {days}, 复权: {adjust}")
-        
-        # 调用 AKShare 接口
-        df = ak.stock_hk_hist(
-            symbol=code,
-            period="daily",
-            adjust=adjust if adjust else ""
-        )
-        
-        if df is None or df.empty:
+        adjust = adjust if adjust else ""
+        sync_error = None
+        try:
+            await sync_kline(code, adjust)
+        except Exception as e:
+            sync_error = e
+            print(f"[AkshareProxy] K线同步失败, 使用本地存储计算指标: {code}: {e}", file=sys.stderr)
+        bars = await asyncio.to_thread(kline_store.read, code, adjust, days + INDICATOR_WARMUP)
+
+        if bars.empty:
+            if sync_error is not None:
+                raise sync_error
             return {
                 "success": True,
                 "data": [],
                 "message": f"No kline data found for {code}"
             }
-        
-        # 取最近N天
-        df = df.tail(days)
-        
-        # 标准化列名
-        column_map = {
-            '日期': 'date',
-            '开盘': 'open',
-            '收盘': 'close',
-            '最高': 'high',
-            '最低': 'low',
-            '成交量': 'volume',
-            '成交额': 'amount',
-            '振幅': 'amplitude',
-            '涨跌幅': 'pct_chg',
-            '涨跌额': 'change',
-            '换手率': 'turnover_rate'
-        }
-        
-        df = df.rename(columns=column_map)
-        
-        # 确保日期格式正确
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y%m%d')
-        
-        data = df.to_dict(orient="records")
-        
-        print(f"[AkshareProxy] 成功获取 {len(data)} 条K线数据")
-        
-        return {
+
+        data = await asyncio.to_thread(indicator_series, bars, days)
+        result = {
             "success": True,
             "data": data,
             "count": len(data)
         }
-        
+        if sync_error is not None:
+            result["stale"] = True
+        return result
+
     except Exception as e:
         error_msg = str(e)
         traceback.print_exc()
-        print(f"[AkshareProxy] 错误: {error_msg}", file=sys.stderr)
-        
+
         return {
             "success": False,
             "error": error_msg,
@@ -346,113 +2940,240 @@ async def get_hk_kline(
         }
 
 
-# ============ 港股基本信息 ============
-@app.get("/hk/basic/{stock_code}")
-async def get_hk_basic(stock_code: str):
+async def cached_hk_indicators(code: str, days: int, adjust: str) -> dict:
+    """港股技术指标 (带缓存, 与K线同一 TTL)"""
+    return await cached_call(
+        "kline", "indicators", code, {"days": days, "adjust": adjust},
+        lambda: _load_hk_indicators(code, days, adjust)
+    )
+
+
+@app.get("/hk/indicators")
+async def get_hk_indicators(
+    codes: str = Query(..., description="逗号分隔的港股代码, 如 00700,09988"),
+    days: int = Query(1, ge=1, le=2000, description="返回最近N个交易日的指标, 1 为只返回最新值"),
+    adjust: str = Query("qfq", description="复权类型: qfq(前复权), hfq(后复权), 空(不复权)"),
+    output: OutputOptions = Depends()
+):
     """
-    获取港股基本信息
+    获取港股技术指标 (支持多只股票)
     
     Args:
-        stock_code: 港股代码 (如 00700)
+        codes: 港股代码列表
+        days: 每只股票返回的交易日数
+        adjust: 复权类型
+        output: 字段投影 / 输出格式
         
     Returns:
-        JSON 格式的股票基本信息
+        每只股票每个交易日一行 (带 code 字段), 失败的股票列在 errors 中,
+        上游同步失败、由本地K线计算的股票列在 stale 中
     """
-    code = stock_code.replace('.HK', '').replace('.hk', '').strip()
-    code = code.zfill(5)
-    
-    try:
-        print(f"[AkshareProxy] 获取港股基本信息: {code}")
-        
-        # 获取港股通成分股列表 (包含基本信息)
-        try:
-            df = ak.stock_hk_ggt_components_em()
-            
-            if df is not None and not df.empty:
-                # 查找匹配的股票
-                stock_info = df[df['代码'].str.contains(code, na=False)]
-                
-                if not stock_info.empty:
-                    row = stock_info.iloc[0]
-                    return {
-                        "success": True,
-                        "data": {
-                            "code": code,
-                            "name": row.get('名称', ''),
-                            "industry": '港股',
-                            "list_date": ''
-                        }
-                    }
-        except Exception as e:
-            print(f"[AkshareProxy] 获取港股通成分股失败: {e}")
-        
-        # 备用方案：从K线数据获取股票名称
-        try:
-            df = ak.stock_hk_hist(symbol=code, period="daily", adjust="qfq")
-            if df is not None and not df.empty:
-                return {
-                    "success": True,
-                    "data": {
-                        "code": code,
-                        "name": code,  # 暂无名称
-                        "industry": '港股',
-                        "list_date": ''
-                    }
-                }
-        except Exception as e:
-            print(f"[AkshareProxy] 备用方案失败: {e}")
-        
+    code_list = list(dict.fromkeys(normalize_hk_code(c) for c in codes.split(",") if c.strip()))
+    if not code_list or len(code_list) > AKSHARE_BATCH_MAX_ITEMS:
+        return json_response({
+            "success": False,
+            "error": f"codes must contain 1-{AKSHARE_BATCH_MAX_ITEMS} stock codes",
+            "data": []
+        }, status_code=400)
+
+    for code in code_list:
+        hot_codes.record(code)
+
+    semaphore = asyncio.Semaphore(AKSHARE_BATCH_CONCURRENCY)
+
+    async def load(code: str) -> dict:
+        async with semaphore:
+            return await cached_hk_indicators(code, days, adjust)
+
+    results = await asyncio.gather(*(load(code) for code in code_list))
+
+    # 多只股票合并后的结果不对应单个缓存条目
+    response_source.set(None)
+    data = []
+    errors = {}
+    stale = []
+    for code, result in zip(code_list, results):
+        if not result.get("success"):
+            errors[code] = result.get("error", "")
+            continue
+        if result.get("stale"):
+            stale.append(code)
+        data.extend({"code": code, **row} for row in result["data"])
+    return data_response({
+        "success": True,
+        "data": data,
+        "count": len(data),
+        "errors": errors,
+        "stale": stale
+    }, output)
+
+
+# ============ 港股代码池快照 ============
+# 港股通成分股 / 全市场列表只在后台定时刷新, /hk/basic、/hk/stock_list、
+# /hk/all_stocks 共用同一份内存快照, 请求路径上不再访问上游
+AKSHARE_UNIVERSE_REFRESH = int(os.environ.get("AKSHARE_UNIVERSE_REFRESH", str(6 * 3600)))
+
+
+def _stock_list_from_df(df: pd.DataFrame) -> list:
+    """将港股通成分股/实时行情 DataFrame 转换为标准股票列表"""
+    if '代码' not in df.columns or '名称' not in df.columns:
+        return []
+    codes = df['代码'].fillna('').astype(str).str.strip()
+    names = df['名称'].fillna('').astype(str).str.strip()
+    mask = (codes != '') & (names != '')
+    return [
+        {
+            "ts_code": f"{code}.HK",
+            "symbol": code,
+            "name": name,
+            "market": "HK",
+            "stock_type": "HK"
+        }
+        for code, name in zip(codes[mask].tolist(), names[mask].tolist())
+    ]
+
+
+class HKUniverse:
+    """
+    港股代码池快照
+
+    - connect: 港股通成分股 (stock_hk_ggt_components_em)
+    - all: 全部港股 (stock_hk_spot_em)
+    - names: 5位代码 -> 名称 的索引, 两个来源合并, 港股通优先
+    """
+
+    def __init__(self):
+        self.lists = {"connect": None, "all": None}
+        self.refreshed_at = {"connect": None, "all": None}
+        self.names = {}
+
+    async def refresh(self, kind: str):
+        """从上游刷新一个列表, 失败时保留旧快照并抛出异常"""
+        func_name = "stock_hk_ggt_components_em" if kind == "connect" else "stock_hk_spot_em"
+        df = await call_ak(func_name)
+        return self.update(kind, df)
+
+    def update(self, kind: str, df: pd.DataFrame) -> list:
+        """用已拉取的 DataFrame 更新一个列表 (行情快照刷新时顺带更新全市场列表)"""
+        stocks = _stock_list_from_df(df) if df is not None and not df.empty else []
+        self.lists[kind] = stocks
+        self.refreshed_at[kind] = time.time()
+        self._rebuild_index()
+        print(f"[AkshareProxy] 港股代码池已刷新: {kind}, {len(stocks)} 只")
+        return stocks
+
+    async def get(self, kind: str) -> list:
+        """读取快照, 尚未加载时同步加载一次 (并发请求会被合并)"""
+        stocks = self.lists[kind]
+        if stocks is None:
+            stocks = await self.refresh(kind)
+        return stocks
+
+    def _rebuild_index(self):
+        names = {}
+        for kind in ("all", "connect"):
+            for stock in self.lists[kind] or []:
+                names[stock["symbol"].zfill(5)] = stock["name"]
+        self.names = names
+
+    def lookup(self, code: str) -> Optional[str]:
+        return self.names.get(code)
+
+    def stats(self) -> dict:
         return {
-            "success": True,
-            "data": {
-                "code": code,
-                "name": code,
-                "industry": '港股',
-                "list_date": ''
+            kind: {
+                "count": len(stocks) if stocks is not None else None,
+                "refreshed_at": self.refreshed_at[kind],
             }
+            for kind, stocks in self.lists.items()
         }
-        
+
+
+hk_universe = HKUniverse()
+
+
+async def _universe_refresh_loop():
+    """后台定时刷新代码池快照 (全市场列表较重, 已有快照且未满一天时只在非高峰时段刷新)"""
+    request_priority.set("bulk")
+    while True:
+        for kind in ("connect", "all"):
+            refreshed_at = hk_universe.refreshed_at[kind]
+            if kind == "all" and refreshed_at and not is_offpeak() \
+                    and time.time() - refreshed_at < 24 * 3600:
+                continue
+            try:
+                await hk_universe.refresh(kind)
+            except Exception as e:
+                print(f"[AkshareProxy] 刷新港股代码池失败 ({kind}): {e}", file=sys.stderr)
+        await asyncio.sleep(AKSHARE_UNIVERSE_REFRESH)
+
+
+@app.on_event("startup")
+async def start_universe_refresh():
+    app.state.universe_task = asyncio.create_task(_universe_refresh_loop())
+
+
+@app.on_event("shutdown")
+async def stop_universe_refresh():
+    app.state.universe_task.cancel()
+
+
+# ============ 港股基本信息 ============
+async def hk_basic_result(code: str) -> dict:
+    """从代码池快照读取港股基本信息"""
+    try:
+        # 快照尚未加载时先加载港股通成分股 (只有冷启动的第一批请求会等待)
+        if not hk_universe.names:
+            await hk_universe.get("connect")
     except Exception as e:
-        error_msg = str(e)
-        traceback.print_exc()
-        
-        return {
-            "success": False,
-            "error": error_msg,
-            "data": None
+        print(f"[AkshareProxy] 获取港股通成分股失败: {e}")
+    
+    return {
+        "success": True,
+        "data": {
+            "code": code,
+            "name": hk_universe.lookup(code) or code,
+            "industry": '港股',
+            "list_date": ''
         }
+    }
 
 
-# ============ 港股公司信息 ============
-@app.get("/hk/company/{stock_code}")
-async def get_hk_company(stock_code: str):
+@app.get("/hk/basic/{stock_code}")
+async def get_hk_basic(stock_code: str, output: OutputOptions = Depends()):
     """
-    获取港股公司信息
+    获取港股基本信息
     
     Args:
         stock_code: 港股代码 (如 00700)
+        output: 字段投影 / 输出格式
         
     Returns:
-        JSON 格式的公司信息
+        JSON 格式的股票基本信息
     """
-    code = stock_code.replace('.HK', '').replace('.hk', '').strip()
-    code = code.zfill(5)
+    code = normalize_hk_code(stock_code)
     
+    return data_response(await hk_basic_result(code), output)
+
+
+# ============ 港股公司信息 ============
+async def _load_hk_company(code: str) -> dict:
+    """从 AKShare 获取港股公司概况"""
     try:
         print(f"[AkshareProxy] 获取港股公司信息: {code}")
         
         # 尝试获取公司概况
         try:
-            df = ak.stock_hk_company_profile_em(symbol=code)
+            df = await call_ak("stock_hk_company_profile_em", symbol=code)
             
             if df is not None and not df.empty:
                 # 将数据转换为字典
                 company_data = {}
-                for _, row in df.iterrows():
-                    key = str(row.iloc[0]).strip() if len(row) > 0 else ''
-                    value = str(row.iloc[1]).strip() if len(row) > 1 else ''
+                values = df.iloc[:, 1].tolist() if df.shape[1] > 1 else [''] * len(df)
+                for key, value in zip(df.iloc[:, 0].tolist(), values):
+                    key = str(key).strip()
                     if key:
-                        company_data[key] = value
+                        company_data[key] = str(value).strip()
                 
                 return {
                     "success": True,
@@ -471,7 +3192,13 @@ async def get_hk_company(stock_code: str):
                     }
                 }
         except Exception as e:
-            print(f"[AkshareProxy] 获取公司概况失败: {e}")
+            # 上游失败不能当作 "没有数据" 返回, 否则会被当作有效结果
+            print(f"[AkshareProxy] 获取公司概况失败: {e}", file=sys.stderr)
+            return {
+                "success": False,
+                "error": str(e),
+                "data": None
+            }
         
         return {
             "success": True,
@@ -489,27 +3216,41 @@ async def get_hk_company(stock_code: str):
         }
 
 
-# ============ 港股每日指标 ============
-@app.get("/hk/daily_basic/{stock_code}")
-async def get_hk_daily_basic(stock_code: str):
+async def cached_hk_company(code: str) -> dict:
+    """港股公司信息 (带缓存)"""
+    return await cached_call(
+        "company", "company", code, None,
+        lambda: _load_hk_company(code)
+    )
+
+
+@app.get("/hk/company/{stock_code}")
+async def get_hk_company(stock_code: str, output: OutputOptions = Depends()):
     """
-    获取港股每日基本指标 (PE/PB/市值等)
+    获取港股公司信息
     
     Args:
         stock_code: 港股代码 (如 00700)
+        output: 字段投影 / 输出格式
         
     Returns:
-        JSON 格式的每日指标数据
+        JSON 格式的公司信息
     """
-    code = stock_code.replace('.HK', '').replace('.hk', '').strip()
-    code = code.zfill(5)
+    code = normalize_hk_code(stock_code)
     
+    return data_response(await cached_hk_company(code), output)
+
+
+# ============ 港股每日指标 ============
+async def _load_hk_daily_basic(code: str) -> dict:
+    """从 AKShare 获取港股每日估值指标"""
     try:
         print(f"[AkshareProxy] 获取港股每日指标: {code}")
+        errors = []
         
         # 尝试从估值对比接口获取
         try:
-            df = ak.stock_hk_valuation_comparison_em(symbol=code)
+            df = await call_ak("stock_hk_valuation_comparison_em", symbol=code)
             
             if df is not None and not df.empty:
                 # 取最新一条数据
@@ -538,19 +3279,21 @@ async def get_hk_daily_basic(stock_code: str):
                         }]
                     }
         except Exception as e:
-            print(f"[AkshareProxy] 获取估值对比失败: {e}")
+            errors.append(f"stock_hk_valuation_comparison_em: {e}")
+            print(f"[AkshareProxy] 获取估值对比失败: {e}", file=sys.stderr)
         
-        # 备用：从K线数据获取基本信息
+        # 备用：从本地K线存储读取最新收盘价 (最新一根的前复权价与不复权价相同, 不需要复权因子)
         try:
-            df = ak.stock_hk_hist(symbol=code, period="daily", adjust="qfq")
-            if df is not None and not df.empty:
+            await sync_kline(code, "")
+            df = await asyncio.to_thread(kline_store.read, code, "", 1)
+            if not df.empty:
                 latest = df.iloc[-1]
                 return {
                     "success": True,
                     "data": [{
-                        "trade_date": str(latest.get('日期', '')).replace('-', ''),
-                        "close": float(latest.get('收盘', 0) or 0),
-                        "turnover_rate": float(latest.get('换手率', 0) or 0),
+                        "trade_date": latest['date'],
+                        "close": float(latest['close'] or 0),
+                        "turnover_rate": float(latest['turnover_rate'] or 0),
                         "pe": 0,
                         "pe_ttm": 0,
                         "pb": 0,
@@ -567,17 +3310,235 @@ async def get_hk_daily_basic(stock_code: str):
                     }]
                 }
         except Exception as e:
-            print(f"[AkshareProxy] 备用方案失败: {e}")
+            errors.append(f"kline: {e}")
+            print(f"[AkshareProxy] 备用方案失败: {e}", file=sys.stderr)
+        
+        if errors:
+            # 两个来源都没有取到数据且至少一个是上游失败: 不能当作 "没有数据"
+            return {
+                "success": False,
+                "error": "; ".join(errors),
+                "data": []
+            }
+        
+        return {
+            "success": True,
+            "data": []
+        }
+        
+    except Exception as e:
+        error_msg = str(e)
+        traceback.print_exc()
+        
+        return {
+            "success": False,
+            "error": error_msg,
+            "data": []
+        }
+
+
+async def cached_hk_daily_basic(code: str) -> dict:
+    """港股每日指标 (带缓存)"""
+    return await cached_call(
+        "kline", "daily_basic", code, None,
+        lambda: _load_hk_daily_basic(code)
+    )
+
+
+@app.get("/hk/daily_basic/{stock_code}")
+async def get_hk_daily_basic(stock_code: str, output: OutputOptions = Depends()):
+    """
+    获取港股每日基本指标 (PE/PB/市值等)
+    
+    Args:
+        stock_code: 港股代码 (如 00700)
+        output: 字段投影 / 输出格式
         
+    Returns:
+        JSON 格式的每日指标数据
+    """
+    code = normalize_hk_code(stock_code)
+    
+    return data_response(await cached_hk_daily_basic(code), output)
+
+
+# ============ 港股财务比率 ============
+# 由缓存的三大报表宽表一次性计算全部报告期的比率, 补齐 stock_hk_financial_indicator_em
+# 未提供的指标。报告期口径的流量数据为财年初至今累计值 (中报 = 财年上半年), TTM 按
+# 本期累计 + 上一财年年报 - 上年同期累计 计算; 财年截止月取自报表的 FISCAL_YEAR,
+# 缺失时由各期累计值的回落推断 (3 月 / 6 月年结的港股很常见);
+# 周转率使用期初 (上年同期) 与期末余额的平均值
+RATIO_INPUT_FIELDS = {
+    "income": [
+        "end_date", "fiscal_year_end", "total_revenue", "revenue", "operate_profit", "n_income", "n_income_attr_p",
+        "income_tax", "total_cogs", "oper_cost", "sell_exp", "admin_exp", "fin_exp", "basic_eps",
+    ],
+    "balance": [
+        "end_date", "total_assets", "total_liab", "total_hldr_eqy_exc_min_int", "total_cur_assets",
+        "total_cur_liab", "money_cap", "accounts_receiv", "inventories", "fix_assets",
+    ],
+    "cashflow": [
+        "end_date", "n_cashflow_act", "c_paid_for_assets", "c_paid_for_intan_assets",
+        "c_fr_borr", "c_repay_debt",
+    ],
+}
+
+
+def _safe_div(a: pd.Series, b: pd.Series) -> pd.Series:
+    """除数为 0 (宽表中缺失项即为 0) 时结果为 NaN"""
+    return a / b.where(b != 0)
+
+
+def _year_ago(frame: pd.DataFrame) -> pd.DataFrame:
+    """上年同期的值 (报告期均为月末, 按月末对齐, 缺失为 NaN)"""
+    prior = frame.copy()
+    prior.index = prior.index + pd.DateOffset(years=1) + pd.offsets.MonthEnd(0)
+    return prior[~prior.index.duplicated()].reindex(frame.index)
+
+
+def _fiscal_year_end_month(fiscal: pd.Series, cumulative: pd.Series) -> int:
+    """
+    财年截止月份
+
+    优先取报表的 fiscal_year_end (如 "03-31"); 缺失时找累计值回落的位置:
+    财年内累计值单调增长, 下一期比上一期小说明上一期是年报期
+    """
+    declared = fiscal.dropna().astype(str).str.extract(r'^(\d{1,2})-\d{1,2}$')[0].dropna()
+    if not declared.empty:
+        return int(declared.mode().iloc[0])
+    months = cumulative.index.month
+    if len(set(months)) == 1:
+        return int(months[0])
+    values = cumulative.dropna()
+    resets = values.index[:-1][values.to_numpy()[1:] < values.to_numpy()[:-1]]
+    if len(resets):
+        return int(pd.Series(resets.month).mode().iloc[0])
+    return 12
+
+
+def _ttm(flows: pd.DataFrame, fy_month: int) -> pd.DataFrame:
+    """财年初至今累计的流量数据 -> 滚动十二个月; 年报期直接取本期值"""
+    index = flows.index
+    # 本期所属财年的截止日, 及上一财年年报期
+    fy_year = np.where(index.month <= fy_month, index.year, index.year + 1)
+    prior_fy_end = pd.to_datetime([f"{year - 1}-{fy_month:02d}-01" for year in fy_year]) + pd.offsets.MonthEnd(0)
+    prev_annual = flows.reindex(prior_fy_end).set_axis(index)
+    ttm = flows + prev_annual - _year_ago(flows)
+    annual = index.month == fy_month
+    ttm.loc[annual] = flows.loc[annual]
+    return ttm
+
+
+def _yoy(values: pd.Series, prior: pd.Series) -> pd.Series:
+    """同比 (%), 以上年同期绝对值为分母"""
+    return _safe_div(values - prior, prior.abs()) * 100
+
+
+def compute_financial_ratios(income: list, balance: list, cashflow: list) -> pd.DataFrame:
+    """
+    由三大报表宽表 (RATIO_INPUT_FIELDS 投影后的记录) 计算全部报告期的财务比率
+
+    Returns:
+        每个报告期一行, 按报告期降序; 无法计算的值为 NaN
+    """
+    frames = []
+    for report_type, records in (("income", income), ("balance", balance), ("cashflow", cashflow)):
+        frame = pd.DataFrame(records, columns=RATIO_INPUT_FIELDS[report_type])
+        frame.index = pd.to_datetime(frame.pop("end_date"), format="%Y%m%d", errors="coerce")
+        frames.append(frame[frame.index.notna() & ~frame.index.duplicated()])
+    df = pd.concat(frames, axis=1).sort_index()
+    if df.empty:
+        return pd.DataFrame()
+    fiscal = df.pop("fiscal_year_end")
+    df = df.astype("float64")
+
+    revenue = df["total_revenue"].where(df["total_revenue"] != 0, df["revenue"])
+    cogs = df["total_cogs"].where(df["total_cogs"] != 0, df["oper_cost"])
+    ebt = df["n_income"] + df["income_tax"]
+    flows = pd.DataFrame({
+        "revenue": revenue,
+        "cogs": cogs,
+        "operate_profit": df["operate_profit"],
+        "ebt": ebt,
+        "n_income_attr_p": df["n_income_attr_p"],
+        "n_cashflow_act": df["n_cashflow_act"],
+    })
+    prior = _year_ago(flows)
+    ttm = _ttm(flows, _fiscal_year_end_month(fiscal, revenue))
+
+    balances = df[["total_assets", "total_hldr_eqy_exc_min_int", "total_cur_assets",
+                   "accounts_receiv", "inventories", "fix_assets"]]
+    # 平均余额: 缺少上年同期时退回期末余额
+    average = (balances + _year_ago(balances).fillna(balances)) / 2
+
+    # 资本开支在现金流量表中多为负数, 统一按流出处理
+    capex = df["c_paid_for_assets"].abs() + df["c_paid_for_intan_assets"].abs()
+    fcff = df["n_cashflow_act"] - capex
+    # 股本按 归母净利润 / 基本每股收益 估算
+    shares = _safe_div(df["n_income_attr_p"], df["basic_eps"])
+
+    ratios = pd.DataFrame({
+        "end_date": df.index.strftime("%Y%m%d"),
+        "tr_yoy": _yoy(revenue, prior["revenue"]),
+        "op_yoy": _yoy(df["operate_profit"], prior["operate_profit"]),
+        "ebt_yoy": _yoy(ebt, prior["ebt"]),
+        "netprofit_yoy": _yoy(df["n_income_attr_p"], prior["n_income_attr_p"]),
+        "ocf_yoy": _yoy(df["n_cashflow_act"], prior["n_cashflow_act"]),
+        "revenue_ttm": ttm["revenue"],
+        "netprofit_ttm": ttm["n_income_attr_p"],
+        "ocf_ttm": ttm["n_cashflow_act"],
+        "roe_avg": _safe_div(ttm["n_income_attr_p"], average["total_hldr_eqy_exc_min_int"]) * 100,
+        "roa_avg": _safe_div(ttm["n_income_attr_p"], average["total_assets"]) * 100,
+        "netprofit_margin": _safe_div(df["n_income_attr_p"], revenue) * 100,
+        "saleexp_to_gr": _safe_div(df["sell_exp"], revenue) * 100,
+        "adminexp_of_gr": _safe_div(df["admin_exp"], revenue) * 100,
+        "finaexp_of_gr": _safe_div(df["fin_exp"], revenue) * 100,
+        "assets_turn": _safe_div(ttm["revenue"], average["total_assets"]),
+        "ca_turn": _safe_div(ttm["revenue"], average["total_cur_assets"]),
+        "fa_turn": _safe_div(ttm["revenue"], average["fix_assets"]),
+        "ar_turn": _safe_div(ttm["revenue"], average["accounts_receiv"]),
+        "inv_turn": _safe_div(ttm["cogs"], average["inventories"]),
+        "current_ratio": _safe_div(df["total_cur_assets"], df["total_cur_liab"]),
+        "quick_ratio": _safe_div(df["total_cur_assets"] - df["inventories"], df["total_cur_liab"]),
+        "cash_ratio": _safe_div(df["money_cap"], df["total_cur_liab"]),
+        "debt_to_assets": _safe_div(df["total_liab"], df["total_assets"]) * 100,
+        "debt_to_eqt": _safe_div(df["total_liab"], df["total_hldr_eqy_exc_min_int"]),
+        "fcff": fcff,
+        "fcfe": fcff + df["c_fr_borr"] - df["c_repay_debt"].abs(),
+        "ocfps": _safe_div(df["n_cashflow_act"], shares),
+    }, index=df.index)
+    return ratios.iloc[::-1].reset_index(drop=True)
+
+
+async def _load_hk_financial_ratios(code: str, indicator: str) -> dict:
+    """读取三大报表宽表 (走缓存) 后计算财务比率"""
+    try:
+        results = await asyncio.gather(*(
+            cached_hk_financial_wide(code, report_type, indicator, RATIO_INPUT_FIELDS[report_type])
+            for report_type in ("income", "balance", "cashflow")
+        ))
+        failed = [r.get("error", "") for r in results if not r.get("success")]
+        if failed:
+            return {"success": False, "error": "; ".join(failed), "data": []}
+        if not any(r.get("data") for r in results):
+            return {
+                "success": True,
+                "data": [],
+                "message": f"No financial statements found for {code}"
+            }
+
+        ratios = await asyncio.to_thread(compute_financial_ratios, *(r.get("data") or [] for r in results))
+        data = _indicator_records(ratios)
         return {
             "success": True,
-            "data": []
+            "data": data,
+            "count": len(data)
         }
-        
+
     except Exception as e:
         error_msg = str(e)
         traceback.print_exc()
-        
+
         return {
             "success": False,
             "error": error_msg,
@@ -585,64 +3546,118 @@ async def get_hk_daily_basic(stock_code: str):
         }
 
 
-# ============ 港股财务指标 ============
-@app.get("/hk/fina_indicator/{stock_code}")
-async def get_hk_fina_indicator(stock_code: str):
+async def cached_hk_financial_ratios(code: str, indicator: str) -> dict:
+    """港股财务比率 (带缓存, 与报表同一 TTL)"""
+    return await cached_call(
+        "financial", "financial_ratios", code, {"indicator": indicator},
+        lambda: _load_hk_financial_ratios(code, indicator)
+    )
+
+
+@app.get("/hk/financial_ratios/{stock_code}")
+async def get_hk_financial_ratios(
+    stock_code: str,
+    indicator: str = Query("报告期", description="年度 或 报告期"),
+    output: OutputOptions = Depends()
+):
     """
-    获取港股财务指标 (ROE/毛利率等)
+    获取港股财务比率 (由三大报表计算)
     
     Args:
         stock_code: 港股代码 (如 00700)
+        indicator: 年度/报告期
+        output: 字段投影 / 输出格式
         
     Returns:
-        JSON 格式的财务指标数据
+        每个报告期一行, 按报告期降序
     """
-    code = stock_code.replace('.HK', '').replace('.hk', '').strip()
-    code = code.zfill(5)
+    code = normalize_hk_code(stock_code)
     
+    return data_response(await cached_hk_financial_ratios(code, indicator), output)
+
+
+# ============ 港股财务指标 ============
+# stock_hk_financial_indicator_em 未提供的指标, 由已缓存的报表宽表计算财务比率后按报告期补齐;
+# 只读缓存, 不为补齐而下载报表 (报表未缓存或无法计算时为 0)
+FINA_INDICATOR_ZERO_FIELDS = [
+    "op_yoy", "ebt_yoy", "tr_yoy", "ocfps", "fcff", "fcfe",
+    "assets_turn", "ar_turn", "ca_turn", "fa_turn",
+    "saleexp_to_gr", "adminexp_of_gr", "finaexp_of_gr",
+    "cash_ratio", "debt_to_eqt",
+]
+
+
+async def _cached_ratio_rows(code: str, indicator: str) -> list:
+    """已缓存的财务比率, 或由已缓存的三张报表宽表计算; 任一报表未缓存时返回 []"""
+    ratios = await peek_cached("financial_ratios", code, {"indicator": indicator})
+    if ratios is not None:
+        return ratios.get("data") or []
+    statements = []
+    for report_type in ("income", "balance", "cashflow"):
+        result = await peek_cached("financial_wide", code, {"type": report_type, "indicator": indicator})
+        if not result or not result.get("success") or not result.get("data"):
+            return []
+        statements.append(project_records(result["data"], RATIO_INPUT_FIELDS[report_type]))
+    return _indicator_records(await asyncio.to_thread(compute_financial_ratios, *statements))
+
+
+async def _fill_from_ratios(code: str, columns: dict):
+    """按报告期用财务比率替换 FINA_INDICATOR_ZERO_FIELDS 的 0 值 (比率不可用时保持 0)"""
+    by_period = {}
+    try:
+        # 报告期口径覆盖中报, 同一报告期以其为准
+        for indicator in ("年度", "报告期"):
+            by_period.update({row["end_date"]: row for row in await _cached_ratio_rows(code, indicator)})
+    except Exception as e:
+        print(f"[AkshareProxy] 财务比率计算失败: {code}: {e}", file=sys.stderr)
+        return
+    for i, end_date in enumerate(columns["end_date"]):
+        row = by_period.get(str(end_date)[:8])
+        if row is None:
+            continue
+        for field in FINA_INDICATOR_ZERO_FIELDS:
+            if row.get(field) is not None:
+                columns[field][i] = row[field]
+
+
+async def _load_hk_fina_indicator(code: str) -> dict:
+    """从 AKShare 获取港股财务指标"""
     try:
         print(f"[AkshareProxy] 获取港股财务指标: {code}")
         
         # 尝试获取财务指标
         try:
-            df = ak.stock_hk_financial_indicator_em(symbol=code)
+            df = await call_ak("stock_hk_financial_indicator_em", symbol=code)
             
             if df is not None and not df.empty:
-                # 转换数据
-                data = []
-                for _, row in df.iterrows():
-                    data.append({
-                        "end_date": str(row.get('报告期', '')).replace('-', ''),
-                        "roe": float(row.get('净资产收益率', 0) or 0),
-                        "roa": float(row.get('总资产净利率', 0) or 0),
-                        "gross_margin": float(row.get('毛利率', 0) or 0),
-                        "netprofit_margin": float(row.get('净利率', 0) or 0),
-                        "debt_to_assets": float(row.get('资产负债率', 0) or 0),
-                        "current_ratio": float(row.get('流动比率', 0) or 0),
-                        "quick_ratio": float(row.get('速动比率', 0) or 0),
-                        "eps": float(row.get('每股收益', 0) or 0),
-                        "bps": float(row.get('每股净资产', 0) or 0),
-                        "netprofit_yoy": float(row.get('净利润同比', 0) or 0),
-                        "or_yoy": float(row.get('营收同比', 0) or 0),
-                        "op_yoy": 0,
-                        "ebt_yoy": 0,
-                        "tr_yoy": 0,
-                        "ocfps": 0,
-                        "fcff": 0,
-                        "fcfe": 0,
-                        "assets_turn": 0,
-                        "ar_turn": 0,
-                        "ca_turn": 0,
-                        "fa_turn": 0,
-                        "saleexp_to_gr": 0,
-                        "adminexp_of_gr": 0,
-                        "finaexp_of_gr": 0,
-                        "cash_ratio": 0,
-                        "debt_to_eqt": 0,
-                        "roe_waa": float(row.get('净资产收益率', 0) or 0),
-                        "roe_dt": float(row.get('净资产收益率', 0) or 0),
-                        "dt_eps": float(row.get('每股收益', 0) or 0),
-                    })
+                # 按列转换后组装 (上游未提供的指标填 0)
+                roe = df_numeric_column(df, '净资产收益率').tolist()
+                eps = df_numeric_column(df, '每股收益').tolist()
+                columns = {
+                    "end_date": df['报告期'].astype(str).str.replace('-', '', regex=False).tolist()
+                    if '报告期' in df.columns else [''] * len(df),
+                    "roe": roe,
+                    "roa": df_numeric_column(df, '总资产净利率').tolist(),
+                    "gross_margin": df_numeric_column(df, '毛利率').tolist(),
+                    "netprofit_margin": df_numeric_column(df, '净利率').tolist(),
+                    "debt_to_assets": df_numeric_column(df, '资产负债率').tolist(),
+                    "current_ratio": df_numeric_column(df, '流动比率').tolist(),
+                    "quick_ratio": df_numeric_column(df, '速动比率').tolist(),
+                    "eps": eps,
+                    "bps": df_numeric_column(df, '每股净资产').tolist(),
+                    "netprofit_yoy": df_numeric_column(df, '净利润同比').tolist(),
+                    "or_yoy": df_numeric_column(df, '营收同比').tolist(),
+                }
+                for field in FINA_INDICATOR_ZERO_FIELDS:
+                    columns[field] = [0] * len(df)
+                columns["roe_waa"] = roe
+                columns["roe_dt"] = roe
+                columns["dt_eps"] = eps
+                
+                await _fill_from_ratios(code, columns)
+                
+                keys = list(columns)
+                data = [dict(zip(keys, row)) for row in zip(*columns.values())]
                 
                 return {
                     "success": True,
@@ -650,7 +3665,12 @@ async def get_hk_fina_indicator(stock_code: str):
                     "count": len(data)
                 }
         except Exception as e:
-            print(f"[AkshareProxy] 获取财务指标失败: {e}")
+            print(f"[AkshareProxy] 获取财务指标失败: {e}", file=sys.stderr)
+            return {
+                "success": False,
+                "error": str(e),
+                "data": []
+            }
         
         return {
             "success": True,
@@ -668,31 +3688,56 @@ async def get_hk_fina_indicator(stock_code: str):
         }
 
 
+async def cached_hk_fina_indicator(code: str) -> dict:
+    """港股财务指标 (带缓存)"""
+    return await cached_call(
+        "fina_indicator", "fina_indicator", code, None,
+        lambda: _load_hk_fina_indicator(code)
+    )
+
+
+@app.get("/hk/fina_indicator/{stock_code}")
+async def get_hk_fina_indicator(stock_code: str, output: OutputOptions = Depends()):
+    """
+    获取港股财务指标 (ROE/毛利率等)
+    
+    Args:
+        stock_code: 港股代码 (如 00700)
+        output: 字段投影 / 输出格式
+        
+    Returns:
+        JSON 格式的财务指标数据
+    """
+    code = normalize_hk_code(stock_code)
+    
+    return data_response(await cached_hk_fina_indicator(code), output)
+
+
 # ============ 港股主营业务构成 ============
 @app.get("/hk/main_biz/{stock_code}")
-async def get_hk_main_biz(stock_code: str):
+async def get_hk_main_biz(stock_code: str, output: OutputOptions = Depends()):
     """
     获取港股主营业务构成
     
     Args:
         stock_code: 港股代码 (如 00700)
+        output: 字段投影 / 输出格式
         
     Returns:
         JSON 格式的主营业务构成数据
     """
-    code = stock_code.replace('.HK', '').replace('.hk', '').strip()
-    code = code.zfill(5)
+    code = normalize_hk_code(stock_code)
     
     try:
         print(f"[AkshareProxy] 获取港股主营业务构成: {code}")
         
         # 港股暂无直接的主营业务构成接口
         # 返回空数据
-        return {
+        return data_response({
             "success": True,
             "data": [],
             "message": "Hong Kong stocks do not have detailed business segment data available"
-        }
+        }, output)
         
     except Exception as e:
         error_msg = str(e)
@@ -706,21 +3751,12 @@ async def get_hk_main_biz(stock_code: str):
 
 
 # ============ 港股列表（港股通成分股）============
-@app.get("/hk/stock_list")
-async def get_hk_stock_list():
-    """
-    获取港股通成分股列表（可通过港股通交易的港股）
-    
-    Returns:
-        JSON 格式的港股列表
-    """
+async def _universe_response(kind: str, label: str) -> dict:
+    """从代码池快照生成列表响应"""
     try:
-        print(f"[AkshareProxy] 获取港股通成分股列表...")
+        stocks = await hk_universe.get(kind)
         
-        # 获取港股通成分股
-        df = ak.stock_hk_ggt_components_em()
-        
-        if df is None or df.empty:
+        if not stocks:
             return {
                 "success": True,
                 "data": [],
@@ -728,22 +3764,7 @@ async def get_hk_stock_list():
                 "message": "No HK stock data found"
             }
         
-        # 转换为标准格式
-        stocks = []
-        for _, row in df.iterrows():
-            code = str(row.get('代码', '')).strip()
-            name = str(row.get('名称', '')).strip()
-            
-            if code and name:
-                stocks.append({
-                    "ts_code": f"{code}.HK",
-                    "symbol": code,
-                    "name": name,
-                    "market": "HK",
-                    "stock_type": "HK"
-                })
-        
-        print(f"[AkshareProxy] 成功获取 {len(stocks)} 只港股通成分股")
+        print(f"[AkshareProxy] 返回 {len(stocks)} 只{label}")
         
         return {
             "success": True,
@@ -764,65 +3785,742 @@ async def get_hk_stock_list():
         }
 
 
+@app.get("/hk/stock_list")
+async def get_hk_stock_list(output: OutputOptions = Depends()):
+    """
+    获取港股通成分股列表（可通过港股通交易的港股）
+    
+    Args:
+        output: 字段投影 / 输出格式
+        
+    Returns:
+        JSON 格式的港股列表
+    """
+    return data_response(await _universe_response("connect", "港股通成分股"), output)
+
+
 # ============ 所有港股列表（实时行情）============
 @app.get("/hk/all_stocks")
-async def get_all_hk_stocks():
+async def get_all_hk_stocks(output: OutputOptions = Depends()):
     """
     获取所有港股列表（从实时行情获取）
     
+    Args:
+        output: 字段投影 / 输出格式
+        
     Returns:
         JSON 格式的所有港股列表
     """
-    try:
-        print(f"[AkshareProxy] 获取所有港股列表...")
-        
-        # 获取港股实时行情
-        df = ak.stock_hk_spot_em()
-        
-        if df is None or df.empty:
-            return {
-                "success": True,
-                "data": [],
-                "count": 0,
-                "message": "No HK stock data found"
-            }
-        
-        # 转换为标准格式
-        stocks = []
-        for _, row in df.iterrows():
-            code = str(row.get('代码', '')).strip()
-            name = str(row.get('名称', '')).strip()
-            
-            if code and name:
-                stocks.append({
-                    "ts_code": f"{code}.HK",
-                    "symbol": code,
-                    "name": name,
-                    "market": "HK",
-                    "stock_type": "HK"
-                })
-        
-        print(f"[AkshareProxy] 成功获取 {len(stocks)} 只港股")
-        
+    return data_response(await _universe_response("all", "港股"), output)
+
+
+# ============ 港股行情快照选股 ============
+# stock_hk_spot_em 一次返回全市场约 2600 只港股的行情; 整表按列保存在内存中,
+# 按 AKSHARE_SPOT_TTL 刷新, 选股表达式编译为向量化布尔掩码在快照上求值
+AKSHARE_SPOT_TTL = float(os.environ.get("AKSHARE_SPOT_TTL", "60"))
+AKSHARE_SCREEN_MAX_ROWS = int(os.environ.get("AKSHARE_SCREEN_MAX_ROWS", "500"))
+
+# 行情列名 -> 英文字段; 上游未返回的列跳过
+SPOT_COLUMN_MAP = {
+    '代码': 'code',
+    '名称': 'name',
+    '最新价': 'price',
+    '涨跌额': 'change',
+    '涨跌幅': 'pct_chg',
+    '今开': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '昨收': 'pre_close',
+    '成交量': 'volume',
+    '成交额': 'amount',
+    '换手率': 'turnover_rate',
+    '市盈率': 'pe',
+    '市净率': 'pb',
+    '总市值': 'total_mv',
+    '流通市值': 'circ_mv',
+}
+SPOT_TEXT_COLUMNS = ('code', 'name')
+
+
+def spot_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """行情 DataFrame -> 英文列名的列式快照 (代码补齐 5 位, 数值列统一为 float64)"""
+    columns = {cn: en for cn, en in SPOT_COLUMN_MAP.items() if cn in df.columns}
+    frame = df[list(columns)].rename(columns=columns)
+    frame['code'] = frame['code'].fillna('').astype(str).str.strip().str.zfill(5)
+    frame['name'] = frame['name'].fillna('').astype(str).str.strip()
+    for column in frame.columns:
+        if column not in SPOT_TEXT_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce').astype('float64')
+    return frame[frame['code'] != '00000'].reset_index(drop=True)
+
+
+class SpotSnapshot:
+    """
+    全市场行情快照 (stale-while-revalidate)
+
+    - 超过 AKSHARE_SPOT_TTL 后立即返回旧快照 (标记 stale), 并在后台刷新
+    - 没有快照或旧快照超出 stale 窗口 (与K线相同) 时才在请求中等待刷新
+    - 同一时刻只有一个刷新任务, 并发请求共用; 刷新失败时保留旧快照
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.refreshed_at = None
+        self.refresh_failures = 0
+        self._refresh_task = None
+
+    def _age(self) -> float:
+        return time.time() - self.refreshed_at if self.frame is not None else math.inf
+
+    async def _refresh(self, priority: str):
+        # 任务运行在复制的上下文中, 不影响发起请求的优先级
+        request_priority.set(priority)
+        try:
+            df = await call_ak("stock_hk_spot_em")
+            if df is None or df.empty:
+                raise ValueError("stock_hk_spot_em 返回空数据")
+            self.frame = await asyncio.to_thread(spot_frame, df)
+            self.refreshed_at = time.time()
+            hk_universe.update("all", df)
+            print(f"[AkshareProxy] 行情快照已刷新: {len(self.frame)} 只")
+        except Exception as e:
+            self.refresh_failures += 1
+            print(f"[AkshareProxy] 行情快照刷新失败: {e}", file=sys.stderr)
+            raise
+        finally:
+            self._refresh_task = None
+
+    def _start_refresh(self, priority: str) -> asyncio.Task:
+        if self._refresh_task is None:
+            task = asyncio.create_task(self._refresh(priority))
+            # 后台刷新的异常已记录, 无人等待时避免 "exception was never retrieved"
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._refresh_task = task
+        return self._refresh_task
+
+    async def get(self) -> tuple:
+        """返回 (快照, 是否过期)"""
+        age = self._age()
+        if age < AKSHARE_SPOT_TTL:
+            return self.frame, False
+        if age < AKSHARE_SPOT_TTL + CACHE_STALE["kline"]:
+            self._start_refresh("bulk")
+            return self.frame, True
+        await asyncio.shield(self._start_refresh(request_priority.get()))
+        return self.frame, False
+
+    def stats(self) -> dict:
         return {
+            "count": len(self.frame) if self.frame is not None else None,
+            "columns": list(self.frame.columns) if self.frame is not None else [],
+            "refreshed_at": self.refreshed_at,
+            "refreshing": self._refresh_task is not None,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+spot_snapshot = SpotSnapshot()
+
+
+class ScreenSyntaxError(ValueError):
+    """选股表达式语法错误"""
+
+
+SCREEN_KEYWORDS = {'and', 'or', 'not', 'contains', 'order', 'by', 'asc', 'desc', 'limit'}
+SCREEN_COMPARISONS = {'>', '>=', '<', '<=', '==', '=', '!='}
+
+
+def _screen_tokens(text: str) -> list:
+    """切分选股表达式, 返回 (类型, 值) 列表; 类型为 num / str / name / kw / op"""
+    tokens = []
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch.isspace():
+            i += 1
+        elif ch.isdigit() or (ch == '.' and text[i + 1:i + 2].isdigit()):
+            j = i
+            while j < len(text) and (text[j].isalnum() or text[j] == '.' or
+                                     (text[j] in '+-' and text[j - 1] in 'eE')):
+                j += 1
+            try:
+                tokens.append(('num', float(text[i:j])))
+            except ValueError:
+                raise ScreenSyntaxError(f"无效的数字: {text[i:j]}")
+            i = j
+        elif ch in '\'"':
+            j = text.find(ch, i + 1)
+            if j < 0:
+                raise ScreenSyntaxError("字符串缺少结束引号")
+            tokens.append(('str', text[i + 1:j]))
+            i = j + 1
+        elif ch.isalpha() or ch == '_':
+            j = i
+            while j < len(text) and (text[j].isalnum() or text[j] == '_'):
+                j += 1
+            word = text[i:j]
+            tokens.append(('kw', word.lower()) if word.lower() in SCREEN_KEYWORDS else ('name', word))
+            i = j
+        elif text[i:i + 2] in ('>=', '<=', '==', '!='):
+            tokens.append(('op', text[i:i + 2]))
+            i += 2
+        elif ch in '<>=+-*/(),':
+            tokens.append(('op', ch))
+            i += 1
+        else:
+            raise ScreenSyntaxError(f"无法识别的字符: {ch}")
+    return tokens
+
+
+class ScreenQuery:
+    """
+    选股表达式: [过滤条件] [order by 字段 [asc|desc], ...] [limit N]
+
+    过滤条件支持 and / or / not / 括号, 比较运算 > >= < <= = == !=, 四则运算,
+    以及 name contains "银行"; 标识符只能是快照中的列名, 不会执行任意代码。
+    解析结果为语法树元组, 求值时整列计算, 不逐行循环。
+
+    缺失值 (NaN) 参与的比较一律为假, != 也不例外 (pct_chg != 0 不选出无行情的股票);
+    not 对整个条件取反, not (pct_chg > 0) 会选出 pct_chg 缺失的股票。
+    """
+
+    def __init__(self, text: str, columns: list):
+        self.tokens = _screen_tokens(text)
+        self.columns = set(columns)
+        self.pos = 0
+        self.where = None
+        self.order = []
+        self.limit = None
+        self._parse()
+
+    # ---- 语法分析 ----
+    def _peek(self) -> tuple:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _accept(self, kind: str, value=None) -> bool:
+        token = self._peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, kind: str, value=None):
+        token = self._peek()
+        if not self._accept(kind, value):
+            raise ScreenSyntaxError(f"期望 {value or kind}, 实际为 {token[1] if token[0] else '结尾'}")
+        return token[1]
+
+    def _column(self) -> str:
+        name = self._expect('name')
+        if name not in self.columns:
+            raise ScreenSyntaxError(f"未知字段: {name}. 可选: {', '.join(sorted(self.columns))}")
+        return name
+
+    def _parse(self):
+        if self._peek()[0] is not None and self._peek() != ('kw', 'order') and self._peek() != ('kw', 'limit'):
+            self.where = self._or()
+        if self._accept('kw', 'order'):
+            self._expect('kw', 'by')
+            while True:
+                column = self._column()
+                descending = self._accept('kw', 'desc')
+                if not descending:
+                    self._accept('kw', 'asc')
+                self.order.append((column, descending))
+                if not self._accept('op', ','):
+                    break
+        if self._accept('kw', 'limit'):
+            value = self._expect('num')
+            if value < 0 or value != int(value):
+                raise ScreenSyntaxError(f"limit 必须为非负整数: {value}")
+            self.limit = int(value)
+        if self._peek()[0] is not None:
+            raise ScreenSyntaxError(f"多余的内容: {self._peek()[1]}")
+
+    def _or(self):
+        node = self._and()
+        while self._accept('kw', 'or'):
+            node = ('or', node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self._accept('kw', 'and'):
+            node = ('and', node, self._not())
+        return node
+
+    def _not(self):
+        if self._accept('kw', 'not'):
+            return ('not', self._not())
+        return self._comparison()
+
+    def _comparison(self):
+        left = self._sum()
+        if self._accept('kw', 'contains'):
+            return ('contains', left, self._expect('str'))
+        token = self._peek()
+        if token[0] == 'op' and token[1] in SCREEN_COMPARISONS:
+            self.pos += 1
+            return ('==' if token[1] == '=' else token[1], left, self._sum())
+        return left
+
+    def _sum(self):
+        node = self._product()
+        while self._peek()[0] == 'op' and self._peek()[1] in '+-':
+            op = self.tokens[self.pos][1]
+            self.pos += 1
+            node = (op, node, self._product())
+        return node
+
+    def _product(self):
+        node = self._unary()
+        while self._peek()[0] == 'op' and self._peek()[1] in '*/':
+            op = self.tokens[self.pos][1]
+            self.pos += 1
+            node = (op, node, self._unary())
+        return node
+
+    def _unary(self):
+        if self._accept('op', '-'):
+            return ('neg', self._unary())
+        if self._accept('op', '('):
+            node = self._or()
+            self._expect('op', ')')
+            return node
+        kind, value = self._peek()
+        if kind in ('num', 'str'):
+            self.pos += 1
+            return ('const', value)
+        if kind == 'name':
+            return ('col', self._column())
+        raise ScreenSyntaxError(f"期望字段或数值, 实际为 {value if kind else '结尾'}")
+
+    # ---- 求值 ----
+    def _eval(self, node, frame: pd.DataFrame):
+        op = node[0]
+        if op == 'const':
+            return node[1]
+        if op == 'col':
+            return frame[node[1]]
+        if op == 'neg':
+            return -self._eval(node[1], frame)
+        if op == 'not':
+            return ~self._mask(node[1], frame)
+        if op in ('and', 'or'):
+            left, right = self._mask(node[1], frame), self._mask(node[2], frame)
+            return left & right if op == 'and' else left | right
+        if op == 'contains':
+            values = self._eval(node[1], frame)
+            if not isinstance(values, pd.Series) or values.dtype == 'float64':
+                raise ScreenSyntaxError("contains 只能用于文本字段 (code / name)")
+            return values.str.contains(node[2], regex=False)
+        left, right = self._eval(node[1], frame), self._eval(node[2], frame)
+        if op in ('+', '-', '*', '/'):
+            if isinstance(left, str) or isinstance(right, str):
+                raise ScreenSyntaxError(f"文本不能参与 {op} 运算")
+            if op == '+':
+                return left + right
+            if op == '-':
+                return left - right
+            if op == '*':
+                return left * right
+            # 除数为 0 时结果为 NaN (不匹配任何比较)
+            return left / (right.where(right != 0) if isinstance(right, pd.Series) else (right or np.nan))
+        comparisons = {'>': '__gt__', '>=': '__ge__', '<': '__lt__', '<=': '__le__', '==': '__eq__', '!=': '__ne__'}
+        left = left if isinstance(left, pd.Series) else pd.Series(left, index=frame.index)
+        try:
+            result = getattr(left, comparisons[op])(right)
+        except TypeError:
+            raise ScreenSyntaxError(f"无法比较文本和数值 ({op})")
+        # pandas 中 NaN != x 为真, 这里统一按 "缺失值不满足任何比较" 处理
+        result = result & left.notna()
+        if isinstance(right, pd.Series):
+            result = result & right.notna()
+        return result
+
+    def _mask(self, node, frame: pd.DataFrame) -> pd.Series:
+        result = self._eval(node, frame)
+        if not isinstance(result, pd.Series) or result.dtype != bool:
+            raise ScreenSyntaxError("过滤条件必须是比较表达式")
+        return result
+
+    def run(self, frame: pd.DataFrame, max_rows: int) -> tuple:
+        """返回 (结果 DataFrame, 匹配总数); 排序时缺失值排在最后"""
+        matched = frame[self._mask(self.where, frame)] if self.where is not None else frame
+        total = len(matched)
+        limit = min(self.limit if self.limit is not None else max_rows, max_rows)
+        if self.order:
+            columns = [column for column, _ in self.order]
+            ascending = [not descending for _, descending in self.order]
+            if len(self.order) == 1 and matched[columns[0]].dtype == 'float64':
+                # 单个数值字段排序只需部分排序取前 N (nlargest 不支持文本列)
+                column, descending = self.order[0]
+                values = matched[column]
+                picked = values.nlargest(limit) if descending else values.nsmallest(limit)
+                rest = limit - len(picked)
+                if rest > 0:
+                    picked_index = picked.index.append(values[values.isna()].index[:rest])
+                else:
+                    picked_index = picked.index
+                matched = matched.loc[picked_index]
+            else:
+                matched = matched.sort_values(columns, ascending=ascending, na_position='last', kind='stable')
+        return matched.head(limit), total
+
+
+async def _load_hk_screen(q: str) -> dict:
+    """在行情快照上执行选股表达式"""
+    try:
+        frame, stale = await spot_snapshot.get()
+        started = time.perf_counter()
+        query = ScreenQuery(q, list(frame.columns))
+        result, total = query.run(frame, AKSHARE_SCREEN_MAX_ROWS)
+        elapsed = time.perf_counter() - started
+        record_timing("screen", elapsed)
+        data = df_to_json_safe(result)
+        print(f"[AkshareProxy] 选股: {q!r}, 匹配 {total} 只, 返回 {len(data)} 只, 耗时 {elapsed * 1000:.1f}ms")
+        payload = {
             "success": True,
-            "data": stocks,
-            "count": len(stocks)
+            "data": data,
+            "count": len(data),
+            "total": total,
+            "as_of": datetime.fromtimestamp(spot_snapshot.refreshed_at, timezone.utc).isoformat(),
+            "age": int(time.time() - spot_snapshot.refreshed_at),
         }
-        
+        if stale:
+            payload["stale"] = True
+        return payload
+
+    except ScreenSyntaxError:
+        raise
     except Exception as e:
         error_msg = str(e)
         traceback.print_exc()
         print(f"[AkshareProxy] 错误: {error_msg}", file=sys.stderr)
-        
+
         return {
             "success": False,
             "error": error_msg,
-            "data": [],
-            "count": 0
+            "data": []
+        }
+
+
+@app.get("/hk/screen")
+async def get_hk_screen(
+    q: str = Query("", description='选股表达式, 如 "pct_chg > 5 and amount > 1e8 order by amount desc limit 50"'),
+    output: OutputOptions = Depends()
+):
+    """
+    全市场行情快照选股
+
+    Args:
+        q: 选股表达式, 可用字段为快照列 (code/name/price/change/pct_chg/open/high/low/
+           pre_close/volume/amount 等); 为空时返回全部 (受 AKSHARE_SCREEN_MAX_ROWS 限制)
+        output: 字段投影 / 输出格式
+
+    Returns:
+        JSON 格式的选股结果, total 为过滤后的匹配总数
+    """
+    try:
+        payload = await _load_hk_screen(q)
+    except ScreenSyntaxError as e:
+        return json_response({
+            "success": False,
+            "error": f"Invalid screen expression: {e}",
+            "data": []
+        }, status_code=400)
+    return data_response(payload, output)
+
+
+# ============ 港股批量数据 ============
+# 一份港股分析需要 income/balance/cashflow/basic/company/kline/daily_basic 等
+# 多个数据集, 同业对比再乘以公司数量; 批量端点在服务端并发拉取, 一次返回
+AKSHARE_BATCH_CONCURRENCY = int(os.environ.get("AKSHARE_BATCH_CONCURRENCY", "8"))
+AKSHARE_BATCH_MAX_ITEMS = int(os.environ.get("AKSHARE_BATCH_MAX_ITEMS", "200"))
+
+BATCH_DEFAULT_DATASETS = ["income", "balance", "cashflow", "basic", "company", "kline", "daily_basic"]
+
+
+class BatchRequest(BaseModel):
+    codes: List[str]
+    datasets: List[str] = BATCH_DEFAULT_DATASETS
+    days: int = Field(180, ge=1, le=KLINE_MAX_BARS)
+    adjust: str = "qfq"
+    indicator: str = "年度"
+
+
+# 数据集名称 -> 加载函数; 财务报表返回宽表 (与 /hk/financial_wide 默认字段一致)
+BATCH_DATASETS = {
+    "income": lambda code, req: cached_hk_financial_wide(code, "income", req.indicator),
+    "balance": lambda code, req: cached_hk_financial_wide(code, "balance", req.indicator),
+    "cashflow": lambda code, req: cached_hk_financial_wide(code, "cashflow", req.indicator),
+    "basic": lambda code, req: hk_basic_result(code),
+    "company": lambda code, req: cached_hk_company(code),
+    "kline": lambda code, req: cached_hk_kline(code, req.days, req.adjust),
+    "daily_basic": lambda code, req: cached_hk_daily_basic(code),
+    "fina_indicator": lambda code, req: cached_hk_fina_indicator(code),
+    "indicators": lambda code, req: cached_hk_indicators(code, 1, req.adjust),
+    "ratios": lambda code, req: cached_hk_financial_ratios(code, req.indicator),
+}
+
+
+async def _batch_item(code: str, dataset: str, req: BatchRequest, semaphore: asyncio.Semaphore) -> dict:
+    """加载单个 (代码, 数据集), 异常只影响该项"""
+    async with semaphore:
+        try:
+            return await BATCH_DATASETS[dataset](code, req)
+        except Exception as e:
+            traceback.print_exc()
+            return {"success": False, "error": str(e), "data": []}
+
+
+@app.post("/hk/batch")
+async def get_hk_batch(req: BatchRequest):
+    """
+    批量获取多只港股的多个数据集
+    
+    Args:
+        req: codes 港股代码列表, datasets 数据集列表 (默认 income/balance/cashflow/
+             basic/company/kline/daily_basic), days/adjust 为 K 线参数, indicator 为财报口径
+        
+    Returns:
+        {"success": true, "data": {code: {dataset: 单项结果}}, "errors": 失败项数}
+        每个单项结果与对应单独端点的返回格式一致
+    """
+    unknown = [d for d in req.datasets if d not in BATCH_DATASETS]
+    if unknown:
+        return json_response({
+            "success": False,
+            "error": f"Invalid datasets: {', '.join(unknown)}. Must be one of: {', '.join(BATCH_DATASETS)}",
+            "data": {}
+        }, status_code=400)
+    
+    codes = list(dict.fromkeys(normalize_hk_code(c) for c in req.codes))
+    datasets = list(dict.fromkeys(req.datasets))
+    items = [(code, dataset) for code in codes for dataset in datasets]
+    if len(items) > AKSHARE_BATCH_MAX_ITEMS:
+        return json_response({
+            "success": False,
+            "error": f"Too many items: {len(items)} > {AKSHARE_BATCH_MAX_ITEMS}",
+            "data": {}
+        }, status_code=400)
+    
+    print(f"[AkshareProxy] 批量获取: {len(codes)} 只股票 x {len(datasets)} 个数据集")
+    started = time.perf_counter()
+    for code in codes:
+        hot_codes.record(code)
+    
+    semaphore = asyncio.Semaphore(AKSHARE_BATCH_CONCURRENCY)
+    results = await asyncio.gather(*(_batch_item(code, dataset, req, semaphore) for code, dataset in items))
+    
+    data = {code: {} for code in codes}
+    errors = 0
+    for (code, dataset), result in zip(items, results):
+        data[code][dataset] = result
+        if not result.get("success"):
+            errors += 1
+    
+    return json_response({
+        "success": True,
+        "data": data,
+        "count": len(items),
+        "errors": errors,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    })
+
+
+# ============ 热门股票预热 ============
+# 后台按热门列表提前刷新即将过期的缓存, 让用户请求基本都命中缓存
+# - 轻任务 (K线、每日指标): 每个周期检查, 剩余有效期不足两个周期的条目提前回源
+# - 重任务 (三大报表、公司信息、财务指标): 只在非高峰时段 (港股收盘后) 每天刷新一次
+AKSHARE_PREWARM = os.environ.get("AKSHARE_PREWARM", "1") not in ("0", "false", "off")
+AKSHARE_PREWARM_CODES = [
+    normalize_hk_code(c) for c in os.environ.get("AKSHARE_PREWARM_CODES", "").split(",") if c.strip()
+]
+AKSHARE_PREWARM_TOP = int(os.environ.get("AKSHARE_PREWARM_TOP", "50"))
+AKSHARE_PREWARM_INTERVAL = int(os.environ.get("AKSHARE_PREWARM_INTERVAL", "60"))
+AKSHARE_PREWARM_CONCURRENCY = int(os.environ.get("AKSHARE_PREWARM_CONCURRENCY", "4"))
+# 非高峰时段 (香港时间, 可跨零点)
+AKSHARE_OFFPEAK = os.environ.get("AKSHARE_OFFPEAK", "17:00-08:30")
+
+PREWARM_LIGHT_DATASETS = ["kline", "daily_basic"]
+PREWARM_HEAVY_DATASETS = ["income", "balance", "cashflow", "company", "fina_indicator"]
+
+HK_TZ = timezone(timedelta(hours=8))
+
+
+def is_offpeak(now: Optional[datetime] = None) -> bool:
+    """当前是否处于非高峰时段"""
+    start, end = (datetime.strptime(t.strip(), "%H:%M").time() for t in AKSHARE_OFFPEAK.split("-"))
+    current = (now or datetime.now(HK_TZ)).time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+class Prewarmer:
+    """热门股票缓存预热"""
+
+    def __init__(self):
+        self.last_light = None
+        self.last_heavy = None
+        self.refreshed = 0
+        self.errors = 0
+
+    def codes(self) -> list:
+        """配置的热门列表 + 按请求频率学习到的热门股票"""
+        learned = [c for c in hot_codes.top(AKSHARE_PREWARM_TOP) if c not in AKSHARE_PREWARM_CODES]
+        return AKSHARE_PREWARM_CODES + learned
+
+    async def _warm(self, code: str, dataset: str, lead: float, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            token = prewarm_lead.set(lead)
+            try:
+                result = await BATCH_DATASETS[dataset](code, PREWARM_REQUEST)
+                if result.get("success"):
+                    self.refreshed += 1
+                else:
+                    self.errors += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[AkshareProxy] 预热失败: {code} {dataset}: {e}", file=sys.stderr)
+            finally:
+                prewarm_lead.reset(token)
+
+    async def run_once(self):
+        hot_codes.decay()
+        codes = self.codes()
+        if not codes:
+            return
+        semaphore = asyncio.Semaphore(AKSHARE_PREWARM_CONCURRENCY)
+        jobs = [(code, dataset, 2 * AKSHARE_PREWARM_INTERVAL) for code in codes for dataset in PREWARM_LIGHT_DATASETS]
+
+        # 重任务每个非高峰时段跑一次, 提前量取整个 TTL (即全部刷新)
+        heavy_due = self.last_heavy is None or time.time() - self.last_heavy > 12 * 3600
+        if is_offpeak() and heavy_due:
+            jobs += [(code, dataset, CACHE_TTL["financial"]) for code in codes for dataset in PREWARM_HEAVY_DATASETS]
+            self.last_heavy = time.time()
+            print(f"[AkshareProxy] 非高峰时段预热: {len(codes)} 只股票")
+
+        await asyncio.gather(*(self._warm(code, dataset, lead, semaphore) for code, dataset, lead in jobs))
+        self.last_light = time.time()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": AKSHARE_PREWARM,
+            "configured": len(AKSHARE_PREWARM_CODES),
+            "hot_codes": self.codes()[:10],
+            "last_light": self.last_light,
+            "last_heavy": self.last_heavy,
+            "refreshed": self.refreshed,
+            "errors": self.errors,
+            "offpeak": is_offpeak(),
         }
 
 
+# 预热使用与 TS 端默认参数一致的请求 (K线 180 天前复权, 年度报表)
+PREWARM_REQUEST = BatchRequest(codes=[])
+prewarmer = Prewarmer()
+
+
+async def _prewarm_loop():
+    request_priority.set("bulk")
+    while True:
+        await asyncio.sleep(AKSHARE_PREWARM_INTERVAL)
+        try:
+            await prewarmer.run_once()
+        except Exception as e:
+            print(f"[AkshareProxy] 预热周期失败: {e}", file=sys.stderr)
+
+
+@app.on_event("startup")
+async def start_prewarm():
+    if AKSHARE_PREWARM:
+        app.state.prewarm_task = asyncio.create_task(_prewarm_loop())
+
+
+@app.on_event("shutdown")
+async def stop_prewarm():
+    task = getattr(app.state, "prewarm_task", None)
+    if task is not None:
+        task.cancel()
+
+
+# ============ 启动与就绪 ============
+# /health 只表示进程存活; akshare 导入、执行池创建和缓存预加载在启动后的后台任务中完成,
+# 全部完成后 /ready 才返回 200, 期间到达的请求按需完成各自需要的部分
+AKSHARE_PRELOAD_ENTRIES = int(os.environ.get("AKSHARE_PRELOAD_ENTRIES", "500"))
+
+startup_state = {
+    "ready": False,
+    # 各阶段耗时 (毫秒)
+    "timings": {
+        "import_web": round((_web_imported - _import_started) * 1000, 1),
+        "import_pandas": round((_pandas_imported - _web_imported) * 1000, 1),
+        "module_init": round((time.perf_counter() - _pandas_imported) * 1000, 1),
+    },
+    "pending": ["akshare_import", "executor", "cache_preload"],
+    "errors": {},
+}
+
+
+async def _preload_cache() -> int:
+    """把磁盘缓存中最近的条目提升到进程内缓存, 返回加载条数"""
+    if disk_cache is None or AKSHARE_PRELOAD_ENTRIES <= 0:
+        return 0
+    rows = await asyncio.to_thread(disk_cache.recent, AKSHARE_PRELOAD_ENTRIES)
+    # 由旧到新写入, 最近的条目位于 LRU 末端
+    for key, stored_at, fresh_until, stale_until, body in reversed(rows):
+        _from_disk(key, (stored_at, fresh_until, stale_until, body))
+        await asyncio.sleep(0)
+    return len(rows)
+
+
+async def _warm_up():
+    """后台预热, 逐步记录耗时; 某一步失败时记录错误, /ready 保持 503"""
+    steps = [
+        # 进程池模式下主进程不调用 akshare, 导入在子进程中随执行池预热完成
+        ("akshare_import", lambda: asyncio.to_thread(get_ak)
+         if AKSHARE_FIXTURE_MODE != "replay" and upstream.kind == "thread" else asyncio.sleep(0)),
+        ("executor", upstream.warm),
+        ("cache_preload", _preload_cache),
+    ]
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            result = await step()
+            if name == "cache_preload":
+                startup_state["preloaded_entries"] = result
+        except Exception as e:
+            startup_state["errors"][name] = str(e)
+            print(f"[AkshareProxy] 预热失败: {name}: {e}", file=sys.stderr)
+            traceback.print_exc()
+        startup_state["timings"][name] = round((time.perf_counter() - started) * 1000, 1)
+        startup_state["pending"].remove(name)
+
+    startup_state["timings"]["time_to_ready"] = round((time.perf_counter() - _import_started) * 1000, 1)
+    startup_state["ready"] = not startup_state["errors"]
+    print(f"[AkshareProxy] 预热完成: {startup_state['timings']}")
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    app.state.warm_up_task = asyncio.create_task(_warm_up())
+
+
+@app.get("/ready")
+async def readiness_check():
+    """就绪探针: 预热完成前 (或有步骤失败时) 返回 503, 附带启动耗时分解"""
+    return json_response({
+        "ready": startup_state["ready"],
+        "akshare_version": akshare_version(),
+        "timings": startup_state["timings"],
+        "pending": startup_state["pending"],
+        "errors": startup_state["errors"],
+        "preloaded_entries": startup_state.get("preloaded_entries", 0),
+    }, status_code=200 if startup_state["ready"] else 503)
+
+
 # ============ 主程序入口 ============
 if __name__ == "__main__":
     import uvicorn
@@ -830,7 +4528,7 @@ if __name__ == "__main__":
     print("=" * 60)
     print("AKShare 港股数据代理服务")
     print("=" * 60)
-    print(f"AKShare 版本: {ak.__version__ if hasattr(ak, '__version__') else 'unknown'}")
+    print("AKShare: 启动后在后台导入, 就绪状态见 /ready")
     print("启动地址: http://0.0.0.0:8000")
     print("API 文档: http://localhost:8000/docs")
     print("=" * 60)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+AKShare 离线替身 (用于压测 / 基准测试)
+
+提供 akshare_proxy 用到的全部 ak.* 函数, 返回结构与东方财富接口一致的
+确定性 DataFrame, 不访问网络。同一 (函数, 参数) 每次返回相同数据。
+
+使用方式 (在导入 akshare_proxy 之前替换模块):
+    import sys, akshare_stub
+    sys.modules["akshare"] = akshare_stub
+    import akshare_proxy
+
+环境变量:
+    AKSHARE_STUB_LATENCY      - 模拟上游耗时 (秒), 如 "0.05" 或 "0.05,stock_hk_spot_em=1.5"
+    AKSHARE_STUB_ERROR_RATE   - 随机抛出 ConnectionError 的概率 (0~1, 默认 0)
+    AKSHARE_STUB_SEED         - 错误注入的随机种子 (默认 42)
+    AKSHARE_STUB_FIXTURES     - 录制数据目录, 存在 <函数名>.pkl / <函数名>.parquet 时
+                                直接返回该 DataFrame, 否则使用内置生成器
+"""
+
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+__version__ = "stub"
+
+
+def _parse_latency(raw: str) -> tuple:
+    """解析 "默认值,函数名=秒数,..." 格式的延迟配置"""
+    default = 0.0
+    per_func = {}
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" in item:
+            name, value = item.split("=", 1)
+            per_func[name.strip()] = float(value)
+        else:
+            default = float(item)
+    return default, per_func
+
+
+DEFAULT_LATENCY, FUNC_LATENCY = _parse_latency(os.environ.get("AKSHARE_STUB_LATENCY", "0"))
+ERROR_RATE = float(os.environ.get("AKSHARE_STUB_ERROR_RATE", "0"))
+FIXTURES_DIR = os.environ.get("AKSHARE_STUB_FIXTURES", "")
+
+_rng = random.Random(int(os.environ.get("AKSHARE_STUB_SEED", "42")))
+_rng_lock = threading.Lock()
+
+# 调用计数 (基准脚本用来统计实际打到上游的次数)
+calls = {}
+
+
+def configure(latency: float = None, error_rate: float = None, func_latency: dict = None):
+    """运行时调整延迟与错误注入"""
+    global DEFAULT_LATENCY, ERROR_RATE
+    if latency is not None:
+        DEFAULT_LATENCY = latency
+    if error_rate is not None:
+        ERROR_RATE = error_rate
+    if func_latency:
+        FUNC_LATENCY.update(func_latency)
+
+
+def _upstream(func_name: str):
+    """模拟一次上游请求: 计数、延迟、按概率失败"""
+    calls[func_name] = calls.get(func_name, 0) + 1
+    delay = FUNC_LATENCY.get(func_name, DEFAULT_LATENCY)
+    if delay > 0:
+        time.sleep(delay)
+    if ERROR_RATE > 0:
+        with _rng_lock:
+            failed = _rng.random() < ERROR_RATE
+        if failed:
+            raise ConnectionError(f"[stub] {func_name}: injected upstream error")
+
+
+def _fixture(func_name: str):
+    """读取录制好的 DataFrame (不存在时返回 None)"""
+    if not FIXTURES_DIR:
+        return None
+    base = os.path.join(FIXTURES_DIR, func_name)
+    if os.path.exists(base + ".parquet"):
+        return pd.read_parquet(base + ".parquet")
+    if os.path.exists(base + ".pkl"):
+        return pd.read_pickle(base + ".pkl")
+    return None
+
+
+def _seed(*parts) -> int:
+    return zlib.crc32("|".join(str(p) for p in parts).encode("utf-8"))
+
+
+# ============ 代码池 ============
+def _universe(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    price = rng.uniform(0.1, 500, n).round(3)
+    return pd.DataFrame({
+        "序号": np.arange(1, n + 1),
+        "代码": [f"{i:05d}" for i in range(1, n + 1)],
+        "名称": [f"港股{i:05d}" for i in range(1, n + 1)],
+        "最新价": price,
+        "涨跌额": rng.normal(0, 2, n).round(3),
+        "涨跌幅": rng.normal(0, 3, n).round(2),
+        "今开": (price * rng.uniform(0.95, 1.05, n)).round(3),
+        "最高": (price * 1.05).round(3),
+        "最低": (price * 0.95).round(3),
+        "昨收": (price * rng.uniform(0.95, 1.05, n)).round(3),
+        "成交量": rng.integers(0, 10 ** 9, n).astype(float),
+        "成交额": rng.uniform(0, 1e10, n).round(2),
+    })
+
+
+def stock_hk_spot_em():
+    _upstream("stock_hk_spot_em")
+    fixture = _fixture("stock_hk_spot_em")
+    return fixture if fixture is not None else _universe(3000)
+
+
+def stock_hk_ggt_components_em():
+    _upstream("stock_hk_ggt_components_em")
+    fixture = _fixture("stock_hk_ggt_components_em")
+    return fixture if fixture is not None else _universe(550)
+
+
+# ============ K线 ============
+def _history(symbol: str, adjust: str) -> pd.DataFrame:
+    """2010 年至今的全部交易日, 价格为按代码确定的随机游走"""
+    dates = pd.bdate_range("2010-01-04", datetime.now().strftime("%Y-%m-%d"))
+    rng = np.random.default_rng(_seed("hist", symbol))
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.015, len(dates))))
+    factor = {"": 1.0, "qfq": 1.0, "hfq": 1.8}.get(adjust, 1.0)
+    close = close * factor
+    prev = np.concatenate([[close[0]], close[:-1]])
+    volume = rng.integers(10 ** 5, 10 ** 8, len(dates)).astype(float)
+    return pd.DataFrame({
+        "日期": dates.strftime("%Y-%m-%d"),
+        "开盘": (prev * rng.uniform(0.99, 1.01, len(dates))).round(3),
+        "收盘": close.round(3),
+        "最高": (close * 1.02).round(3),
+        "最低": (close * 0.98).round(3),
+        "成交量": volume,
+        "成交额": (volume * close).round(2),
+        "振幅": 4.0,
+        "涨跌幅": ((close / prev - 1) * 100).round(2),
+        "涨跌额": (close - prev).round(3),
+        "换手率": rng.uniform(0.01, 2, len(dates)).round(2),
+    })
+
+
+def stock_hk_hist(symbol: str = "00700", period: str = "daily", start_date: str = "19700101",
+                  end_date: str = "22220101", adjust: str = ""):
+    _upstream("stock_hk_hist")
+    df = _fixture("stock_hk_hist")
+    if df is None:
+        df = _history(symbol, adjust)
+    start = f"{start_date[:4]}-{start_date[4:6]}-{start_date[6:8]}"
+    end = f"{end_date[:4]}-{end_date[4:6]}-{end_date[6:8]}"
+    return df[(df["日期"] >= start) & (df["日期"] <= end)].reset_index(drop=True)
+
+
+# 复权因子 (与 _history 的复权倍数一致: 复权价 = 不复权价 * factor + cash)
+ADJUST_FACTORS = {"qfq": 1.0, "hfq": 1.8}
+
+
+def stock_hk_daily(symbol: str = "00700", adjust: str = ""):
+    _upstream("stock_hk_daily")
+    fixture = _fixture("stock_hk_daily")
+    if fixture is not None:
+        return fixture
+    if adjust.endswith("-factor"):
+        kind = adjust[:-len("-factor")]
+        return pd.DataFrame({
+            "date": ["1900-01-01"],
+            f"{kind}_factor": [ADJUST_FACTORS[kind]],
+            "cash": [0.0],
+        })
+    df = _history(symbol, adjust)
+    return pd.DataFrame({
+        "date": df["日期"],
+        "open": df["开盘"],
+        "high": df["最高"],
+        "low": df["最低"],
+        "close": df["收盘"],
+        "volume": df["成交量"],
+    })
+
+
+# ============ 财务报表 ============
+STATEMENT_ITEMS = {
+    "利润表": ["营业额", "销售成本", "毛利", "其他收入", "销售及分销费用", "行政开支", "融资成本",
+            "除税前溢利", "税项", "除税后溢利", "少数股东损益", "股东应占溢利", "每股基本盈利",
+            "每股摊薄盈利", "每股股息"],
+    "资产负债表": ["物业厂房及设备", "无形资产", "非流动资产合计", "存货", "应收帐款", "现金及等价物",
+              "流动资产合计", "总资产", "应付帐款", "流动负债合计", "非流动负债合计", "总负债",
+              "股本", "储备", "股东权益", "少数股东权益"],
+    "现金流量表": ["除税前溢利(业务利润)", "加:折旧及摊销", "经营业务现金净额", "购建固定资产",
+              "投资业务现金净额", "已付股息", "融资业务现金净额", "现金净额", "期初现金", "期末现金"],
+}
+
+
+def stock_financial_hk_report_em(stock: str = "00700", symbol: str = "利润表", indicator: str = "年度"):
+    _upstream("stock_financial_hk_report_em")
+    fixture = _fixture("stock_financial_hk_report_em")
+    if fixture is not None:
+        return fixture
+
+    items = STATEMENT_ITEMS[symbol]
+    this_year = datetime.now().year
+    if indicator == "年度":
+        periods = [f"{y}-12-31" for y in range(this_year - 10, this_year)]
+    else:
+        periods = [f"{y}-{md}" for y in range(this_year - 5, this_year) for md in ("03-31", "06-30", "09-30", "12-31")]
+    rng = np.random.default_rng(_seed("fin", stock, symbol, indicator))
+    scale = rng.uniform(1e8, 1e11)
+
+    rows = []
+    for i, period in enumerate(periods):
+        growth = 1.08 ** i
+        for j, item in enumerate(items):
+            amount = scale * growth * rng.uniform(0.05, 1.0) if "每股" not in item else rng.uniform(0.1, 20)
+            rows.append({
+                "SECUCODE": f"{stock}.HK",
+                "SECURITY_CODE": stock,
+                "SECURITY_NAME_ABBR": f"港股{stock}",
+                "ORG_CODE": str(_seed(stock) % 10 ** 8),
+                "REPORT_DATE": f"{period} 00:00:00",
+                "DATE_TYPE_CODE": "001",
+                "FISCAL_YEAR": "12-31",
+                "STD_ITEM_CODE": f"{j:03d}",
+                "STD_ITEM_NAME": item,
+                "AMOUNT": round(float(amount), 2),
+            })
+    return pd.DataFrame(rows)
+
+
+# ============ 公司信息 / 估值 / 财务指标 ============
+def stock_hk_company_profile_em(symbol: str = "00700"):
+    _upstream("stock_hk_company_profile_em")
+    fixture = _fixture("stock_hk_company_profile_em")
+    if fixture is not None:
+        return fixture
+    return pd.DataFrame({
+        "item": ["公司名称", "董事长", "成立日期", "公司网址", "电子邮箱", "办公地址", "主营业务", "公司介绍"],
+        "value": [f"港股{symbol}有限公司", "张三", "2000-01-01", "https://example.com", "ir@example.com",
+                  "香港中环", "互联网及相关服务", f"港股{symbol}的公司介绍" * 20],
+    })
+
+
+def stock_hk_valuation_comparison_em(symbol: str = "00700"):
+    _upstream("stock_hk_valuation_comparison_em")
+    fixture = _fixture("stock_hk_valuation_comparison_em")
+    if fixture is not None:
+        return fixture
+    rng = np.random.default_rng(_seed("val", symbol))
+    return pd.DataFrame({
+        "代码": [symbol],
+        "简称": [f"港股{symbol}"],
+        "市盈率": [round(rng.uniform(5, 40), 2)],
+        "市盈率TTM": [round(rng.uniform(5, 40), 2)],
+        "市净率": [round(rng.uniform(0.5, 8), 2)],
+        "总市值": [round(rng.uniform(1e9, 4e12), 2)],
+    })
+
+
+def stock_hk_financial_indicator_em(symbol: str = "00700"):
+    _upstream("stock_hk_financial_indicator_em")
+    fixture = _fixture("stock_hk_financial_indicator_em")
+    if fixture is not None:
+        return fixture
+    rng = np.random.default_rng(_seed("ind", symbol))
+    return pd.DataFrame({
+        "报告期": [f"{datetime.now().year - 1}-12-31"],
+        "每股收益": [round(rng.uniform(0.1, 20), 3)],
+        "每股净资产": [round(rng.uniform(1, 100), 3)],
+        "净资产收益率": [round(rng.uniform(-5, 35), 2)],
+        "总资产净利率": [round(rng.uniform(-2, 15), 2)],
+        "毛利率": [round(rng.uniform(10, 70), 2)],
+        "净利率": [round(rng.uniform(-5, 30), 2)],
+        "资产负债率": [round(rng.uniform(10, 80), 2)],
+        "流动比率": [round(rng.uniform(0.5, 3), 2)],
+        "速动比率": [round(rng.uniform(0.3, 2.5), 2)],
+        "营收同比": [round(rng.uniform(-20, 40), 2)],
+        "净利润同比": [round(rng.uniform(-50, 80), 2)],
+    })
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+AKShare 代理离线压测
+
+用 akshare_stub 替换 akshare (不访问网络), 通过 ASGI 进程内直连驱动
+akshare_proxy 的全部路由, 按端点统计吞吐、p50/p95/p99 延迟、错误数和峰值 RSS。
+
+运行方式：
+    cd finspark-download
+    pip install httpx
+    python3 scripts/bench_akshare_proxy.py
+    python3 scripts/bench_akshare_proxy.py --requests 400 --concurrency 32 --latency 0.05
+    python3 scripts/bench_akshare_proxy.py --endpoints kline,batch --error-rate 0.1
+    python3 scripts/bench_akshare_proxy.py --no-cache --json out.json
+    python3 scripts/bench_akshare_proxy.py --baseline out.json --tolerance 0.2   # p95 回退超过 20% 时退出码为 1
+
+    # 录制真实行情 (需联网) 后离线回放
+    python3 scripts/bench_akshare_proxy.py --live --record fixtures --code-list 00700,09988,00005 --requests 3
+    python3 scripts/bench_akshare_proxy.py --replay fixtures --code-list 00700,09988,00005
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+try:
+    import httpx
+except ImportError:
+    print("请先安装依赖: pip install httpx")
+    sys.exit(1)
+
+
+# 端点名 -> (方法, 路径模板, 请求体); {code} 按请求轮换
+ENDPOINTS = {
+    "health": ("GET", "/health", None),
+    "metrics": ("GET", "/metrics", None),
+    "financial_income": ("GET", "/hk/financial/{code}/income", None),
+    "financial_balance": ("GET", "/hk/financial/{code}/balance", None),
+    "financial_cashflow": ("GET", "/hk/financial/{code}/cashflow", None),
+    "financial_wide_income": ("GET", "/hk/financial_wide/{code}/income", None),
+    "financial_wide_balance": ("GET", "/hk/financial_wide/{code}/balance", None),
+    "financial_wide_cashflow": ("GET", "/hk/financial_wide/{code}/cashflow", None),
+    "kline": ("GET", "/hk/kline/{code}?days=180", None),
+    "kline_weekly": ("GET", "/hk/kline/{code}?days=52&period=weekly", None),
+    "basic": ("GET", "/hk/basic/{code}", None),
+    "company": ("GET", "/hk/company/{code}", None),
+    "daily_basic": ("GET", "/hk/daily_basic/{code}", None),
+    "fina_indicator": ("GET", "/hk/fina_indicator/{code}", None),
+    "main_biz": ("GET", "/hk/main_biz/{code}", None),
+    "stock_list": ("GET", "/hk/stock_list", None),
+    "all_stocks": ("GET", "/hk/all_stocks", None),
+    "screen": ("GET", "/hk/screen?q=pct_chg%20%3E%202%20and%20amount%20%3E%201e8%20order%20by%20amount%20desc%20limit%2050", None),
+    "diagnose": ("GET", "/diagnose/{code}", None),
+    "batch": ("POST", "/hk/batch", {"codes": ["{code}"]}),
+}
+
+
+def rss_bytes() -> int:
+    """当前进程 RSS (Linux 读 /proc, 其他平台退回 ru_maxrss)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def render_body(body, code: str):
+    if body is None:
+        return None
+    return json.loads(json.dumps(body).replace("{code}", code))
+
+
+async def sample_rss(peak: list, stop: asyncio.Event):
+    """压测期间每 10ms 采样一次 RSS, 记录峰值"""
+    while not stop.is_set():
+        peak[0] = max(peak[0], rss_bytes())
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.01)
+        except asyncio.TimeoutError:
+            pass
+
+
+def upstream_calls(proxy) -> int:
+    return sum(f["calls"] for f in proxy.upstream.snapshot()["functions"].values())
+
+
+async def run_endpoint(client, name: str, codes: list, total: int, concurrency: int, proxy) -> dict:
+    method, path, body = ENDPOINTS[name]
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    upstream_before = upstream_calls(proxy)
+
+    async def one(i: int):
+        nonlocal errors
+        code = codes[i % len(codes)]
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path.replace("{code}", code), json=render_body(body, code))
+                ok = response.status_code < 400
+                if ok and response.headers.get("content-type", "").startswith("application/json"):
+                    payload = response.json()
+                    ok = not (isinstance(payload, dict) and payload.get("success") is False)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    peak = [rss_bytes()]
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(peak, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "upstream_calls": upstream_calls(proxy) - upstream_before,
+        "throughput": round(total / wall, 1) if wall else 0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "peak_rss_mb": round(peak[0] / 1024 ** 2, 1),
+    }
+
+
+def compare_baseline(results: dict, baseline_path: str, tolerance: float) -> list:
+    """与基线比较 p95, 返回回退的端点列表"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["endpoints"]
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base["p95_ms"]:
+            continue
+        ratio = result["p95_ms"] / base["p95_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms ({ratio:.2f}x)")
+    return regressions
+
+
+async def run(args, proxy, out) -> dict:
+    names = list(ENDPOINTS) if not args.endpoints else [n.strip() for n in args.endpoints.split(",") if n.strip()]
+    unknown = [n for n in names if n not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"未知端点: {', '.join(unknown)}. 可选: {', '.join(ENDPOINTS)}")
+    if args.code_list:
+        codes = [c.strip() for c in args.code_list.split(",") if c.strip()]
+    else:
+        codes = [f"{i:05d}" for i in range(1, args.codes + 1)]
+
+    results = {}
+    transport = httpx.ASGITransport(app=proxy.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        for name in names:
+            results[name] = await run_endpoint(client, name, codes, args.requests, args.concurrency, proxy)
+            r = results[name]
+            print(f"  {name:<24} {r['throughput']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                  f"{r['p99_ms']:>9.2f} {r['errors']:>6} {r['upstream_calls']:>8} {r['peak_rss_mb']:>9.1f}", file=out, flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AKShare 代理离线压测")
+    parser.add_argument("--requests", type=int, default=200, help="每个端点的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发请求数")
+    parser.add_argument("--codes", type=int, default=20, help="轮换使用的股票代码数量")
+    parser.add_argument("--code-list", default="", help="逗号分隔的股票代码, 指定后忽略 --codes")
+    parser.add_argument("--endpoints", default="", help="逗号分隔的端点名, 默认全部")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟上游耗时 (秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="上游错误注入概率")
+    parser.add_argument("--rate-limit", type=float, default=0, help="代理的上游限流速率 (次/秒), 默认不限流")
+    parser.add_argument("--no-cache", action="store_true", help="关闭响应缓存 (进程内和磁盘)")
+    parser.add_argument("--live", action="store_true", help="使用真实 akshare (需联网), 不替换为 stub")
+    parser.add_argument("--record", default="", help="录制 ak.* 调用结果到该目录")
+    parser.add_argument("--replay", default="", help="从该目录回放录制数据, 不访问上游")
+    parser.add_argument("--verbose", action="store_true", help="保留代理自身的日志输出")
+    parser.add_argument("--json", default="", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", default="", help="基线 JSON, p95 回退超过容差时退出码为 1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="p95 允许的回退比例")
+    args = parser.parse_args()
+
+    # 代理在导入时读取配置, 必须先设好环境变量并替换 akshare
+    os.environ.setdefault("AKSHARE_DATA_DIR", tempfile.mkdtemp(prefix="akshare_bench_"))
+    os.environ["AKSHARE_RATE_LIMIT"] = str(args.rate_limit)
+    if args.no_cache:
+        os.environ["AKSHARE_CACHE_MAX_MB"] = "0"
+        os.environ["AKSHARE_DISK_CACHE"] = "0"
+    if args.record or args.replay:
+        os.environ["AKSHARE_FIXTURE_MODE"] = "record" if args.record else "replay"
+        os.environ["AKSHARE_FIXTURE_DIR"] = os.path.abspath(args.record or args.replay)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if not args.live:
+        # 进程池子进程重新导入 akshare_stub, 通过环境变量继承延迟和错误率
+        os.environ["AKSHARE_STUB_LATENCY"] = str(args.latency)
+        os.environ["AKSHARE_STUB_ERROR_RATE"] = str(args.error_rate)
+        import akshare_stub
+        akshare_stub.configure(latency=args.latency, error_rate=args.error_rate)
+        sys.modules["akshare"] = akshare_stub
+    import akshare_proxy
+
+    if args.live:
+        backend = "真实 akshare"
+    elif args.replay:
+        backend = f"回放 {args.replay}"
+    else:
+        backend = f"stub 延迟 {args.latency * 1000:.0f}ms, 错误率 {args.error_rate:.0%}"
+    if args.record:
+        backend += f", 录制到 {args.record}"
+    print("=" * 100)
+    print(f"  AKShare 代理压测: 每端点 {args.requests} 请求, 并发 {args.concurrency}, "
+          f"{len(args.code_list.split(',')) if args.code_list else args.codes} 只股票, {backend}"
+          f"{', 无缓存' if args.no_cache else ''}")
+    print("=" * 100)
+    print(f"  {'端点':<22} {'吞吐(/s)':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'错误':>5} {'上游调用':>6} {'RSS(MB)':>9}")
+
+    # 代理每个请求都会打印日志, 默认丢弃以免干扰结果和耗时
+    out = sys.stdout
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(out if args.verbose else devnull), \
+            contextlib.redirect_stderr(sys.stderr if args.verbose else devnull):
+        results = asyncio.run(run(args, akshare_proxy, out))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "endpoints": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n  结果已写入 {args.json}")
+
+    if args.baseline:
+        regressions = compare_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print("\n  ❌ 性能回退:")
+            for line in regressions:
+                print(f"    - {line}")
+            return 1
+        print(f"\n  ✅ 所有端点 p95 均在基线 {args.tolerance:.0%} 容差内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
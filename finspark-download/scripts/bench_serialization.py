@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+AKShare 代理序列化微基准
+
+对比旧版逐行序列化 (iterrows + clean_value + json.dumps) 与
+akshare_proxy 中按列向量化的 df_to_json_safe + json_dumps_bytes。
+数据为模拟的 stock_hk_spot_em 实时行情表 (默认 3000 行, 含 NaN/Inf)。
+
+运行方式：
+    cd finspark-download
+    python3 scripts/bench_serialization.py
+    python3 scripts/bench_serialization.py --rows 3000 --repeat 20
+"""
+
+import argparse
+import json
+import sys
+import time
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    print("请先安装依赖: pip install pandas numpy")
+    sys.exit(1)
+
+from akshare_proxy import df_to_json_safe, json_dumps_bytes, orjson
+
+
+def build_spot_table(rows: int) -> pd.DataFrame:
+    """构造与 stock_hk_spot_em 结构一致的行情表"""
+    rng = np.random.default_rng(42)
+    price = rng.uniform(0.1, 500, rows)
+    df = pd.DataFrame({
+        "序号": np.arange(1, rows + 1),
+        "代码": [f"{i:05d}" for i in range(rows)],
+        "名称": [f"港股{i}" for i in range(rows)],
+        "最新价": price,
+        "涨跌额": rng.normal(0, 2, rows),
+        "涨跌幅": rng.normal(0, 3, rows),
+        "今开": price * rng.uniform(0.95, 1.05, rows),
+        "最高": price * 1.05,
+        "最低": price * 0.95,
+        "昨收": price * rng.uniform(0.95, 1.05, rows),
+        "成交量": rng.integers(0, 10 ** 9, rows).astype(float),
+        "成交额": rng.uniform(0, 1e10, rows),
+    })
+    # 停牌股没有行情, 上游返回 NaN
+    df.loc[df.sample(frac=0.1, random_state=1).index, ["最新价", "涨跌额", "涨跌幅"]] = np.nan
+    df.loc[df.sample(frac=0.01, random_state=2).index, "涨跌幅"] = np.inf
+    return df
+
+
+def legacy_clean_value(val):
+    """旧版逐值清理"""
+    if val is None:
+        return None
+    if isinstance(val, (float, np.floating)):
+        if pd.isna(val) or np.isnan(val) or np.isinf(val):
+            return 0.0
+        return float(val)
+    if isinstance(val, np.integer):
+        return int(val)
+    if isinstance(val, (int, str, bool)):
+        return val
+    if pd.isna(val):
+        return None
+    return str(val)
+
+
+def legacy_df_to_json_safe(df: pd.DataFrame) -> list:
+    """旧版逐行序列化"""
+    records = []
+    for idx, row in df.iterrows():
+        record = {}
+        for col in df.columns:
+            record[col] = legacy_clean_value(row[col])
+        records.append(record)
+    return records
+
+
+def legacy_encode(df: pd.DataFrame) -> bytes:
+    data = legacy_df_to_json_safe(df)
+    return json.dumps({"success": True, "data": data}, ensure_ascii=False).encode("utf-8")
+
+
+def vectorized_encode(df: pd.DataFrame) -> bytes:
+    data = df_to_json_safe(df)
+    return json_dumps_bytes({"success": True, "data": data})
+
+
+def measure(fn, df: pd.DataFrame, repeat: int) -> float:
+    """返回最好一次的耗时 (秒)"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AKShare 代理序列化微基准")
+    parser.add_argument("--rows", type=int, default=3000, help="行情表行数")
+    parser.add_argument("--repeat", type=int, default=10, help="每种实现重复次数")
+    args = parser.parse_args()
+
+    df = build_spot_table(args.rows)
+    assert legacy_df_to_json_safe(df) == df_to_json_safe(df), "向量化结果与旧版不一致"
+
+    print("=" * 60)
+    print(f"  序列化微基准: {args.rows} 行 x {df.shape[1]} 列, 重复 {args.repeat} 次取最优")
+    print(f"  JSON 编码器: {'orjson' if orjson is not None else 'json (标准库)'}")
+    print("=" * 60)
+
+    cases = [
+        ("旧版 iterrows 转换", legacy_df_to_json_safe),
+        ("向量化转换", df_to_json_safe),
+        ("旧版 转换+编码", legacy_encode),
+        ("向量化 转换+编码", vectorized_encode),
+    ]
+    results = {}
+    for name, fn in cases:
+        seconds = measure(fn, df, args.repeat)
+        results[name] = seconds
+        print(f"  {name:<16} {seconds * 1000:9.2f} ms  {args.rows / seconds:12,.0f} 行/秒")
+
+    print("-" * 60)
+    print(f"  转换加速: {results['旧版 iterrows 转换'] / results['向量化转换']:.1f}x")
+    print(f"  端到端加速: {results['旧版 转换+编码'] / results['向量化 转换+编码']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
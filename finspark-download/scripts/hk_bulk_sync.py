@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+港股财务报表批量同步
+
+读取港股通成分股 (或全市场) 列表, 并发拉取每只股票的三大报表, 在进程池中
+完成 DataFrame 转换和宽表透视, 结果直接写入 akshare_proxy 的磁盘缓存
+(与 /hk/financial、/hk/financial_wide 使用相同的缓存 Key), 代理启动后即可命中。
+
+- 上游调用复用 akshare_proxy.call_ak 的限流 / 重试 / 熔断逻辑 (优先级为 bulk), 但本脚本是
+  独立进程, 令牌桶和熔断状态与正在运行的代理互不相通; 因此默认按 --rate-limit
+  (环境变量 AKSHARE_BULK_RATE_LIMIT, 默认 1 次/秒) 单独限流, 与代理同时运行时
+  两者的上游请求量相加, 应让两者之和低于上游可承受的速率
+- 透视子进程只导入 akshare_proxy 的函数, 不建库、不修改 socket 默认超时
+- 进度记录在 $AKSHARE_DATA_DIR/bulk_sync.db, 中断后重新运行会跳过已完成的项,
+  失败项在下次运行时重试; 完成记录超过 --max-age (默认与财务报表缓存 TTL 相同)
+  后失效, 定时任务的下一轮会重新同步全部项
+
+运行方式：
+    cd finspark-download
+    python3 scripts/hk_bulk_sync.py
+    python3 scripts/hk_bulk_sync.py --indicators 年度,报告期 --concurrency 8 --workers 4
+    python3 scripts/hk_bulk_sync.py --universe all --limit 100
+    python3 scripts/hk_bulk_sync.py --codes 00700,09988 --force
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import akshare_proxy as proxy  # noqa: E402
+
+
+def build_statement(code: str, report_type: str, df) -> tuple:
+    """
+    在子进程中把原始报表转换为长表 / 宽表响应 (与代理端点的返回格式一致)
+
+    Returns:
+        (长表 JSON, 宽表 JSON, 报告期数)
+    """
+    data = proxy.df_to_json_safe(df)
+    wide = proxy.df_to_json_safe(proxy.pivot_financial_statement(df, report_type, code))
+    long_body = proxy.json_dumps_bytes({"success": True, "data": data, "count": len(data)})
+    wide_body = proxy.json_dumps_bytes({"success": True, "data": wide, "count": len(wide)})
+    return long_body, wide_body, len(wide)
+
+
+class SyncProgress:
+    """同步进度检查点 (SQLite)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bulk_sync_progress (
+                    code TEXT NOT NULL,
+                    report_type TEXT NOT NULL,
+                    indicator TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    periods INTEGER,
+                    seconds REAL,
+                    error TEXT,
+                    updated_at REAL,
+                    PRIMARY KEY (code, report_type, indicator)
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def done(self, max_age: float) -> set:
+        """max_age 秒内完成的项 (更早的完成记录视为过期, 需要重新同步)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT code, report_type, indicator FROM bulk_sync_progress "
+                "WHERE status = 'ok' AND updated_at > ?",
+                (time.time() - max_age,)
+            ).fetchall()
+        return set(rows)
+
+    def record(self, code: str, report_type: str, indicator: str, status: str,
+               periods: int, seconds: float, error: str = None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO bulk_sync_progress "
+                "(code, report_type, indicator, status, periods, seconds, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (code, report_type, indicator, status, periods, seconds, error, time.time())
+            )
+
+
+async def sync_one(code: str, report_type: str, indicator: str, pool: ProcessPoolExecutor,
+                   progress: SyncProgress) -> dict:
+    """拉取 + 透视 + 写缓存, 返回各阶段耗时"""
+    started = time.perf_counter()
+    params = {"type": report_type, "indicator": indicator}
+    try:
+        df = await proxy.call_ak(
+            "stock_financial_hk_report_em",
+            stock=code,
+            symbol=proxy.FINANCIAL_SYMBOL_MAP[report_type],
+            indicator=indicator
+        )
+        fetched = time.perf_counter()
+        if df is None or df.empty:
+            progress.record(code, report_type, indicator, "ok", 0, fetched - started)
+            return {"status": "empty", "fetch": fetched - started, "pivot": 0.0, "periods": 0}
+
+        loop = asyncio.get_running_loop()
+        long_body, wide_body, periods = await loop.run_in_executor(pool, build_statement, code, report_type, df)
+        pivoted = time.perf_counter()
+
+        ttl, stale_ttl = proxy.CACHE_TTL["financial"], proxy.CACHE_STALE["financial"]
+        await asyncio.to_thread(proxy.disk_cache.set, proxy.make_cache_key("financial", code, params),
+                                long_body, ttl, stale_ttl)
+        await asyncio.to_thread(proxy.disk_cache.set, proxy.make_cache_key("financial_wide", code, params),
+                                wide_body, ttl, stale_ttl)
+        seconds = time.perf_counter() - started
+        progress.record(code, report_type, indicator, "ok", periods, seconds)
+        return {"status": "ok", "fetch": fetched - started, "pivot": pivoted - fetched, "periods": periods}
+
+    except Exception as e:
+        seconds = time.perf_counter() - started
+        progress.record(code, report_type, indicator, "error", 0, seconds, str(e))
+        return {"status": "error", "fetch": seconds, "pivot": 0.0, "periods": 0, "error": str(e)}
+
+
+async def run(args) -> int:
+    proxy.request_priority.set("bulk")
+
+    if args.codes:
+        codes = [proxy.normalize_hk_code(c) for c in args.codes.split(",") if c.strip()]
+    else:
+        stocks = await proxy.hk_universe.refresh(args.universe)
+        codes = [proxy.normalize_hk_code(s["symbol"]) for s in stocks]
+    if args.limit:
+        codes = codes[:args.limit]
+
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    indicators = [i.strip() for i in args.indicators.split(",") if i.strip()]
+    invalid = [t for t in types if t not in proxy.FINANCIAL_SYMBOL_MAP]
+    if invalid:
+        print(f"无效的报表类型: {', '.join(invalid)}")
+        return 2
+
+    progress = SyncProgress(os.path.join(proxy.AKSHARE_DATA_DIR, "bulk_sync.db"))
+    done = set() if args.force else progress.done(args.max_age)
+    items = [
+        (code, report_type, indicator)
+        for code in codes for report_type in types for indicator in indicators
+        if (code, report_type, indicator) not in done
+    ]
+
+    total = len(items)
+    print("=" * 70)
+    print(f"  港股财务报表批量同步: {len(codes)} 只股票 x {len(types)} 张报表 x {len(indicators)} 种口径")
+    print(f"  待同步 {total} 项 (已完成 {len(codes) * len(types) * len(indicators) - total} 项), "
+          f"并发 {args.concurrency}, 进程池 {args.workers}")
+    print("=" * 70)
+    if not items:
+        return 0
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    per_code = {}
+    counts = {"ok": 0, "empty": 0, "error": 0}
+    finished = 0
+    started = time.perf_counter()
+
+    async def worker(code: str, report_type: str, indicator: str, pool: ProcessPoolExecutor):
+        nonlocal finished
+        async with semaphore:
+            result = await sync_one(code, report_type, indicator, pool, progress)
+        finished += 1
+        counts[result["status"]] += 1
+        per_code[code] = per_code.get(code, 0.0) + result["fetch"] + result["pivot"]
+        elapsed = time.perf_counter() - started
+        eta = elapsed / finished * (total - finished)
+        line = (f"  [{finished}/{total}] {code} {report_type} {indicator} {result['status']} "
+                f"拉取 {result['fetch']:.2f}s 透视 {result['pivot']:.2f}s {result['periods']} 期 "
+                f"| 已用 {elapsed:.0f}s 剩余约 {eta:.0f}s")
+        if result["status"] == "error":
+            line += f" | {result['error']}"
+        print(line, flush=True)
+
+    # spawn: 避免在已有线程的进程中 fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+        await asyncio.gather(*(worker(code, report_type, indicator, pool) for code, report_type, indicator in items))
+
+    elapsed = time.perf_counter() - started
+    print("-" * 70)
+    print(f"  完成: 成功 {counts['ok']}, 无数据 {counts['empty']}, 失败 {counts['error']}, "
+          f"耗时 {elapsed:.1f}s ({total / elapsed:.1f} 项/秒)")
+    slowest = sorted(per_code.items(), key=lambda item: item[1], reverse=True)[:5]
+    print("  最慢的股票: " + ", ".join(f"{code} {seconds:.1f}s" for code, seconds in slowest))
+    if counts["error"]:
+        print("  失败项会在下次运行时重试")
+    return 1 if counts["error"] else 0
+
+
+def apply_rate_limit(rate: float):
+    """
+    以 rate 覆盖本进程的上游限流 (按函数单独配置的速率也不超过 rate)
+
+    本进程的令牌桶与代理进程互不相通, 不能沿用代理的 AKSHARE_RATE_LIMIT,
+    否则与代理同时运行时上游请求量翻倍; rate <= 0 时保留代理的配置
+    """
+    if rate <= 0:
+        return
+    proxy.upstream.rate = rate
+    proxy.upstream.burst = max(1, int(rate))
+    proxy.upstream.rate_limits = {
+        name: min(limit, rate) for name, limit in proxy.upstream.rate_limits.items()
+    }
+    proxy.upstream._limiters.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="港股财务报表批量同步")
+    parser.add_argument("--universe", choices=["connect", "all"], default="connect",
+                        help="股票范围: connect 港股通成分股 (默认) / all 全市场")
+    parser.add_argument("--codes", default="", help="逗号分隔的股票代码, 指定后忽略 --universe")
+    parser.add_argument("--limit", type=int, default=0, help="只同步前 N 只股票")
+    parser.add_argument("--types", default="income,balance,cashflow", help="报表类型")
+    parser.add_argument("--indicators", default="年度", help="报表口径: 年度,报告期")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的同步项数")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="透视进程数")
+    parser.add_argument("--force", action="store_true", help="忽略检查点, 全部重新同步")
+    parser.add_argument("--max-age", type=float, default=proxy.CACHE_TTL["financial"],
+                        help="完成记录的有效期 (秒), 默认与财务报表缓存 TTL 相同; 超过后重新同步")
+    parser.add_argument("--rate-limit", type=float,
+                        default=float(os.environ.get("AKSHARE_BULK_RATE_LIMIT", "1")),
+                        help="本进程的上游限流速率 (次/秒), 与代理的 AKSHARE_RATE_LIMIT 相互独立")
+    args = parser.parse_args()
+
+    apply_rate_limit(args.rate_limit)
+
+    if proxy.disk_cache is None:
+        print("磁盘缓存未启用 (AKSHARE_DISK_CACHE=0), 同步结果无处写入")
+        return 2
+
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
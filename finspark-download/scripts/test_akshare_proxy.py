@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+"""
+AKShare 代理离线回归测试
+
+用 akshare_stub 替换 akshare (不访问网络), 通过 ASGI 进程内直连调用
+akshare_proxy 的端点和计算函数, 校验返回结果。
+
+运行方式：
+    cd finspark-download
+    pip install httpx pytest
+    python3 -m pytest -q scripts/test_akshare_proxy.py
+    python3 scripts/test_akshare_proxy.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 代理在导入时读取配置, 必须先设好环境变量并替换 akshare
+os.environ.setdefault("AKSHARE_DATA_DIR", tempfile.mkdtemp(prefix="akshare_test_"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import httpx
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    print("请先安装依赖: pip install httpx pandas")
+    sys.exit(1)
+
+import akshare_stub  # noqa: E402
+sys.modules["akshare"] = akshare_stub
+import akshare_proxy as proxy  # noqa: E402
+
+# 代理内的锁 / 单飞对象绑定事件循环, 所有请求共用同一个循环
+_loop = asyncio.new_event_loop()
+
+
+def run(coro):
+    return _loop.run_until_complete(coro)
+
+
+def call(method: str, path: str, **kwargs) -> httpx.Response:
+    """进程内请求代理端点"""
+    async def send():
+        transport = httpx.ASGITransport(app=proxy.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=120) as client:
+            return await client.request(method, path, **kwargs)
+    return run(send())
+
+
+# ============ 健康检查 ============
+def test_health_does_not_touch_disk_cache():
+    """/health 只读进程内状态; 磁盘缓存条目数在 /metrics 中读取"""
+    def blocked(*args, **kwargs):
+        raise AssertionError("/health 不应访问 SQLite")
+
+    original = proxy.disk_cache._connect
+    proxy.disk_cache._connect = blocked
+    try:
+        response = call("GET", "/health")
+    finally:
+        proxy.disk_cache._connect = original
+    assert response.status_code == 200
+    assert "entries" not in response.json()["disk_cache"]
+    assert "akshare_disk_cache_entries" in call("GET", "/metrics").text
+
+
+# ============ K线 ============
+def test_kline_daily_returns_exact_days():
+    """日线返回的根数与 days 一致"""
+    for days in (1, 5, 180):
+        data = call("GET", f"/hk/kline/00700?days={days}").json()["data"]
+        assert len(data) == days, (days, len(data))
+    data = call("GET", "/hk/kline/00700?days=12&period=weekly").json()["data"]
+    assert len(data) == 12
+
+
+def test_kline_batch_returns_exact_days():
+    """批量接口中的 kline 同样按 days 截取"""
+    body = call("POST", "/hk/batch", json={"codes": ["00700"], "datasets": ["kline"], "days": 180}).json()
+    assert len(body["data"]["00700"]["kline"]["data"]) == 180
+
+
+def test_not_modified_keeps_vary_header():
+    """If-None-Match 命中的 304 带有与 200 相同的 Vary / ETag"""
+    response = call("GET", "/hk/kline/00700?days=180", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200 and "Accept-Encoding" in response.headers["Vary"]
+    etag, vary = response.headers["ETag"], response.headers["Vary"]
+    response = call("GET", "/hk/kline/00700?days=180", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["Vary"] == vary and response.headers["ETag"] == etag
+
+
+def test_kline_rejects_invalid_days():
+    for days in (0, -1):
+        assert call("GET", f"/hk/kline/00700?days={days}").status_code == 422
+
+
+# ============ 技术指标 ============
+def _bars(close: list) -> pd.DataFrame:
+    close = pd.Series(close, dtype='float64')
+    return pd.DataFrame({
+        "date": pd.bdate_range("2024-01-01", periods=len(close)).strftime("%Y%m%d"),
+        "close": close,
+        "high": close * 1.01,
+        "low": close * 0.99,
+        "volume": 1e6,
+    })
+
+
+def test_drawdown_uses_lookback_before_trimming():
+    """days=1 时回撤仍相对回看窗口内的高点计算"""
+    close = list(np.linspace(50, 100, 280)) + list(np.linspace(99, 80, 20))
+    latest = proxy.indicator_series(_bars(close), 1)
+    assert len(latest) == 1
+    assert abs(latest[0]["drawdown"] - (80 / 100 - 1)) < 1e-6
+    assert abs(latest[0]["max_drawdown"] - (80 / 100 - 1)) < 1e-6
+
+    # 高点已移出回看窗口
+    close = [200] + list(np.linspace(50, 100, proxy.DRAWDOWN_LOOKBACK + 10))
+    assert proxy.indicator_series(_bars(close), 1)[0]["drawdown"] == 0
+
+
+def test_indicator_endpoint_latest_drawdown():
+    body = call("GET", "/hk/indicators?codes=00700").json()
+    assert body["success"] and len(body["data"]) == 1
+    row = body["data"][0]
+    assert row["drawdown"] <= 0 and row["max_drawdown"] <= row["drawdown"]
+
+
+# ============ 财务比率 ============
+def _march_fy_statements(declare_fiscal: bool) -> tuple:
+    """3 月 31 日年结、半年报口径的三大报表宽表 (流量为财年初至今累计)"""
+    periods = ["20220930", "20230331", "20230930", "20240331", "20240930"]
+    revenue = [40, 100, 60, 130, 70]
+    income = [
+        {"end_date": p, "total_revenue": r, "n_income_attr_p": r / 10, "basic_eps": 1,
+         **({"fiscal_year_end": "03-31"} if declare_fiscal else {})}
+        for p, r in zip(periods, revenue)
+    ]
+    balance = [{"end_date": p, "total_assets": 1000} for p in periods]
+    cashflow = [{"end_date": p, "n_cashflow_act": r / 5} for p, r in zip(periods, revenue)]
+    return income, balance, cashflow
+
+
+def test_financial_ratios_march_fiscal_year():
+    """非 12 月年结: TTM = 本期累计 + 上一财年年报 - 上年同期累计"""
+    for declare_fiscal in (True, False):
+        ratios = proxy.compute_financial_ratios(*_march_fy_statements(declare_fiscal))
+        by_date = ratios.set_index("end_date")
+        assert by_date.loc["20240930", "revenue_ttm"] == 70 + 130 - 60
+        assert by_date.loc["20230930", "revenue_ttm"] == 60 + 100 - 40
+        assert by_date.loc["20240331", "revenue_ttm"] == 130
+        assert abs(by_date.loc["20240930", "assets_turn"] - 0.14) < 1e-9
+        assert abs(by_date.loc["20240930", "netprofit_ttm"] - 14) < 1e-9
+
+
+def test_financial_wide_carries_fiscal_year_end():
+    body = call("GET", "/hk/financial_wide/00700/income?fields=end_date,fiscal_year_end").json()
+    assert body["data"] and all(row["fiscal_year_end"] == "12-31" for row in body["data"])
+
+
+def test_fina_indicator_never_downloads_statements():
+    """财务指标只用已缓存的报表补齐, 不为补齐而下载报表"""
+    def statement_calls() -> int:
+        return akshare_stub.calls.get("stock_financial_hk_report_em", 0)
+
+    before = statement_calls()
+    row = call("GET", "/hk/fina_indicator/02318").json()["data"][0]
+    assert statement_calls() == before
+    assert row["assets_turn"] == 0
+
+    # 报表已缓存 (如 TS 端读取过年度宽表) 时, 同一报告期的缺失指标被补齐
+    for report_type in ("income", "balance", "cashflow"):
+        call("GET", f"/hk/financial_wide/02328/{report_type}")
+    before = statement_calls()
+    row = call("GET", "/hk/fina_indicator/02328").json()["data"][0]
+    assert statement_calls() == before
+    assert row["assets_turn"] > 0
+
+
+# ============ 批量同步 ============
+def test_bulk_sync_checkpoints_expire():
+    """完成记录在 max_age 内跳过, 过期后重新同步"""
+    import hk_bulk_sync
+    progress = hk_bulk_sync.SyncProgress(os.path.join(tempfile.mkdtemp(prefix="akshare_test_sync_"), "sync.db"))
+    progress.record("00700", "income", "年度", "ok", 5, 0.1)
+    progress.record("09988", "income", "年度", "error", 0, 0.1, "boom")
+    assert progress.done(3600) == {("00700", "income", "年度")}
+    with progress._connect() as conn:
+        conn.execute("UPDATE bulk_sync_progress SET updated_at = updated_at - 7200")
+    assert progress.done(3600) == set()
+
+
+IMPORT_SIDE_EFFECT_SCRIPT = """
+import os, socket, sys
+import hk_bulk_sync
+hk_bulk_sync.apply_rate_limit(1)
+upstream = hk_bulk_sync.proxy.upstream
+print(sorted(os.listdir(os.environ["AKSHARE_DATA_DIR"])), socket.getdefaulttimeout(), upstream.rate)
+"""
+
+
+def test_bulk_sync_import_has_no_side_effects():
+    """导入代理模块 (批量同步的 spawn 子进程) 不建库、不改 socket 超时, 批量同步单独限流"""
+    import subprocess
+    data_dir = tempfile.mkdtemp(prefix="akshare_test_import_")
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SIDE_EFFECT_SCRIPT],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, "AKSHARE_DATA_DIR": data_dir, "AKSHARE_RATE_LIMIT": "10"},
+        capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.split("\n")[-2] == "[] None 1"
+
+
+# ============ 行情快照选股 ============
+def test_screen_serves_stale_snapshot_while_refreshing():
+    """快照过期后立即返回旧快照, 刷新在后台进行"""
+    assert call("GET", "/hk/screen?q=limit%201").json()["success"]
+    calls_before = akshare_stub.calls.get("stock_hk_spot_em", 0)
+    proxy.spot_snapshot.refreshed_at -= proxy.AKSHARE_SPOT_TTL + 1
+    akshare_stub.configure(func_latency={"stock_hk_spot_em": 0.5})
+    try:
+        started = time.perf_counter()
+        responses = [call("GET", "/hk/screen?q=limit%201") for _ in range(3)]
+        assert time.perf_counter() - started < 0.4
+        assert all(r.json()["stale"] for r in responses)
+        run(asyncio.sleep(1.0))
+    finally:
+        akshare_stub.configure(func_latency={"stock_hk_spot_em": 0})
+    assert akshare_stub.calls["stock_hk_spot_em"] == calls_before + 1
+    assert "stale" not in call("GET", "/hk/screen?q=limit%201").json()
+
+
+def test_screen_orders_by_text_fields():
+    """order by 文本字段走完整排序 (nlargest 只支持数值列)"""
+    for q, reverse in (("order by name limit 3", False), ("order by code desc limit 3", True)):
+        response = call("GET", "/hk/screen", params={"q": q})
+        assert response.status_code == 200, response.text
+        rows = response.json()["data"]
+        key = "name" if "name" in q else "code"
+        values = [row[key] for row in rows]
+        assert len(values) == 3 and values == sorted(values, reverse=reverse)
+    assert call("GET", "/hk/screen?q=order%20by%20code%20limit%201").json()["data"][0]["code"] == "00001"
+
+
+def test_screen_missing_values_never_match_comparisons():
+    frame = pd.DataFrame({
+        "code": ["00001", "00002", "00003"],
+        "name": ["a", "b", "c"],
+        "price": [1.0, np.nan, 3.0],
+    })
+    for text, expected in (("price != 1", ["00003"]), ("price == price", ["00001", "00003"]),
+                           ("not (price > 2)", ["00001", "00002"])):
+        result, _ = proxy.ScreenQuery(text, list(frame.columns)).run(frame, 10)
+        assert result["code"].tolist() == expected, (text, result["code"].tolist())
+
+
+# ============ 上游失败 ============
+def test_upstream_failure_is_502_and_not_cached():
+    """冷启动时上游失败返回 success: false / 502, 且不写入缓存"""
+    original = proxy.call_ak
+
+    async def failing(func_name: str, **kwargs):
+        raise ConnectionError(f"{func_name} unavailable")
+
+    paths = ["/hk/company/06618", "/hk/daily_basic/06618", "/hk/fina_indicator/06618"]
+    proxy.call_ak = failing
+    try:
+        for path in paths:
+            response = call("GET", path)
+            assert response.status_code == 502, (path, response.status_code)
+            assert response.json()["success"] is False and response.json()["error"]
+    finally:
+        proxy.call_ak = original
+    for path in paths:
+        response = call("GET", path)
+        assert response.status_code == 200 and response.json()["data"], path
+
+
+def test_kline_sync_failure_cached_briefly_as_stale():
+    """K线增量同步失败时返回本地K线, 标记 stale 且只短暂缓存"""
+    assert call("GET", "/hk/kline/00941?days=5").json()["count"] == 5
+    original = proxy.sync_kline
+
+    async def failing(code: str, adjust: str):
+        raise ConnectionError("stock_hk_hist unavailable")
+
+    proxy.sync_kline = failing
+    try:
+        response = call("GET", "/hk/kline/00941?days=6")
+    finally:
+        proxy.sync_kline = original
+    body = response.json()
+    assert body["stale"] is True and body["count"] == 6
+    assert "Warning" in response.headers
+
+    key = proxy.make_cache_key("kline", "00941", {"days": 6, "adjust": "qfq"})
+    stored_at, fresh_until = proxy.response_cache._entries[key][:2]
+    assert fresh_until - stored_at <= proxy.AKSHARE_DEGRADED_TTL
+    # 命中缓存时仍标记为 stale
+    assert call("GET", "/hk/kline/00941?days=6").json()["stale"] is True
+
+
+def test_indicators_lists_stale_codes():
+    """多只股票的技术指标: 同步失败、由本地K线计算的股票列在 stale 中"""
+    assert call("GET", "/hk/indicators?codes=00941,00388").json()["stale"] == []
+    original = proxy.sync_kline
+
+    async def failing(code: str, adjust: str):
+        if code == "00941":
+            raise ConnectionError("stock_hk_hist unavailable")
+        return await original(code, adjust)
+
+    proxy.sync_kline = failing
+    try:
+        response = call("GET", "/hk/indicators?codes=00941,00388&days=2")
+    finally:
+        proxy.sync_kline = original
+    body = response.json()
+    assert body["stale"] == ["00941"] and body["errors"] == {}
+    assert {row["code"] for row in body["data"]} == {"00941", "00388"}
+    assert "Warning" in response.headers
+
+
+def test_adjusted_kline_without_factors_is_an_error():
+    """复权因子获取失败或为空时, qfq / hfq 请求返回 502, 不把不复权K线当作复权K线"""
+    original = proxy.call_ak
+
+    def factors_returning(result):
+        async def patched(func_name: str, **kwargs):
+            if func_name == "stock_hk_daily":
+                if isinstance(result, Exception):
+                    raise result
+                return result
+            return await original(func_name, **kwargs)
+        return patched
+
+    for code, result in (("01810", ConnectionError("stock_hk_daily unavailable")), ("03690", pd.DataFrame())):
+        proxy.call_ak = factors_returning(result)
+        try:
+            for path in (f"/hk/kline/{code}?days=5", f"/hk/kline/{code}?days=3&period=weekly&adjust=hfq"):
+                response = call("GET", path)
+                assert response.status_code == 502, (path, response.status_code)
+                assert response.json()["success"] is False, path
+            body = call("GET", f"/hk/indicators?codes={code}").json()
+            assert body["data"] == [] and code in body["errors"]
+            # 不复权K线不受影响
+            assert call("GET", f"/hk/kline/{code}?days=5&adjust=").json()["count"] == 5
+        finally:
+            proxy.call_ak = original
+        assert call("GET", f"/hk/kline/{code}?days=5").json()["count"] == 5
+
+
+# ============ 热门股票 ============
+def test_hot_codes_counted_once_per_request():
+    """一次请求只计一次热度, 与端点内部的缓存调用次数无关"""
+    def score(code: str) -> float:
+        return proxy.hot_codes._scores.get(code, 0.0)
+
+    before = score("00388")
+    call("GET", "/hk/financial_ratios/00388")      # 内部读取三张报表宽表
+    assert score("00388") == before + 1
+    call("GET", "/hk/fina_indicator/00388")        # 内部再计算财务比率
+    assert score("00388") == before + 2
+    call("POST", "/hk/batch", json={"codes": ["00388", "388.HK"], "datasets": ["income", "kline"]})
+    assert score("00388") == before + 3
+    call("GET", "/hk/indicators?codes=00388,00005")
+    assert score("00388") == before + 4
+
+
+# ============ 进程池执行器 ============
+# 每类端点各请求一次; 在子进程中运行, 以便导入前设置 AKSHARE_EXECUTOR=process
+PROCESS_SMOKE_PATHS = [
+    "/hk/financial/00700/income",
+    "/hk/financial_wide/00700/balance",
+    "/hk/financial_ratios/00700",
+    "/hk/kline/00700?days=30",
+    "/hk/indicators?codes=00700",
+    "/hk/basic/00700",
+    "/hk/company/00700",
+    "/hk/daily_basic/00700",
+    "/hk/fina_indicator/00700",
+    "/hk/main_biz/00700",
+    "/hk/stock_list",
+    "/hk/screen?q=pct_chg%20%3E%200%20limit%205",
+]
+
+FIXTURE_SCRIPT = """
+import asyncio, json, sys
+import akshare_stub
+sys.modules["akshare"] = akshare_stub
+import httpx
+import akshare_proxy as proxy
+
+async def main():
+    transport = httpx.ASGITransport(app=proxy.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        if proxy.AKSHARE_FIXTURE_MODE == "record":
+            await client.get("/hk/kline/00700?days=5")
+            # K线过期后的增量同步 (end_date=今天)
+            with proxy.kline_store._connect() as conn:
+                conn.execute("UPDATE hk_daily_meta SET synced_at = 0")
+        body = (await client.get("/hk/kline/00700?days=6")).json()
+    body["hist_calls"] = proxy.upstream.snapshot()["functions"].get("stock_hk_hist", {}).get("calls", 0)
+    print(json.dumps(body, ensure_ascii=False))
+    proxy.upstream.shutdown()
+
+asyncio.run(main())
+"""
+
+
+def test_fixture_replay_restores_kline_store():
+    """回放使用录制时的K线存储, 摘要不含 end_date, 换一个数据目录、换一天都能回放"""
+    import json
+    import subprocess
+    digest = proxy.FixtureStore.digest
+    assert digest("stock_hk_hist", {"symbol": "00700", "end_date": "20240102"}) == \
+        digest("stock_hk_hist", {"symbol": "00700", "end_date": "20991231"})
+
+    fixture_dir = tempfile.mkdtemp(prefix="akshare_test_fixtures_")
+    bodies = {}
+    for mode in ("record", "replay"):
+        result = subprocess.run(
+            [sys.executable, "-c", FIXTURE_SCRIPT],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, "AKSHARE_FIXTURE_MODE": mode, "AKSHARE_FIXTURE_DIR": fixture_dir,
+                 "AKSHARE_DATA_DIR": tempfile.mkdtemp(prefix=f"akshare_test_{mode}_"),
+                 "AKSHARE_DISK_CACHE": "0", "AKSHARE_CACHE_MAX_MB": "0"},
+            capture_output=True, text=True, timeout=120
+        )
+        assert result.returncode == 0, result.stderr[-2000:]
+        bodies[mode] = json.loads(result.stdout.strip().splitlines()[-1])
+    assert os.path.exists(os.path.join(fixture_dir, "kline.db"))
+    assert bodies["record"]["hist_calls"] == 2
+    # 回放从录制的存储恢复K线, 不再请求 stock_hk_hist
+    assert bodies["replay"]["hist_calls"] == 0
+    assert bodies["replay"]["count"] == 6 and "stale" not in bodies["replay"]
+    assert bodies["replay"]["data"] == bodies["record"]["data"]
+
+
+PROCESS_SMOKE_SCRIPT = """
+import asyncio, sys
+import akshare_stub
+sys.modules["akshare"] = akshare_stub
+import httpx
+import akshare_proxy as proxy
+
+async def main(paths):
+    transport = httpx.ASGITransport(app=proxy.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        for path in paths:
+            response = await client.get(path)
+            body = response.json()
+            ok = response.status_code == 200 and body.get("success") is not False
+            print(("ok " if ok else "fail ") + path, flush=True)
+    print("process pool calls:", sum(f["calls"] for f in proxy.upstream.snapshot()["functions"].values()))
+    proxy.upstream.shutdown()
+
+asyncio.run(main(sys.argv[1:]))
+"""
+
+
+def test_process_executor_serves_every_endpoint_family():
+    """AKSHARE_EXECUTOR=process 时各端点正常返回 (子进程以 spawn 启动, 不会卡死)"""
+    import subprocess
+    env = {
+        **os.environ,
+        "AKSHARE_EXECUTOR": "process",
+        "AKSHARE_MAX_WORKERS": "2",
+        "AKSHARE_DATA_DIR": tempfile.mkdtemp(prefix="akshare_test_process_"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", PROCESS_SMOKE_SCRIPT, *PROCESS_SMOKE_PATHS],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, timeout=180
+    )
+    lines = [line for line in result.stdout.splitlines() if line.startswith(("ok ", "fail "))]
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert lines == [f"ok {path}" for path in PROCESS_SMOKE_PATHS], lines
+
+
+def main():
+    """按顺序运行所有 test_* 函数, 打印结果汇总"""
+    tests = [(name, func) for name, func in globals().items() if name.startswith("test_") and callable(func)]
+    passed = 0
+    print("=" * 70)
+    print("  AKShare 代理离线回归测试")
+    print("=" * 70)
+    for name, func in tests:
+        started = time.perf_counter()
+        try:
+            func()
+            passed += 1
+            print(f"  ✅ {name} ({time.perf_counter() - started:.2f}s)")
+        except Exception as e:
+            print(f"  ❌ {name}: {type(e).__name__}: {e}")
+    print(f"\n  总计: {passed}/{len(tests)} 测试通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
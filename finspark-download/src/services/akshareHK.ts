@@ -12,7 +12,7 @@
  * 关键设计:
  * - 港股数据为"长表"格式 (每个指标一行)
  * - A股数据为"宽表"格式 (每个报告期一行，各指标为列)
- * - 本服务负责将长表转换为宽表
+ * - 长表转宽表优先由 Python 代理完成 (/hk/financial_wide)，本服务保留本地转换作为回退
  */
 
 /// <reference types="@cloudflare/workers-types" />
@@ -58,6 +58,9 @@ const CacheKeys = {
   finaIndicator: (code: string) => `akshare:hk:fina:${code}`,
 };
 
+// K线请求的字段 (代理 /hk/kline 的 fields 投影)
+const KLINE_FIELDS = ['date', 'open', 'high', 'low', 'close', 'change', 'pct_chg', 'volume', 'amount'];
+
 /**
  * AKShare 原始数据格式 (长表)
  * 每行代表一个财务指标项
@@ -368,11 +371,9 @@ export class AkshareHKService {
       }
     }
     
-    // 调用 Python 代理获取数据
-    const rawData = await this.fetchFromProxy(code, 'income');
-    
-    // 转换为 Tushare 格式
-    const transformed = this.transformToIncomeData(rawData, code);
+    // 优先使用代理端透视好的宽表, 旧版代理不支持时回退到长表 + 本地转换
+    const transformed = await this.fetchWideFromProxy<IncomeData>(code, 'income')
+      ?? this.transformToIncomeData(await this.fetchFromProxy(code, 'income'), code);
     
     // 写入缓存
     if (this.cache && transformed.length > 0) {
@@ -408,11 +409,9 @@ export class AkshareHKService {
       }
     }
     
-    // 调用 Python 代理获取数据
-    const rawData = await this.fetchFromProxy(code, 'balance');
-    
-    // 转换为 Tushare 格式
-    const transformed = this.transformToBalanceData(rawData, code);
+    // 优先使用代理端透视好的宽表, 旧版代理不支持时回退到长表 + 本地转换
+    const transformed = await this.fetchWideFromProxy<BalanceData>(code, 'balance')
+      ?? this.transformToBalanceData(await this.fetchFromProxy(code, 'balance'), code);
     
     // 写入缓存
     if (this.cache && transformed.length > 0) {
@@ -448,11 +447,9 @@ export class AkshareHKService {
       }
     }
     
-    // 调用 Python 代理获取数据
-    const rawData = await this.fetchFromProxy(code, 'cashflow');
-    
-    // 转换为 Tushare 格式
-    const transformed = this.transformToCashFlowData(rawData, code);
+    // 优先使用代理端透视好的宽表, 旧版代理不支持时回退到长表 + 本地转换
+    const transformed = await this.fetchWideFromProxy<CashFlowData>(code, 'cashflow')
+      ?? this.transformToCashFlowData(await this.fetchFromProxy(code, 'cashflow'), code);
     
     // 写入缓存
     if (this.cache && transformed.length > 0) {
@@ -622,27 +619,47 @@ export class AkshareHKService {
     }
     
     try {
-      const response = await fetch(`${this.pythonProxyUrl}/hk/kline/${code}?days=${days}`);
-      const result = await response.json() as { success: boolean; data?: any[]; error?: string };
+      // 按列格式只取用到的字段, 避免每行重复键名
+      const response = await fetch(
+        `${this.pythonProxyUrl}/hk/kline/${code}?days=${days}&format=columns&fields=${KLINE_FIELDS.join(',')}`
+      );
+      const result = await response.json() as {
+        success: boolean;
+        data?: Record<string, any[]> | any[];
+        error?: string;
+      };
       
-      if (!result.success || !result.data) {
+      let dailyData: DailyData[];
+      if (response.status === 400) {
+        // 代理不支持 format / fields 参数, 改为请求默认的记录格式
+        console.warn(`[AkshareHK] K线按列请求被拒绝, 回退到记录格式: ${code}`, result.error);
+        dailyData = await this.fetchKlineRecords(code, days);
+      } else if (!result.success || !result.data) {
         return [];
+      } else if (Array.isArray(result.data)) {
+        // 旧版代理忽略 format 参数, 仍返回对象数组
+        console.warn(`[AkshareHK] K线返回记录格式而非按列格式: ${code}`);
+        dailyData = result.data.map((item: any) => this.klineRecordToDaily(code, item));
+      } else if (Array.isArray(result.data.date)) {
+        const col = result.data;
+        dailyData = col.date.map((date: string, i: number) => ({
+          ts_code: `${code}.HK`,
+          trade_date: this.formatDate(date),
+          open: col.open?.[i] || 0,
+          high: col.high?.[i] || 0,
+          low: col.low?.[i] || 0,
+          close: col.close?.[i] || 0,
+          pre_close: 0,
+          change: col.change?.[i] || 0,
+          pct_chg: col.pct_chg?.[i] || 0,
+          vol: col.volume?.[i] || 0,
+          amount: col.amount?.[i] || 0,
+        }));
+      } else {
+        console.warn(`[AkshareHK] K线按列结果缺少 date 列, 回退到记录格式: ${code}`, Object.keys(result.data));
+        dailyData = await this.fetchKlineRecords(code, days);
       }
       
-      const dailyData: DailyData[] = result.data.map((item: any) => ({
-        ts_code: `${code}.HK`,
-        trade_date: this.formatDate(item.date || item.trade_date || item.日期),
-        open: item.open || item.开盘 || 0,
-        high: item.high || item.最高 || 0,
-        low: item.low || item.最低 || 0,
-        close: item.close || item.收盘 || 0,
-        pre_close: item.pre_close || 0,
-        change: item.change || item.涨跌额 || 0,
-        pct_chg: item.pct_chg || item.涨跌幅 || 0,
-        vol: item.volume || item.vol || item.成交量 || 0,
-        amount: item.amount || item.成交额 || 0,
-      }));
-      
       // 写入缓存
       if (this.cache && dailyData.length > 0) {
         try {
@@ -661,6 +678,39 @@ export class AkshareHKService {
     }
   }
 
+  /**
+   * 以默认记录格式请求K线 (兼容不支持 format=columns 的代理)
+   */
+  private async fetchKlineRecords(code: string, days: number): Promise<DailyData[]> {
+    const response = await fetch(`${this.pythonProxyUrl}/hk/kline/${code}?days=${days}`);
+    const result = await response.json() as { success: boolean; data?: any[]; error?: string };
+    
+    if (!result.success || !Array.isArray(result.data)) {
+      return [];
+    }
+    
+    return result.data.map((item: any) => this.klineRecordToDaily(code, item));
+  }
+
+  /**
+   * 单条K线记录 -> DailyData
+   */
+  private klineRecordToDaily(code: string, item: any): DailyData {
+    return {
+      ts_code: `${code}.HK`,
+      trade_date: this.formatDate(item.date || item.trade_date || item.日期),
+      open: item.open || item.开盘 || 0,
+      high: item.high || item.最高 || 0,
+      low: item.low || item.最低 || 0,
+      close: item.close || item.收盘 || 0,
+      pre_close: item.pre_close || 0,
+      change: item.change || item.涨跌额 || 0,
+      pct_chg: item.pct_chg || item.涨跌幅 || 0,
+      vol: item.volume || item.vol || item.成交量 || 0,
+      amount: item.amount || item.成交额 || 0,
+    };
+  }
+
   /**
    * 获取港股日线数据 (别名)
    */
@@ -958,6 +1008,31 @@ export class AkshareHKService {
     }
   }
 
+  /**
+   * 从 Python 代理获取已透视的宽表 (Tushare 格式)
+   * 返回 null 表示代理不支持该端点或请求失败, 由调用方回退到长表转换
+   */
+  private async fetchWideFromProxy<T>(stockCode: string, reportType: 'income' | 'balance' | 'cashflow'): Promise<T[] | null> {
+    try {
+      const response = await fetch(`${this.pythonProxyUrl}/hk/financial_wide/${stockCode}/${reportType}`);
+      
+      if (!response.ok) {
+        return null;
+      }
+      
+      const result = await response.json() as { success: boolean; data?: T[]; error?: string };
+      
+      if (!result.success) {
+        return null;
+      }
+      
+      return result.data || [];
+    } catch (error) {
+      console.warn(`[AkshareHK] 获取 ${reportType} 宽表失败, 回退到长表:`, error);
+      return null;
+    }
+  }
+
   /**
    * 将 AKShare 长表数据转换为 Tushare IncomeData 宽表格式
    */